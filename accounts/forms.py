@@ -38,8 +38,19 @@ class ProfileUpdateForm(forms.ModelForm):
 class SettingsUpdateForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ['dark_mode', 'language']
+        fields = ['dark_mode', 'language', 'srs_algorithm', 'srs_desired_retention']
         labels = {
             'dark_mode': 'Mode Sombre',
-            'language': 'Langue'
+            'language': 'Langue',
+            'srs_algorithm': 'Algorithme de révision',
+            'srs_desired_retention': 'Taux de rétention visé (FSRS)'
         }
+        widgets = {
+            'srs_desired_retention': forms.NumberInput(attrs={'min': 0.7, 'max': 0.97, 'step': 0.01})
+        }
+
+    def clean_srs_desired_retention(self):
+        retention = self.cleaned_data['srs_desired_retention']
+        if not 0.7 <= retention <= 0.97:
+            raise forms.ValidationError("Choisissez une valeur entre 0,70 et 0,97.")
+        return retention
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_badge_profile_last_activity_profile_streak_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='fsrs_parameters',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='srs_algorithm',
+            field=models.CharField(choices=[('sm2', 'SM-2 (classique)'), ('fsrs', 'FSRS (adaptatif)')], default='sm2', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='srs_desired_retention',
+            field=models.FloatField(default=0.9),
+        ),
+    ]
@@ -25,6 +25,11 @@ class Profile(models.Model):
     last_activity = models.DateField(null=True, blank=True)
     badges = models.ManyToManyField(Badge, blank=True)
 
+    # Spaced repetition (see quiz.schedulers)
+    srs_algorithm = models.CharField(max_length=10, default='sm2', choices=[('sm2', 'SM-2 (classique)'), ('fsrs', 'FSRS (adaptatif)')])
+    srs_desired_retention = models.FloatField(default=0.9)
+    fsrs_parameters = models.JSONField(null=True, blank=True) # fitted by `optimize_fsrs`, defaults otherwise
+
     @property
     def level(self):
         # simple level logic: Level 1 = 0 XP, Level 2 = 500 XP, Level 3 = 1000 XP...
@@ -37,33 +42,31 @@ class Profile(models.Model):
 
     def update_xp_and_streak(self, score, total_questions, difficulty_multiplier=1):
         from datetime import date, timedelta
-        
-        # 1. Update XP
+        from django.db.models import Case, F, When
+
+        # 1. XP
         # Base XP: 10 points per correct answer * difficulty
         points_earned = (score * 10) * difficulty_multiplier
         # Bonus for perfect score
         if score == total_questions:
             points_earned += 50
-        
-        self.xp += points_earned
 
-        # 2. Update Streak
+        # 2. Streak: unchanged if already active today, +1 if active
+        # yesterday, otherwise reset to 1. Computed by the database in a
+        # single UPDATE so concurrent submissions cannot overwrite each other.
         today = date.today()
-        if self.last_activity == today:
-            # Already active today, do nothing for streak
-            pass
-        elif self.last_activity == today - timedelta(days=1):
-            # Active yesterday, increment streak
-            self.streak += 1
-        else:
-            # Missed a day (or more), reset streak to 1
-            self.streak = 1
-        
-        self.last_activity = today
-        self.save()
-        
-        return points_earned
+        Profile.objects.filter(pk=self.pk).update(
+            xp=F('xp') + int(points_earned),
+            streak=Case(
+                When(last_activity=today, then=F('streak')),
+                When(last_activity=today - timedelta(days=1), then=F('streak') + 1),
+                default=1
+            ),
+            last_activity=today
+        )
+        self.refresh_from_db(fields=['xp', 'streak', 'last_activity'])
 
+        return points_earned
 
     def __str__(self):
         return f"Profil de {self.user.username}"
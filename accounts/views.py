@@ -20,30 +20,17 @@ def register(request):
         form = SignUpForm()
     return render(request, 'accounts/register.html', {'form': form})
 
-from django.db.models import Avg, Sum
-from quiz.models import ScoreHistory
+from quiz.stats import get_user_stats, format_duration
 
 @login_required
 def dashboard_view(request):
-    user_scores = ScoreHistory.objects.filter(user=request.user)
-    
-    total_quizzes = user_scores.count()
-    completed_quizzes = total_quizzes # Simplified for now
-    
-    avg_score_raw = user_scores.aggregate(Avg('score'))['score__avg'] or 0
-    avg_total_raw = user_scores.aggregate(Avg('total_questions'))['total_questions__avg'] or 1
-    
-    # Calculate percentage
-    if avg_total_raw > 0:
-        average_score_pct = round((avg_score_raw / avg_total_raw) * 100)
-    else:
-        average_score_pct = 0
-        
+    user_stats = get_user_stats(request.user)
+
     stats = {
-        'total_quizzes': total_quizzes,
-        'completed_quizzes': completed_quizzes,
-        'average_score': average_score_pct,
-        'time_spent': 'Dépend du chrono'
+        'total_quizzes': user_stats.quiz_count,
+        'completed_quizzes': user_stats.quiz_count, # Simplified for now
+        'average_score': user_stats.score_pct,
+        'time_spent': format_duration(user_stats.time_seconds)
     }
     return render(request, 'accounts/dashboard.html', {'stats': stats})
 
@@ -0,0 +1,170 @@
+"""
+Per-request performance instrumentation (see core.middleware.PerformanceMiddleware).
+
+RequestMetrics collects the wall time, the SQL queries, the time spent in
+external HTTP calls (LLM providers, gTTS, YouTube) and the peak memory of
+one request. The process-wide `metrics` registry aggregates them per view
+and renders them in the Prometheus text format.
+"""
+import contextvars
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Latency histogram buckets (seconds)
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.sql_counts = Counter()
+        self.external = defaultdict(float)
+        self.peak_memory = None
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """
+        connection.execute_wrapper() hook: times every query and counts
+        identical statements (same SQL with placeholders) to spot N+1 patterns.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_queries += 1
+            self.sql_counts[_normalize_sql(sql)] += 1
+
+    def repeated_queries(self, threshold):
+        return [(sql, count) for sql, count in self.sql_counts.most_common() if count >= threshold]
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+
+@contextmanager
+def track_external(kind):
+    """
+    Adds the time spent in the block to the current request's external calls
+    of the given kind ('llm', 'tts', 'youtube'). No-op outside a request.
+    Calls made in parallel (hedged or chunked generation) add up.
+    """
+    request_metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if request_metrics is not None:
+            request_metrics.external[kind] += time.perf_counter() - started
+
+
+def start_request():
+    request_metrics = RequestMetrics()
+    return request_metrics, _current.set(request_metrics)
+
+
+def resume_request(request_metrics):
+    """Makes `request_metrics` current again, while a streamed body is produced."""
+    return _current.set(request_metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def _normalize_sql(sql):
+    # Literals inlined in the SQL (IN lists, LIMIT...) must not hide a repeated statement
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+\b", "?", sql)
+    sql = re.sub(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)", "(...)", sql)
+    return sql
+
+
+class MetricsRegistry:
+    """
+    Process-wide aggregates per view, exported in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter()
+            self.duration_sum = Counter()
+            self.duration_buckets = defaultdict(Counter)
+            self.db_queries = Counter()
+            self.db_time = Counter()
+            self.external_time = Counter()
+            self.n_plus_one = Counter()
+            self.peak_memory = {}
+
+    def observe(self, view, status, request_metrics, n_plus_one):
+        with self.lock:
+            key = (view, str(status))
+            self.requests[key] += 1
+            self.duration_sum[view] += request_metrics.duration
+            for bucket in DURATION_BUCKETS:
+                if request_metrics.duration <= bucket:
+                    self.duration_buckets[view][bucket] += 1
+            self.db_queries[view] += request_metrics.db_queries
+            self.db_time[view] += request_metrics.db_time
+            for kind, seconds in request_metrics.external.items():
+                self.external_time[(view, kind)] += seconds
+            if n_plus_one:
+                self.n_plus_one[view] += 1
+            if request_metrics.peak_memory is not None:
+                self.peak_memory[view] = max(self.peak_memory.get(view, 0), request_metrics.peak_memory)
+
+    def render(self):
+        with self.lock:
+            lines = []
+
+            def metric(name, kind, help_text, samples):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_text}}} {value}")
+
+            metric('eduquiz_requests_total', 'counter', "Requêtes HTTP traitées.",
+                   [((('view', view), ('status', status)), count) for (view, status), count in sorted(self.requests.items())])
+
+            views = sorted(self.duration_sum)
+            lines.append("# HELP eduquiz_request_duration_seconds Durée des requêtes.")
+            lines.append("# TYPE eduquiz_request_duration_seconds histogram")
+            for view in views:
+                total = sum(count for (v, _), count in self.requests.items() if v == view)
+                for bucket in DURATION_BUCKETS:
+                    count = self.duration_buckets[view][bucket]
+                    lines.append(f'eduquiz_request_duration_seconds_bucket{{view="{_escape(view)}",le="{bucket}"}} {count}')
+                lines.append(f'eduquiz_request_duration_seconds_bucket{{view="{_escape(view)}",le="+Inf"}} {total}')
+                lines.append(f'eduquiz_request_duration_seconds_sum{{view="{_escape(view)}"}} {self.duration_sum[view]:.6f}')
+                lines.append(f'eduquiz_request_duration_seconds_count{{view="{_escape(view)}"}} {total}')
+
+            metric('eduquiz_db_queries_total', 'counter', "Requêtes SQL exécutées.",
+                   [((('view', view),), count) for view, count in sorted(self.db_queries.items())])
+            metric('eduquiz_db_time_seconds_total', 'counter', "Temps passé en base de données.",
+                   [((('view', view),), f"{seconds:.6f}") for view, seconds in sorted(self.db_time.items())])
+            metric('eduquiz_external_time_seconds_total', 'counter', "Temps passé en appels HTTP externes.",
+                   [((('view', view), ('kind', kind)), f"{seconds:.6f}") for (view, kind), seconds in sorted(self.external_time.items())])
+            metric('eduquiz_n_plus_one_total', 'counter', "Requêtes HTTP avec une requête SQL répétée (N+1 probable).",
+                   [((('view', view),), count) for view, count in sorted(self.n_plus_one.items())])
+            metric('eduquiz_peak_memory_bytes', 'gauge', "Pic mémoire Python observé par vue.",
+                   [((('view', view),), peak) for view, peak in sorted(self.peak_memory.items())])
+            return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = MetricsRegistry()
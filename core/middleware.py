@@ -0,0 +1,83 @@
+import json
+import logging
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .instrumentation import end_request, metrics, resume_request, start_request
+
+logger = logging.getLogger('eduquiz.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Records, for every request, the wall time, the number and duration of
+    SQL queries, the time spent in external HTTP calls and (optionally) the
+    peak memory. Emits one JSON log line per request on the
+    'eduquiz.performance' logger and feeds the /metrics endpoint.
+    Streaming responses are measured until their last chunk is sent.
+    Enabled with PERF_INSTRUMENTATION = True.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # tracemalloc is process-wide and slows every allocation: opt-in only
+        if settings.PERF_TRACK_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, request):
+        request_metrics, token = start_request()
+        if settings.PERF_TRACK_MEMORY:
+            tracemalloc.reset_peak()
+        try:
+            with connection.execute_wrapper(request_metrics.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            end_request(token)
+        if response.streaming:
+            # The body is produced after this returns, while the server iterates it
+            response.streaming_content = self._measure_stream(request, response, request_metrics, response.streaming_content)
+        else:
+            self._record(request, response, request_metrics)
+        return response
+
+    def _measure_stream(self, request, response, request_metrics, content):
+        token = resume_request(request_metrics)
+        try:
+            with connection.execute_wrapper(request_metrics.db_wrapper):
+                yield from content
+        finally:
+            end_request(token)
+            self._record(request, response, request_metrics)
+
+    def _record(self, request, response, request_metrics):
+        request_metrics.finish()
+        if settings.PERF_TRACK_MEMORY:
+            request_metrics.peak_memory = tracemalloc.get_traced_memory()[1]
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        repeated = request_metrics.repeated_queries(settings.PERF_N_PLUS_ONE_THRESHOLD)
+        metrics.observe(view, response.status_code, request_metrics, bool(repeated))
+
+        record = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(request_metrics.duration * 1000, 2),
+            'db_queries': request_metrics.db_queries,
+            'db_time_ms': round(request_metrics.db_time * 1000, 2),
+            'external_ms': {kind: round(seconds * 1000, 2) for kind, seconds in request_metrics.external.items()},
+        }
+        if request_metrics.peak_memory is not None:
+            record['peak_memory_kb'] = round(request_metrics.peak_memory / 1024, 1)
+        if repeated:
+            record['n_plus_one'] = [{'sql': sql[:200], 'count': count} for sql, count in repeated[:3]]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
@@ -1,3 +1,44 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .middleware import PerformanceMiddleware
+
+
+@override_settings(PERF_INSTRUMENTATION=True, PERF_TRACK_MEMORY=False)
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        self.url = reverse('core:metrics')
+
+    @override_settings(PERF_METRICS_TOKEN='')
+    def test_hidden_without_token_except_for_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(User.objects.create_user('student', password='student'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(User.objects.create_user('admin', password='admin', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(PERF_METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+
+@override_settings(PERF_INSTRUMENTATION=True, PERF_TRACK_MEMORY=False)
+class StreamingMeasurementTests(TestCase):
+    def test_queries_of_a_streamed_body_are_counted(self):
+        def body():
+            yield b'start'
+            User.objects.count()
+            yield b'end'
+
+        middleware = PerformanceMiddleware(lambda request: StreamingHttpResponse(body()))
+        with mock.patch('core.middleware.metrics') as metrics:
+            response = middleware(RequestFactory().get('/'))
+            metrics.observe.assert_not_called()
+            self.assertEqual(b''.join(response.streaming_content), b'startend')
+        request_metrics = metrics.observe.call_args.args[2]
+        self.assertEqual(request_metrics.db_queries, 1)
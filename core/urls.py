@@ -13,5 +13,6 @@ urlpatterns = [
     path('confidentialite/', views.privacy, name='privacy_alias'),
     path('testimonials/', views.testimonials, name='testimonials'),
     path('aide/', views.help_page, name='help'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
 
@@ -1,8 +1,11 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Testimonial, ContactMessage
 from .forms import TestimonialForm, ContactForm
+from .instrumentation import metrics
 
 def home(request):
     return render(request, 'core/home.html')
@@ -53,3 +56,19 @@ def testimonials(request):
 def help_page(request):
     return render(request, 'core/help.html')
 
+def metrics_view(request):
+    """
+    Prometheus text endpoint of core.middleware.PerformanceMiddleware.
+    Open to staff users, and to scrapers sending PERF_METRICS_TOKEN
+    (Authorization: Bearer <token>) when set. Hidden (404) from anyone
+    else when no token is configured.
+    """
+    if not settings.PERF_INSTRUMENTATION:
+        raise Http404
+    if not request.user.is_staff:
+        token = settings.PERF_METRICS_TOKEN
+        if not token:
+            raise Http404
+        if request.headers.get('Authorization') != f"Bearer {token}":
+            return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -48,6 +48,7 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -138,6 +139,72 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rendered text-to-speech audio (quiz.tts), least recently used files evicted beyond the size limit
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', str(MEDIA_ROOT / 'tts'))
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Engine: 'gtts' (network), 'espeak' (local espeak-ng, offline) or 'null' (silence, tests and benchmarks)
+TTS_BACKEND = os.getenv('TTS_BACKEND', 'gtts')
+TTS_WORKERS = int(os.getenv('TTS_WORKERS', 4))
+TTS_TIMEOUT = int(os.getenv('TTS_TIMEOUT', 30))  # seconds per sentence
+TTS_ESPEAK_BINARY = os.getenv('TTS_ESPEAK_BINARY', 'espeak-ng')
+TTS_ESPEAK_VOICE = os.getenv('TTS_ESPEAK_VOICE', '')  # defaults to the text language
+
+# Quiz generation and AI gap analyses run in the `run_generation_worker` management command.
+# Set QUIZ_GENERATION_INLINE=True to run them inside the request (no worker needed).
+QUIZ_GENERATION_INLINE = os.getenv('QUIZ_GENERATION_INLINE', 'False') == 'True'
+
+# Seconds before a failed gap analysis is retried for the same mistakes
+GAP_ANALYSIS_RETRY_AFTER = int(os.getenv('GAP_ANALYSIS_RETRY_AFTER', 900))
+
+# Save and show questions one by one while the provider streams its answer
+QUIZ_STREAMING_GENERATION = os.getenv('QUIZ_STREAMING_GENERATION', 'False') == 'True'
+
+# Cache of generated questions, keyed by source text and generation parameters
+QUIZ_CACHE_ENABLED = os.getenv('QUIZ_CACHE_ENABLED', 'True') == 'True'
+QUIZ_CACHE_TTL = int(os.getenv('QUIZ_CACHE_TTL', 30 * 24 * 3600))  # seconds
+QUIZ_CACHE_MAX_ENTRIES = int(os.getenv('QUIZ_CACHE_MAX_ENTRIES', 1000))
+# Hit/miss counters are written once per this many lookups of a process
+QUIZ_CACHE_STATS_FLUSH_EVERY = int(os.getenv('QUIZ_CACHE_STATS_FLUSH_EVERY', 20))
+
+# Shared cache (compiled quiz answer keys). Without REDIS_URL each process
+# keeps its own in-memory cache; the keys are versioned per quiz, so a
+# question edit is seen by every process either way.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+ANSWER_KEY_CACHE_TIMEOUT = int(os.getenv('ANSWER_KEY_CACHE_TIMEOUT', 24 * 3600))  # seconds
+
+# Spread SRS due dates within a tolerance window towards the user's least loaded days (quiz.srs)
+SRS_LOAD_BALANCING = os.getenv('SRS_LOAD_BALANCING', 'True') == 'True'
+
+# Per-request instrumentation (core.middleware.PerformanceMiddleware) and /metrics endpoint
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'False') == 'True'
+PERF_TRACK_MEMORY = os.getenv('PERF_TRACK_MEMORY', 'False') == 'True'
+PERF_N_PLUS_ONE_THRESHOLD = int(os.getenv('PERF_N_PLUS_ONE_THRESHOLD', 5))
+PERF_METRICS_TOKEN = os.getenv('PERF_METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'eduquiz.performance': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 LOGIN_REDIRECT_URL = 'core:home'
 LOGOUT_REDIRECT_URL = 'core:home'
 
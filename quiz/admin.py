@@ -1,3 +1,56 @@
 from django.contrib import admin
+from .models import GenerationJob, GenerationCacheEntry, GenerationCacheStats, ProviderHealthSnapshot, UserStats, DailyActivity, GapAnalysis, ReviewLog
 
-# Register your models here.
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'title', 'status', 'created_at', 'finished_at']
+    list_filter = ['status', 'source_type', 'created_at']
+    search_fields = ['user__username', 'title']
+    readonly_fields = ['quiz', 'started_at', 'finished_at']
+
+
+@admin.register(GenerationCacheEntry)
+class GenerationCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'num_questions', 'difficulty', 'provider_signature', 'hit_count', 'last_used_at']
+    list_filter = ['difficulty']
+    readonly_fields = ['key', 'provider_signature', 'hit_count', 'created_at', 'last_used_at']
+
+
+@admin.register(GenerationCacheStats)
+class GenerationCacheStatsAdmin(admin.ModelAdmin):
+    list_display = ['hits', 'misses']
+
+
+@admin.register(ProviderHealthSnapshot)
+class ProviderHealthSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'process', 'state', 'requests', 'error_rate', 'latency_p50', 'latency_p95', 'updated_at']
+    list_filter = ['provider', 'state']
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'quiz_count', 'score_sum', 'total_sum', 'best_score', 'time_seconds', 'updated_at']
+    search_fields = ['user__username']
+
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ['user', 'date', 'count']
+    search_fields = ['user__username']
+    date_hierarchy = 'date'
+
+
+@admin.register(GapAnalysis)
+class GapAnalysisAdmin(admin.ModelAdmin):
+    list_display = ['user', 'status', 'computed_at', 'requested_at']
+    list_filter = ['status']
+    search_fields = ['user__username']
+    readonly_fields = ['fingerprint', 'computed_at', 'requested_at', 'started_at']
+
+
+@admin.register(ReviewLog)
+class ReviewLogAdmin(admin.ModelAdmin):
+    list_display = ['card', 'user', 'reviewed_at', 'quality', 'elapsed_days', 'previous_interval']
+    search_fields = ['user__username']
+    date_hierarchy = 'reviewed_at'
@@ -0,0 +1,28 @@
+"""
+Read queries of the analytics pages. Each function returns plain values
+fetched in one query with only the columns the caller needs.
+"""
+from .models import ScoreDetail
+
+GAP_ANALYSIS_MISTAKES = 15
+
+
+def recent_mistakes(user_id, limit=GAP_ANALYSIS_MISTAKES):
+    """
+    Most recent wrong answers of a user, newest first, as dicts with the
+    question text, the given and expected answers and the quiz title
+    (None when the quiz was deleted).
+    """
+    return list(
+        ScoreDetail.objects.filter(history__user_id=user_id, is_correct=False)
+        .order_by('-id')
+        .values('id', 'user_answer', 'question__text', 'question__correct_answer', 'question__quiz__title')[:limit]
+    )
+
+
+def recent_mistake_ids(user_id, limit=GAP_ANALYSIS_MISTAKES):
+    return list(
+        ScoreDetail.objects.filter(history__user_id=user_id, is_correct=False)
+        .order_by('-id')
+        .values_list('id', flat=True)[:limit]
+    )
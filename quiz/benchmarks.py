@@ -0,0 +1,396 @@
+"""
+Performance benchmarks of the quiz lifecycle.
+
+Used by the `seed_benchmark_data` and `run_benchmarks` management commands.
+Every scenario is timed over several runs (latency percentiles), then run
+once more with the SQL queries captured and tracemalloc enabled (query
+count, query time, peak Python memory). Results are plain dicts, dumped
+as JSON so two commits can be compared.
+"""
+import io
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Quiz, Question, ScoreHistory, ScoreDetail, Flashcard
+from .services import DocumentProcessor, QuizGeneratorService
+from .srs import SRS_FIELDS, reschedule
+from .stats import rebuild_daily_activity, rebuild_user_stats
+
+BENCH_USERNAME = 'bench_user'
+BENCH_QUIZ_TITLE = 'Benchmark quiz'
+BENCH_QUESTIONS = 20
+DOCUMENT_PAGES = (1, 10, 100)
+SEED_BATCH_SIZE = 5000
+SRS_BULK_CARDS = 1000
+
+SENTENCES = [
+    "La photosynthèse transforme l'énergie lumineuse en énergie chimique dans les chloroplastes.",
+    "La Révolution française commence symboliquement avec la prise de la Bastille en 1789.",
+    "Les équations différentielles décrivent l'évolution d'un système en fonction du temps.",
+    "Le protocole TCP garantit la livraison ordonnée des paquets entre deux machines.",
+    "La mitochondrie produit l'essentiel de l'ATP nécessaire au fonctionnement de la cellule.",
+    "Le théorème de Pythagore relie les longueurs des côtés d'un triangle rectangle.",
+]
+
+
+# --- Seeding -----------------------------------------------------------------
+
+@contextmanager
+def _manual_timestamps(*fields):
+    """
+    Disables auto_now_add so seeded rows can be spread over the past.
+    """
+    previous = [(field, field.auto_now_add) for field in fields]
+    for field, _ in previous:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in previous:
+            field.auto_now_add = value
+
+
+def seed(rows, days=365, detailed_histories=1000, seed_value=42, log=print):
+    """
+    Creates the benchmark user with `rows` ScoreHistory rows spread over
+    `days` days, ScoreDetail rows for the most recent `detailed_histories`
+    attempts and rows // 10 flashcards, then rebuilds the user's stats and
+    daily activity rollups. Existing benchmark data is replaced.
+    """
+    rng = random.Random(seed_value)
+    User.objects.filter(username=BENCH_USERNAME).delete()
+    user = User.objects.create_user(BENCH_USERNAME, password=BENCH_USERNAME)
+
+    quiz = Quiz.objects.create(user=user, title=BENCH_QUIZ_TITLE, difficulty='Standard', is_public=True)
+    Question.objects.bulk_create([
+        Question(
+            quiz=quiz,
+            text=f"{SENTENCES[i % len(SENTENCES)]} (question {i + 1})",
+            options=[f"Option {letter}{i + 1}" for letter in "ABCD"],
+            correct_answer=f"Option A{i + 1}",
+            explanation=SENTENCES[(i + 1) % len(SENTENCES)]
+        )
+        for i in range(BENCH_QUESTIONS)
+    ])
+    questions = list(quiz.questions.order_by('id'))
+
+    now = timezone.now()
+    difficulties = ['Standard', 'Intermédiaire', 'Avancée', 'Expert']
+    with _manual_timestamps(ScoreHistory._meta.get_field('completed_at')):
+        for start in range(0, rows, SEED_BATCH_SIZE):
+            batch = [
+                ScoreHistory(
+                    user=user,
+                    quiz=quiz,
+                    score=rng.randint(0, BENCH_QUESTIONS),
+                    total_questions=BENCH_QUESTIONS,
+                    difficulty=rng.choice(difficulties),
+                    time_elapsed=f"{rng.randint(1, 20):02d}:{rng.randint(0, 59):02d}",
+                    completed_at=now - timedelta(seconds=rng.randint(0, days * 86400))
+                )
+                for _ in range(min(SEED_BATCH_SIZE, rows - start))
+            ]
+            ScoreHistory.objects.bulk_create(batch)
+            log(f"  ScoreHistory {start + len(batch)}/{rows}")
+
+    recent = ScoreHistory.objects.filter(user=user).order_by('-completed_at').values_list('id', flat=True)[:detailed_histories]
+    details = []
+    for history_id in recent:
+        for question in rng.sample(questions, 5):
+            is_correct = rng.random() < 0.6
+            details.append(ScoreDetail(
+                history_id=history_id,
+                question=question,
+                is_correct=is_correct,
+                user_answer=question.correct_answer if is_correct else question.options[1]
+            ))
+    ScoreDetail.objects.bulk_create(details, batch_size=SEED_BATCH_SIZE)
+    log(f"  ScoreDetail {len(details)}")
+
+    today = timezone.localdate()
+    flashcard_fields = [Flashcard._meta.get_field('next_review_date'), Flashcard._meta.get_field('created_at')]
+    with _manual_timestamps(*flashcard_fields):
+        cards = rows // 10
+        for start in range(0, cards, SEED_BATCH_SIZE):
+            batch = []
+            for i in range(start, min(start + SEED_BATCH_SIZE, cards)):
+                repetitions = rng.randint(0, 8)
+                batch.append(Flashcard(
+                    user=user,
+                    question=SENTENCES[i % len(SENTENCES)],
+                    answer=f"Réponse {i}",
+                    interval=rng.randint(0, 120) if repetitions else 0,
+                    easiness_factor=round(rng.uniform(1.3, 2.8), 2),
+                    repetition_count=repetitions,
+                    next_review_date=today + timedelta(days=rng.randint(-30, 60)),
+                    created_at=now - timedelta(days=rng.randint(0, days))
+                ))
+            Flashcard.objects.bulk_create(batch)
+        log(f"  Flashcard {cards}")
+
+    # bulk_create bypasses the rollups kept up to date by grading
+    rebuild_user_stats(user)
+    rebuild_daily_activity(user)
+    log("  UserStats, DailyActivity")
+    return user
+
+
+# --- Measurement -------------------------------------------------------------
+
+def _percentile(sorted_values, percent):
+    index = max(0, round(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def measure(fn, repeat=20, warmup=2, setup=None):
+    """
+    Times `fn` over `repeat` runs, then runs it once more to count the
+    SQL queries and measure the peak memory allocated by Python.
+    `setup`, if given, runs untimed before every call.
+    """
+    setup = setup or (lambda: None)
+    for _ in range(warmup):
+        setup()
+        fn()
+    durations = []
+    for _ in range(repeat):
+        setup()
+        started = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+
+    setup()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'runs': repeat,
+        'mean_ms': round(statistics.mean(durations), 3),
+        'p50_ms': round(_percentile(durations, 50), 3),
+        'p95_ms': round(_percentile(durations, 95), 3),
+        'p99_ms': round(_percentile(durations, 99), 3),
+        'max_ms': round(durations[-1], 3),
+        'queries': len(queries),
+        'query_time_ms': round(sum(float(q['time']) for q in queries.captured_queries) * 1000, 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+# --- Scenarios ---------------------------------------------------------------
+
+class NamedBytesIO(io.BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def make_pdf(pages):
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.set_font("helvetica", size=11)
+    for page in range(pages):
+        pdf.add_page()
+        for line in range(40):
+            text = SENTENCES[(page + line) % len(SENTENCES)]
+            pdf.multi_cell(0, 6, text.encode('latin-1', 'replace').decode('latin-1'), new_x="LMARGIN", new_y="NEXT")
+    return bytes(pdf.output())
+
+
+def make_docx(pages):
+    import docx
+    document = docx.Document()
+    for page in range(pages):
+        for line in range(40):
+            document.add_paragraph(SENTENCES[(page + line) % len(SENTENCES)])
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def document_scenarios():
+    scenarios = {}
+    for pages in DOCUMENT_PAGES:
+        pdf_bytes = make_pdf(pages)
+        docx_bytes = make_docx(pages)
+        scenarios[f'extract_pdf_{pages}p'] = (
+            lambda data=pdf_bytes: DocumentProcessor.extract_text(NamedBytesIO(data, 'bench.pdf')), 5
+        )
+        scenarios[f'extract_docx_{pages}p'] = (
+            lambda data=docx_bytes: DocumentProcessor.extract_text(NamedBytesIO(data, 'bench.docx')), 5
+        )
+    return scenarios
+
+
+def regex_fallback_scenario():
+    text = " ".join(SENTENCES * 200)
+    service = QuizGeneratorService()
+    return {'regex_fallback_20q': (lambda: service._simple_regex_fallback(text, BENCH_QUESTIONS), 20)}
+
+
+def view_scenarios(user):
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    quiz = Quiz.objects.get(user=user, title=BENCH_QUIZ_TITLE)
+    questions = list(quiz.questions.order_by('id'))
+    answers = {f'question_{i}': q.correct_answer if i % 3 else q.options[1] for i, q in enumerate(questions)}
+    answers['time_elapsed'] = '04:12'
+    take_url = reverse('quiz:quiz_take_id', args=[quiz.id])
+    srs_url = reverse('quiz:srs_review')
+
+    def get(url):
+        def run():
+            response = client.get(url)
+            assert response.status_code in (200, 302), f"{url}: HTTP {response.status_code}"
+        return run
+
+    def grade():
+        response = client.post(take_url, answers)
+        assert response.status_code == 200, f"quiz_take: HTTP {response.status_code}"
+
+    due = {}
+
+    def next_due_card():
+        due['card'] = Flashcard.objects.filter(user=user, next_review_date__lte=timezone.localdate()).first()
+
+    def review():
+        if due['card'] is None:
+            return
+        client.post(srs_url, {'card_id': due['card'].id, 'quality': 4})
+
+    return {
+        'quiz_take_grading': (grade, 20),
+        'quiz_history': (get(reverse('quiz:quiz_history')), 10),
+        'analytics_dashboard': (get(reverse('quiz:analytics_dashboard')), 10),
+        'srs_review_get': (get(srs_url), 20),
+        'srs_review_post': (review, 20, next_due_card),
+    }
+
+
+def srs_bulk_scenarios(user):
+    """
+    Rescheduling the same SRS_BULK_CARDS cards card by card (update_srs)
+    and with the vectorized engine (quiz.srs.reschedule). The cards are
+    restored before each run so intervals do not grow run after run.
+    """
+    cards = list(Flashcard.objects.filter(user=user).order_by('id')[:SRS_BULK_CARDS])
+    ids = [card.id for card in cards]
+
+    def restore():
+        Flashcard.objects.bulk_update(cards, SRS_FIELDS)
+
+    def per_card():
+        # update_srs reads the owner's scheduler from card.user.profile
+        for card in Flashcard.objects.filter(id__in=ids).select_related('user__profile'):
+            card.update_srs(4)
+
+    def vectorized():
+        reschedule(Flashcard.objects.filter(id__in=ids), 4)
+
+    return {
+        f'srs_reschedule_{len(ids)}_per_card': (per_card, 3, restore),
+        f'srs_reschedule_{len(ids)}_numpy': (vectorized, 3, restore),
+    }
+
+
+def tts_scenarios(user, cache_dir):
+    """
+    The read-aloud endpoint with the offline null engine (no network): a
+    long explanation rendered from scratch, streamed, and served again
+    from the disk cache. Runs with `cache_dir` as TTS_CACHE_DIR.
+    """
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    url = reverse('quiz:generate_audio')
+    text = " ".join(SENTENCES)
+
+    def clear():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.makedirs(cache_dir)
+
+    def read_aloud():
+        with override_settings(TTS_BACKEND='null', TTS_CACHE_DIR=cache_dir):
+            response = client.get(url, {'text': text})
+            assert response.status_code == 200, f"generate_audio: HTTP {response.status_code}"
+            b''.join(response.streaming_content)
+
+    return {
+        'tts_long_text_cold': (read_aloud, 10, clear),
+        'tts_long_text_cached': (read_aloud, 20),
+    }
+
+
+def run(user, only=None, include_documents=True, log=print):
+    scenarios = {}
+    if include_documents:
+        scenarios.update(document_scenarios())
+    scenarios.update(regex_fallback_scenario())
+    scenarios.update(view_scenarios(user))
+    scenarios.update(srs_bulk_scenarios(user))
+
+    results = {}
+    # Removed after the run whichever scenarios were selected
+    with tempfile.TemporaryDirectory(prefix='bench-tts-') as tts_cache_dir:
+        scenarios.update(tts_scenarios(user, tts_cache_dir))
+        for name, (fn, repeat, *setup) in scenarios.items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            log(f"  {name}...")
+            results[name] = measure(fn, repeat=repeat, setup=setup[0] if setup else None)
+    return results
+
+
+def environment(rows):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'timestamp': timezone.now().isoformat(),
+        'rows': rows,
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+    }
+
+
+def compare(baseline, current, metrics=('p50_ms', 'p95_ms', 'queries', 'peak_memory_kb')):
+    """
+    Returns rows (scenario, metric, before, after, change %) for the scenarios found in both results.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        for metric in metrics:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = round((new - old) / old * 100, 1) if old else None
+            rows.append((name, metric, old, new, change))
+    return rows
@@ -0,0 +1,142 @@
+import hashlib
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GenerationCacheEntry, GenerationCacheStats
+
+# Hits and misses of this process not yet added to the GenerationCacheStats
+# row. Writing the single row on every lookup serialised the hits on it
+_pending_counts = {'hits': 0, 'misses': 0}
+_pending_lock = threading.Lock()
+
+
+class GenerationCache:
+    """
+    Content-addressed cache of generated questions.
+    Entries are keyed by a hash of the extracted text and the generation
+    parameters, expire after QUIZ_CACHE_TTL seconds and the least recently
+    used ones are evicted beyond QUIZ_CACHE_MAX_ENTRIES. The hit/miss
+    counters are added to the database every QUIZ_CACHE_STATS_FLUSH_EVERY
+    lookups (and by flush_stats), so they may lag behind by that much.
+    """
+
+    @staticmethod
+    def make_key(text, num_questions, difficulty, provider_signature):
+        # Whitespace differences between two extractions of the same file must not matter
+        normalized = re.sub(r'\s+', ' ', text).strip()
+        digest = hashlib.sha256()
+        for part in (normalized, str(num_questions), difficulty, provider_signature):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    @staticmethod
+    def get(key):
+        """
+        Returns the cached question list, or None on a miss.
+        """
+        if not settings.QUIZ_CACHE_ENABLED:
+            return None
+        entry = GenerationCacheEntry.objects.filter(key=key).first()
+        if entry is not None and entry.created_at < GenerationCache._expiry_limit():
+            entry.delete()
+            entry = None
+
+        if entry is None:
+            GenerationCache._count('misses')
+            return None
+
+        GenerationCacheEntry.objects.filter(pk=entry.pk) \
+            .update(hit_count=F('hit_count') + 1, last_used_at=timezone.now())
+        GenerationCache._count('hits')
+        return entry.questions
+
+    @staticmethod
+    def set(key, questions, num_questions, difficulty, provider_signature):
+        if not settings.QUIZ_CACHE_ENABLED or not questions:
+            return
+        now = timezone.now()
+        GenerationCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'num_questions': num_questions,
+                'difficulty': difficulty,
+                'provider_signature': provider_signature,
+                'questions': questions,
+                'created_at': now,
+                'last_used_at': now,
+            }
+        )
+        GenerationCache.evict()
+
+    @staticmethod
+    def evict():
+        """
+        Removes expired entries, then the least recently used ones above the size limit.
+        """
+        deleted, _ = GenerationCacheEntry.objects.filter(created_at__lt=GenerationCache._expiry_limit()).delete()
+        overflow = list(
+            GenerationCacheEntry.objects.order_by('-last_used_at')
+            .values_list('pk', flat=True)[settings.QUIZ_CACHE_MAX_ENTRIES:]
+        )
+        if overflow:
+            deleted += GenerationCacheEntry.objects.filter(pk__in=overflow).delete()[0]
+        return deleted
+
+    @staticmethod
+    def stats():
+        GenerationCache.flush_stats()
+        counters = GenerationCacheStats.objects.filter(pk=1).first()
+        hits = counters.hits if counters else 0
+        misses = counters.misses if counters else 0
+        lookups = hits + misses
+        return {
+            'entries': GenerationCacheEntry.objects.count(),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0,
+        }
+
+    @staticmethod
+    def clear():
+        with _pending_lock:
+            _pending_counts.update(hits=0, misses=0)
+        GenerationCacheEntry.objects.all().delete()
+        GenerationCacheStats.objects.filter(pk=1).update(hits=0, misses=0)
+
+    @staticmethod
+    def _expiry_limit():
+        return timezone.now() - timedelta(seconds=settings.QUIZ_CACHE_TTL)
+
+    @staticmethod
+    def flush_stats():
+        """
+        Adds the counts of this process to the database row.
+        """
+        with _pending_lock:
+            counts = dict(_pending_counts)
+            _pending_counts.update(hits=0, misses=0)
+        if counts['hits'] or counts['misses']:
+            GenerationCache._write_counts(counts)
+
+    @staticmethod
+    def _count(name):
+        with _pending_lock:
+            _pending_counts[name] += 1
+            if sum(_pending_counts.values()) < settings.QUIZ_CACHE_STATS_FLUSH_EVERY:
+                return
+            counts = dict(_pending_counts)
+            _pending_counts.update(hits=0, misses=0)
+        GenerationCache._write_counts(counts)
+
+    @staticmethod
+    def _write_counts(counts):
+        increments = {name: F(name) + count for name, count in counts.items()}
+        if not GenerationCacheStats.objects.filter(pk=1).update(**increments):
+            GenerationCacheStats.objects.get_or_create(pk=1)
+            GenerationCacheStats.objects.filter(pk=1).update(**increments)
@@ -0,0 +1,174 @@
+"""
+Local stand-in for the LLM providers, used for offline load tests.
+
+It speaks the OpenAI chat-completions wire format (also used by OpenRouter),
+streaming included, and answers with canned quiz JSON after a configurable
+latency, failing a configurable share of the requests. Point the service at
+it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and/or
+OPENROUTER_URL=http://127.0.0.1:<port>/api/v1/chat/completions.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHAT_PATHS = ('/v1/chat/completions', '/api/v1/chat/completions', '/chat/completions')
+DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+
+class FakeLLMConfig:
+    def __init__(self, latency=0.5, spread=0.2, distribution='lognormal', error_rate=0.0,
+                 error_status=500, quiz=None, default_questions=5, stream_chunk_size=40, seed=42):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Distribution inconnue : {distribution}")
+        self.latency = latency
+        self.spread = spread
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.quiz = quiz  # canned question list, or None for generated questions
+        self.default_questions = default_questions
+        self.stream_chunk_size = stream_chunk_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def draw(self):
+        """
+        Returns (latency in seconds, should_fail) for one request.
+        """
+        with self.lock:
+            self.requests += 1
+            if self.distribution == 'fixed':
+                latency = self.latency
+            elif self.distribution == 'uniform':
+                latency = self.random.uniform(max(0.0, self.latency - self.spread), self.latency + self.spread)
+            else:
+                # lognormal with the given median; spread is the sigma of the underlying normal
+                latency = self.latency * self.random.lognormvariate(0, self.spread)
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return latency, fail
+
+    def questions(self, num_questions):
+        if self.quiz:
+            return [self.quiz[i % len(self.quiz)] for i in range(num_questions)]
+        return [
+            {
+                "question": f"Question de test numéro {i + 1} ?",
+                "options": [f"Réponse {letter}{i + 1}" for letter in "ABCD"],
+                "answer": f"Réponse A{i + 1}",
+                "explanation": f"Explication de la question {i + 1}."
+            }
+            for i in range(num_questions)
+        ]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None  # set by FakeLLMServer
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {"error": {"message": "invalid JSON"}})
+        if self.path.rstrip('/') not in CHAT_PATHS:
+            return self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+        latency, fail = self.config.draw()
+        content = json.dumps({"quiz": self.config.questions(self._requested_questions(body))}, ensure_ascii=False)
+        model = body.get('model', 'fake-model')
+
+        if body.get('stream'):
+            return self._stream(content, model, latency, fail)
+        time.sleep(latency)
+        if fail:
+            return self._send_json(self.config.error_status, {"error": {"message": "fake provider error"}})
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _stream(self, content, model, latency, fail):
+        # Half of the latency before the first token, the rest spread over the chunks
+        time.sleep(latency / 2)
+        if fail:
+            return self._send_json(self.config.error_status, {"error": {"message": "fake provider error"}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        size = self.config.stream_chunk_size
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        delay = latency / 2 / max(1, len(pieces))
+        for piece in pieces:
+            self._write_event({"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}, model)
+            time.sleep(delay)
+        self._write_event({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}, model)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _write_event(self, payload, model):
+        payload.update({"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": model})
+        self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _requested_questions(self, body):
+        prompt = " ".join(str(m.get('content', '')) for m in body.get('messages', []))
+        match = re.search(r"Nombre de questions\s*:\s*(\d+)", prompt) or re.search(r"de (\d+) questions", prompt)
+        return int(match.group(1)) if match else self.config.default_questions
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeLLMServer:
+    """
+    Runs the fake provider in a background thread (benchmarks) or in the
+    foreground (`fake_llm_server` management command).
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, config=None):
+        self.config = config or FakeLLMConfig()
+        handler = type('ConfiguredFakeLLMHandler', (FakeLLMHandler,), {'config': self.config})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
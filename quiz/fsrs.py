@@ -0,0 +1,180 @@
+"""
+FSRS (Free Spaced Repetition Scheduler) memory model, version 4.5.
+
+A card has a stability S (days for the recall probability to fall to 90%)
+and a difficulty D (1-10). Each review, graded Again/Hard/Good/Easy (1-4),
+updates both from the recall probability R at review time; the next interval
+is the delay after which R falls to the desired retention. Every function
+works on NumPy arrays so a batch of cards, or a whole review log during
+optimization, is processed at once.
+"""
+import numpy as np
+
+DECAY = -0.5
+FACTOR = 0.9 ** (1 / DECAY) - 1
+MAX_INTERVAL = 36500
+
+DEFAULT_PARAMETERS = (
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+)
+PARAMETER_BOUNDS = np.array([
+    (0.01, 100), (0.01, 100), (0.01, 100), (0.01, 100), (1, 10), (0.001, 4),
+    (0.001, 4), (0.001, 0.75), (0, 4.5), (0, 0.8), (0.001, 3.5), (0.001, 5),
+    (0.001, 0.25), (0.001, 0.9), (0, 4), (0, 1), (1, 6),
+])
+
+AGAIN, HARD, GOOD, EASY = 1, 2, 3, 4
+
+
+def rating_from_quality(quality):
+    """
+    Maps the 0-5 grades of the review page (SM-2 scale) to FSRS ratings:
+    0-2 Again, 3 Hard, 4 Good, 5 Easy.
+    """
+    quality = np.asarray(quality)
+    return np.clip(quality - 1, AGAIN, EASY).astype(np.int64)
+
+
+def retrievability(elapsed_days, stability):
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+
+def init_stability(w, rating):
+    return np.asarray(w)[rating - 1]
+
+
+def init_difficulty(w, rating):
+    return np.clip(w[4] - (rating - 3) * w[5], 1, 10)
+
+
+def next_difficulty(w, difficulty, rating):
+    updated = difficulty - w[6] * (rating - 3)
+    # Mean reversion towards the difficulty of a card first rated Easy
+    return np.clip(w[7] * init_difficulty(w, EASY) + (1 - w[7]) * updated, 1, 10)
+
+
+def stability_after_success(w, difficulty, stability, recall, rating):
+    hard_penalty = np.where(rating == HARD, w[15], 1)
+    easy_bonus = np.where(rating == EASY, w[16], 1)
+    return stability * (
+        1 + np.exp(w[8]) * (11 - difficulty) * stability ** -w[9]
+        * np.expm1(w[10] * (1 - recall)) * hard_penalty * easy_bonus
+    )
+
+
+def stability_after_failure(w, difficulty, stability, recall):
+    forgotten = w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1) * np.exp(w[14] * (1 - recall))
+    return np.minimum(forgotten, stability)
+
+
+def review(w, stability, difficulty, elapsed_days, rating):
+    """
+    New (stability, difficulty) after a review. Cards never reviewed with
+    FSRS have a NaN stability and are initialized from the rating.
+    """
+    w = np.asarray(w, dtype=np.float64)
+    stability = np.asarray(stability, dtype=np.float64)
+    difficulty = np.asarray(difficulty, dtype=np.float64)
+    rating = np.asarray(rating, dtype=np.int64)
+    new = np.isnan(stability)
+
+    known_s = np.where(new, 1.0, stability)
+    known_d = np.where(new, 5.0, difficulty)
+    recall = retrievability(np.maximum(elapsed_days, 0), known_s)
+    reviewed_s = np.where(
+        rating == AGAIN,
+        stability_after_failure(w, known_d, known_s, recall),
+        stability_after_success(w, known_d, known_s, recall, rating)
+    )
+    return (
+        np.where(new, init_stability(w, rating), np.maximum(reviewed_s, 0.01)),
+        np.where(new, init_difficulty(w, rating), next_difficulty(w, known_d, rating)),
+    )
+
+
+def next_interval(stability, desired_retention=0.9, max_interval=MAX_INTERVAL):
+    interval = stability / FACTOR * (desired_retention ** (1 / DECAY) - 1)
+    return np.clip(np.round(interval), 1, max_interval).astype(np.int64)
+
+
+# --- Parameter optimization -------------------------------------------------
+
+class ReviewHistory:
+    """
+    A review log laid out for vectorized replay: events are grouped by their
+    rank in their card's history, so step k updates the k-th review of every
+    card at once. `card_ids` must be sorted by card then review time.
+    """
+
+    def __init__(self, card_ids, elapsed_days, ratings):
+        card_ids = np.asarray(card_ids)
+        _, card_index = np.unique(card_ids, return_inverse=True)
+        starts = np.r_[0, np.flatnonzero(np.diff(card_index)) + 1]
+        lengths = np.diff(np.r_[starts, len(card_index)])
+        rank = np.arange(len(card_index)) - np.repeat(starts, lengths)
+
+        order = np.argsort(rank, kind='stable')
+        self.card_index = card_index[order]
+        self.elapsed_days = np.asarray(elapsed_days, dtype=np.float64)[order]
+        self.ratings = np.asarray(ratings, dtype=np.int64)[order]
+        self.step_bounds = np.searchsorted(rank[order], np.arange(rank.max() + 2)) if len(rank) else np.array([0])
+        self.cards = int(card_index.max()) + 1 if len(card_index) else 0
+        self.events = len(card_index)
+
+    def loss(self, w):
+        """
+        Mean log loss of the recall predicted before every review after the
+        first one (recalled = any rating but Again).
+        """
+        w = np.asarray(w, dtype=np.float64)
+        stability = np.full(self.cards, np.nan)
+        difficulty = np.full(self.cards, np.nan)
+        total, count = 0.0, 0
+        for step in range(len(self.step_bounds) - 1):
+            events = slice(self.step_bounds[step], self.step_bounds[step + 1])
+            cards = self.card_index[events]
+            elapsed = self.elapsed_days[events]
+            ratings = self.ratings[events]
+            if step:
+                recall = np.clip(retrievability(np.maximum(elapsed, 0), stability[cards]), 1e-6, 1 - 1e-6)
+                recalled = ratings > AGAIN
+                total -= np.sum(np.where(recalled, np.log(recall), np.log1p(-recall)))
+                count += len(cards)
+            stability[cards], difficulty[cards] = review(w, stability[cards], difficulty[cards], elapsed, ratings)
+        return total / count if count else 0.0
+
+
+def optimize(history, initial=DEFAULT_PARAMETERS, iterations=300, learning_rate=0.01, seed=0):
+    """
+    Fits the 17 parameters to a ReviewHistory by minimizing its log loss.
+    The gradient is estimated by simultaneous perturbation (two loss
+    evaluations per iteration whatever the number of parameters) and
+    followed with Adam in a space where every parameter spans [0, 1].
+    Returns (parameters, initial loss, final loss).
+    """
+    rng = np.random.default_rng(seed)
+    low, high = PARAMETER_BOUNDS[:, 0], PARAMETER_BOUNDS[:, 1]
+
+    def to_parameters(u):
+        return low + np.clip(u, 0, 1) * (high - low)
+
+    u = (np.asarray(initial, dtype=np.float64) - low) / (high - low)
+    first_moment = np.zeros_like(u)
+    second_moment = np.zeros_like(u)
+    initial_loss = history.loss(to_parameters(u))
+
+    for t in range(1, iterations + 1):
+        perturbation = 0.02 / t ** 0.101
+        delta = rng.choice((-1.0, 1.0), size=u.shape)
+        gradient = (history.loss(to_parameters(u + perturbation * delta))
+                    - history.loss(to_parameters(u - perturbation * delta))) / (2 * perturbation) * delta
+        first_moment = 0.9 * first_moment + 0.1 * gradient
+        second_moment = 0.999 * second_moment + 0.001 * gradient ** 2
+        step = learning_rate * (first_moment / (1 - 0.9 ** t)) / (np.sqrt(second_moment / (1 - 0.999 ** t)) + 1e-8)
+        u = np.clip(u - step, 0, 1)
+
+    final_loss = history.loss(to_parameters(u))
+    if final_loss > initial_loss:
+        return np.asarray(initial, dtype=np.float64), initial_loss, initial_loss
+    return to_parameters(u), initial_loss, final_loss
@@ -0,0 +1,82 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .analytics import recent_mistakes, recent_mistake_ids
+from .models import GapAnalysis
+from .services import QuizGeneratorService
+
+
+def mistakes_fingerprint(detail_ids):
+    return hashlib.sha256(",".join(str(i) for i in detail_ids).encode()).hexdigest()
+
+
+def request_gap_analysis(user):
+    """
+    Returns the user's last gap analysis and queues a new one when mistakes
+    were recorded since. Only reads ScoreDetail ids: the LLM call is left
+    to the worker (or made here when QUIZ_GENERATION_INLINE is set).
+    """
+    fingerprint = mistakes_fingerprint(recent_mistake_ids(user.id))
+    analysis, _ = GapAnalysis.objects.get_or_create(user=user)
+    if analysis.fingerprint == fingerprint or analysis.status != GapAnalysis.STATUS_IDLE:
+        return analysis
+
+    # Do not hammer a failing provider: wait before retrying the same mistakes
+    retry_limit = timezone.now() - timedelta(seconds=settings.GAP_ANALYSIS_RETRY_AFTER)
+    if analysis.error and analysis.started_at and analysis.started_at > retry_limit:
+        return analysis
+
+    analysis.status = GapAnalysis.STATUS_PENDING
+    analysis.requested_at = timezone.now()
+    analysis.save(update_fields=['status', 'requested_at'])
+
+    if settings.QUIZ_GENERATION_INLINE:
+        analysis.status = GapAnalysis.STATUS_RUNNING
+        analysis.started_at = timezone.now()
+        run_gap_analysis(analysis)
+    return analysis
+
+
+def claim_next_gap_analysis():
+    """
+    Atomically moves the oldest pending analysis to 'running' and returns it.
+    """
+    while True:
+        analysis = GapAnalysis.objects.filter(status=GapAnalysis.STATUS_PENDING).order_by('requested_at').first()
+        if analysis is None:
+            return None
+        claimed = GapAnalysis.objects.filter(pk=analysis.pk, status=GapAnalysis.STATUS_PENDING) \
+            .update(status=GapAnalysis.STATUS_RUNNING, started_at=timezone.now())
+        if claimed:
+            analysis.refresh_from_db()
+            return analysis
+
+
+def requeue_stale_gap_analyses(max_age_seconds):
+    limit = timezone.now() - timedelta(seconds=max_age_seconds)
+    return GapAnalysis.objects.filter(status=GapAnalysis.STATUS_RUNNING, started_at__lt=limit) \
+        .update(status=GapAnalysis.STATUS_PENDING)
+
+
+def run_gap_analysis(analysis):
+    """
+    Analyzes the current recent mistakes of the user. Never raises: on
+    failure the previous analysis is kept and the error recorded.
+    """
+    try:
+        mistakes = recent_mistakes(analysis.user_id)
+        feedback = QuizGeneratorService().analyze_gaps(mistakes)
+        analysis.fingerprint = mistakes_fingerprint(m['id'] for m in mistakes)
+        analysis.feedback = feedback
+        analysis.computed_at = timezone.now()
+        analysis.error = ''
+    except Exception as e:
+        print(f"Gap analysis {analysis.pk} error: {e}")
+        analysis.error = str(e)
+    finally:
+        analysis.status = GapAnalysis.STATUS_IDLE
+        analysis.save(update_fields=['fingerprint', 'feedback', 'computed_at', 'error', 'status', 'started_at'])
+    return analysis
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Question, Quiz, ScoreHistory, ScoreDetail
+from .stats import record_attempt, record_activity
+
+NO_ANSWER = "Pas de réponse"
+DIFFICULTY_XP_MULTIPLIERS = {"Basique": 1, "Standard": 1.5, "Avancé": 2, "Expert": 2.5}
+
+
+def answer_key_cache_key(quiz_id, version):
+    # The version is part of the key: invalidate_answer_key bumps it in the
+    # database, so no process can read a stale key even with a
+    # per-process cache
+    return f"quiz:answer_key:{quiz_id}:{version}"
+
+
+def build_answer_key(quiz_id, version=None):
+    """
+    Compiles the answer key of a quiz, [(question_id, correct_answer), ...]
+    in the order of the take form (fields are numbered by position), and
+    stores it in the cache under the quiz's current answer_key_version
+    (read from the database when not given). Only the two needed columns
+    are read.
+    """
+    if version is None:
+        version = Quiz.objects.filter(pk=quiz_id).values_list('answer_key_version', flat=True).get()
+    answer_key = [
+        (question_id, _normalize(correct_answer))
+        for question_id, correct_answer in Question.objects.filter(quiz_id=quiz_id).order_by('id').values_list('id', 'correct_answer')
+    ]
+    cache.set(answer_key_cache_key(quiz_id, version), answer_key, settings.ANSWER_KEY_CACHE_TIMEOUT)
+    return answer_key
+
+
+def get_answer_key(quiz_obj):
+    answer_key = cache.get(answer_key_cache_key(quiz_obj.id, quiz_obj.answer_key_version))
+    if answer_key is None:
+        answer_key = build_answer_key(quiz_obj.id, quiz_obj.answer_key_version)
+    return answer_key
+
+
+def invalidate_answer_key(quiz_id):
+    """
+    Retires the cached answer key of a quiz. Called once after its questions
+    were changed (save, queryset update, bulk_create or delete alike), not
+    per question: there is no signal, so code editing questions must call it.
+    """
+    Quiz.objects.filter(pk=quiz_id).update(answer_key_version=F('answer_key_version') + 1)
+
+
+def _normalize(answer):
+    return answer.strip() if answer else answer
+
+
+def grade_submission(user, quiz_obj, answers, time_elapsed):
+    """
+    Grades the submitted form against the answer key and stores the attempt:
+    one ScoreHistory, all ScoreDetail rows in one INSERT, the UserStats
+    and DailyActivity counters and the XP/streak update, in a single
+    transaction. The number of queries does not depend on the number of
+    questions.
+    """
+    answer_key = get_answer_key(quiz_obj)
+    graded = []
+    for i, (question_id, correct_answer) in enumerate(answer_key):
+        user_answer = answers.get(f'question_{i}')
+        graded.append((question_id, user_answer, _normalize(user_answer) == correct_answer))
+    score = sum(1 for _, _, is_correct in graded if is_correct)
+    total = len(answer_key)
+
+    with transaction.atomic():
+        score_obj = ScoreHistory.objects.create(
+            user=user,
+            quiz=quiz_obj,
+            score=score,
+            total_questions=total,
+            difficulty=quiz_obj.difficulty,
+            time_elapsed=time_elapsed
+        )
+        ScoreDetail.objects.bulk_create([
+            ScoreDetail(
+                history=score_obj,
+                question_id=question_id,
+                is_correct=is_correct,
+                user_answer=user_answer or NO_ANSWER
+            )
+            for question_id, user_answer, is_correct in graded
+        ])
+
+        record_attempt(user, score, total, quiz_obj.difficulty, time_elapsed)
+        record_activity(user, timezone.localdate(score_obj.completed_at))
+
+        # Gamification: Update XP and Streak
+        multiplier = DIFFICULTY_XP_MULTIPLIERS.get(quiz_obj.difficulty, 1)
+        profile = user.profile
+        xp_earned = profile.update_xp_and_streak(score, total, multiplier)
+
+    return {
+        'score': score,
+        'total': total,
+        'history': score_obj,
+        'xp_earned': xp_earned,
+        'streak': profile.streak,
+    }
@@ -0,0 +1,210 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+# Rolling window and circuit breaker thresholds
+PROVIDER_HEALTH_WINDOW = float(os.getenv("PROVIDER_HEALTH_WINDOW", 300))  # seconds
+PROVIDER_MIN_REQUESTS = int(os.getenv("PROVIDER_MIN_REQUESTS", 5))
+PROVIDER_ERROR_THRESHOLD = float(os.getenv("PROVIDER_ERROR_THRESHOLD", 0.5))
+PROVIDER_OPEN_SECONDS = float(os.getenv("PROVIDER_OPEN_SECONDS", 60))
+PROVIDER_SNAPSHOT_INTERVAL = float(os.getenv("PROVIDER_SNAPSHOT_INTERVAL", 10))
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half-open'
+
+
+class ProviderHealth:
+    """
+    Rolling error rate and latencies of one provider, with a circuit breaker:
+    - closed: requests go through;
+    - open: the error rate went above the threshold, requests are skipped
+      for PROVIDER_OPEN_SECONDS;
+    - half-open: a single probe request is allowed, its outcome closes or
+      re-opens the circuit.
+    The clock is injectable for tests.
+    """
+
+    def __init__(self, name, clock=time.monotonic):
+        self.name = name
+        self.clock = clock
+        self.events = deque()  # (timestamp, ok, latency)
+        self.state = STATE_CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.last_snapshot = 0
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and self.clock() - self.opened_at >= PROVIDER_OPEN_SECONDS:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record(self, ok, latency):
+        with self.lock:
+            now = self.clock()
+            self.events.append((now, ok, latency))
+            self._trim(now)
+            previous = self.state
+            if self.state == STATE_HALF_OPEN:
+                self.probe_in_flight = False
+                if ok:
+                    self.state = STATE_CLOSED
+                    self.events.clear()
+                else:
+                    self._open(now)
+            elif self.state == STATE_CLOSED and len(self.events) >= PROVIDER_MIN_REQUESTS \
+                    and self._error_rate() >= PROVIDER_ERROR_THRESHOLD:
+                self._open(now)
+            changed = previous != self.state
+        if changed:
+            print(f"Provider {self.name}: circuit {previous} -> {self.state}")
+        return changed
+
+    def snapshot(self):
+        with self.lock:
+            self._trim(self.clock())
+            latencies = sorted(latency for _, _, latency in self.events)
+            return {
+                'provider': self.name,
+                'state': self.state,
+                'requests': len(self.events),
+                'error_rate': round(self._error_rate(), 3),
+                'latency_p50': _percentile(latencies, 50),
+                'latency_p95': _percentile(latencies, 95),
+            }
+
+    def _open(self, now):
+        self.state = STATE_OPEN
+        self.opened_at = now
+
+    def _trim(self, now):
+        while self.events and now - self.events[0][0] > PROVIDER_HEALTH_WINDOW:
+            self.events.popleft()
+
+    def _error_rate(self):
+        if not self.events:
+            return 0.0
+        return sum(1 for _, ok, _ in self.events if not ok) / len(self.events)
+
+
+class ProviderHealthRegistry:
+    """
+    Process-wide scoreboard of the LLM providers. Snapshots are written to
+    ProviderHealthSnapshot (at most every PROVIDER_SNAPSHOT_INTERVAL seconds,
+    and on every circuit change) so the `provider_health` command and the
+    admin can see the state of every process. The writes are made by a
+    background thread owned by the registry, never on the provider call path.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.providers = {}
+        self.lock = threading.Lock()
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        self.dirty = {}  # provider -> latest snapshot not written yet
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.writer = None
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.providers:
+                self.providers[name] = ProviderHealth(name, self.clock)
+            return self.providers[name]
+
+    def allow_request(self, name):
+        return self.get(name).allow_request()
+
+    def record(self, name, ok, latency):
+        health = self.get(name)
+        changed = health.record(ok, latency)
+        now = self.clock()
+        if changed or now - health.last_snapshot >= PROVIDER_SNAPSHOT_INTERVAL:
+            health.last_snapshot = now
+            with self.lock:
+                self.dirty[name] = health.snapshot()
+                self._start_writer()
+            if changed:
+                self.wakeup.set()
+
+    def snapshot(self):
+        with self.lock:
+            providers = list(self.providers.values())
+        return [health.snapshot() for health in providers]
+
+    def reset(self):
+        with self.lock:
+            self.providers = {}
+            self.dirty = {}
+
+    def flush(self):
+        """
+        Writes the pending snapshots. Called by the writer thread; callable
+        directly (tests, shutdown).
+        """
+        with self.lock:
+            pending, self.dirty = self.dirty, {}
+        for data in pending.values():
+            self._persist(data)
+
+    def stop(self, timeout=None):
+        """
+        Stops the writer thread once it has written the pending snapshots
+        (tests, shutdown). A later record starts a new one.
+        """
+        with self.lock:
+            writer, self.writer = self.writer, None
+        if writer is None:
+            return
+        self.stopping.set()
+        self.wakeup.set()
+        writer.join(timeout)
+        self.stopping.clear()
+
+    def _start_writer(self):
+        # Called with self.lock held
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = threading.Thread(target=self._write_loop, name='provider-health-writer', daemon=True)
+            self.writer.start()
+
+    def _write_loop(self):
+        from django.db import connection
+        while not self.stopping.is_set():
+            # Circuit changes are written at once, other snapshots batched
+            self.wakeup.wait(PROVIDER_SNAPSHOT_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread only writes every few seconds: do not keep a connection open
+                connection.close()
+
+    def _persist(self, data):
+        from .models import ProviderHealthSnapshot
+        try:
+            ProviderHealthSnapshot.objects.update_or_create(
+                provider=data['provider'],
+                process=self.process,
+                defaults={key: value for key, value in data.items() if key != 'provider'}
+            )
+        except Exception as e:
+            print(f"Provider health snapshot error: {e}")
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = max(0, round(percent / 100 * len(sorted_values)) - 1)
+    return round(sorted_values[index], 3)
+
+
+provider_health = ProviderHealthRegistry()
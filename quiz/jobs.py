@@ -0,0 +1,198 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import GenerationCache
+from .grading import build_answer_key, invalidate_answer_key
+from .models import GenerationJob, Quiz, Question
+from .services import QuizGeneratorService, DocumentProcessor, YouTubeProcessor, OCRProcessor, QUIZ_PROVIDER_TIMEOUT
+
+MIN_TEXT_LENGTH = 50
+# Longest time between two heartbeats of a live worker: one chunk or question
+# may wait for every provider (Gemini, OpenAI, OpenRouter) in turn
+STALE_JOB_AFTER = int(3 * QUIZ_PROVIDER_TIMEOUT + 60)
+
+
+class JobLost(Exception):
+    """The job was requeued and claimed by another worker meanwhile."""
+
+
+def claim_next_job():
+    """
+    Atomically moves the oldest pending job to 'running' and returns it.
+    The conditional UPDATE makes it safe to run several workers at once;
+    the claim is identified by the new `attempts` value.
+    """
+    while True:
+        job = GenerationJob.objects.filter(status=GenerationJob.STATUS_PENDING).order_by('created_at').first()
+        if job is None:
+            return None
+        if claim_job(job):
+            return job
+
+
+def claim_job(job):
+    """
+    Moves `job` from 'pending' to 'running' for this worker (or request).
+    Returns False when it was claimed by someone else first.
+    """
+    claimed = GenerationJob.objects.filter(pk=job.pk, status=GenerationJob.STATUS_PENDING) \
+        .update(status=GenerationJob.STATUS_RUNNING, started_at=timezone.now(), heartbeat_at=timezone.now(),
+                attempts=F('attempts') + 1)
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def requeue_stale_jobs(max_age_seconds=STALE_JOB_AFTER):
+    """
+    Puts back in the queue jobs left 'running' by a worker that died: no
+    heartbeat for `max_age_seconds`.
+    """
+    limit = timezone.now() - timedelta(seconds=max_age_seconds)
+    return GenerationJob.objects.filter(status=GenerationJob.STATUS_RUNNING, heartbeat_at__lt=limit) \
+        .update(status=GenerationJob.STATUS_PENDING, started_at=None)
+
+
+def _owned(job):
+    # Still this worker's claim: running, and not claimed again since
+    return GenerationJob.objects.filter(pk=job.pk, status=GenerationJob.STATUS_RUNNING, attempts=job.attempts)
+
+
+def _heartbeat(job):
+    """
+    Records that the worker is alive. Returns False when the job is no
+    longer this worker's.
+    """
+    return bool(_owned(job).update(heartbeat_at=timezone.now()))
+
+
+def extract_job_text(job):
+    if job.source_type == 'youtube':
+        return YouTubeProcessor.extract_transcript(job.youtube_url)
+    if not job.source_file:
+        return None
+    with job.source_file.open('rb') as f:
+        if job.source_type == 'image':
+            return OCRProcessor.extract_text_from_image(f)
+        return DocumentProcessor.extract_text(f)
+
+
+def run_job(job):
+    """
+    Extracts the source text, calls the LLM providers and stores the quiz.
+    Never raises: failures are recorded on the job. Results are only stored
+    while the job is still this worker's claim (see requeue_stale_jobs).
+    """
+    lost = False
+    try:
+        text = extract_job_text(job)
+        if not text or len(text.strip()) < MIN_TEXT_LENGTH:
+            _fail(job, "Impossible d'extraire assez de texte de cette source. Vérifiez la source ou réessayez.")
+            return job
+
+        service = QuizGeneratorService()
+        service.on_progress = lambda: _heartbeat(job)
+        signature = service.provider_signature()
+        cache_key = GenerationCache.make_key(text, job.num_questions, job.difficulty, signature)
+        quiz_data = GenerationCache.get(cache_key)
+
+        if quiz_data is None and settings.QUIZ_STREAMING_GENERATION:
+            # The quiz exists from the start and each question is saved as soon as
+            # it is parsed, so the take page can show it while generation goes on
+            with transaction.atomic():
+                quiz_obj = job.quiz = _job_quiz(job)
+                if not _owned(job).update(quiz=quiz_obj, heartbeat_at=timezone.now()):
+                    raise JobLost
+            quiz_data = []
+            for q in service.generate_quiz_stream(text, job.num_questions, job.difficulty):
+                if not _heartbeat(job):
+                    raise JobLost
+                _build_question(quiz_obj, q).save()
+                quiz_data.append(q)
+            _finish(job, quiz_obj)
+        else:
+            if quiz_data is None:
+                quiz_data = service.generate_quiz(text, job.num_questions, job.difficulty)
+            with transaction.atomic():
+                quiz_obj = _job_quiz(job)
+                Question.objects.bulk_create([_build_question(quiz_obj, q) for q in quiz_data])
+                # Rolls the new quiz back when another worker owns the job now
+                _finish(job, quiz_obj)
+
+        # The regex fallback is random and low quality, never reuse it
+        if service.last_provider not in (None, 'regex'):
+            GenerationCache.set(cache_key, quiz_data, job.num_questions, job.difficulty, signature)
+
+        # One version bump for the whole batch: a requeued job may reuse a
+        # quiz whose partial key was cached. Compiled once here so grading
+        # never has to read the questions
+        invalidate_answer_key(quiz_obj.id)
+        build_answer_key(quiz_obj.id)
+    except JobLost:
+        print(f"Generation job {job.pk} claimed by another worker, results dropped")
+        lost = True
+    except Exception as e:
+        print(f"Generation job {job.pk} error: {e}")
+        _fail(job, "Une erreur est survenue pendant la génération du quiz. Veuillez réessayer.")
+    finally:
+        # After a requeue the other worker still needs the source file
+        if job.source_file and not lost:
+            job.source_file.delete(save=False)
+            GenerationJob.objects.filter(pk=job.pk).update(source_file='')
+    return job
+
+
+def _finish(job, quiz_obj):
+    finished_at = timezone.now()
+    if not _owned(job).update(quiz=quiz_obj, status=GenerationJob.STATUS_DONE, finished_at=finished_at):
+        raise JobLost
+    job.quiz = quiz_obj
+    job.status = GenerationJob.STATUS_DONE
+    job.finished_at = finished_at
+
+
+def _job_quiz(job):
+    """
+    The quiz of the job: a new one, or the one a streaming run already
+    created when the job was requeued or retried, emptied of its partial
+    questions so they are not duplicated.
+    """
+    if job.quiz_id:
+        Question.objects.filter(quiz_id=job.quiz_id).delete()
+        return job.quiz
+    return Quiz.objects.create(
+        user=job.user,
+        title=job.title,
+        difficulty=job.difficulty,
+        time_limit=job.time_limit,
+        is_exam_mode=job.is_exam_mode
+    )
+
+
+def _build_question(quiz_obj, q):
+    return Question(
+        quiz=quiz_obj,
+        text=q['question'],
+        options=q['options'],
+        correct_answer=q['answer'],
+        explanation=q.get('explanation', '')
+    )
+
+
+def _fail(job, message):
+    with transaction.atomic():
+        finished_at = timezone.now()
+        if not _owned(job).update(status=GenerationJob.STATUS_FAILED, error=message, finished_at=finished_at, quiz=None):
+            return
+        if job.quiz_id:
+            # Partial questions of a streaming run: the take page sends the user
+            # back to the status page, which shows the error
+            Quiz.objects.filter(pk=job.quiz_id).delete()
+    job.quiz = None
+    job.status = GenerationJob.STATUS_FAILED
+    job.error = message
+    job.finished_at = finished_at
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from quiz.stats import rebuild_daily_activity
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'activité quotidienne (DailyActivity) à partir de l'historique des scores."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', help="Nom d'utilisateur à recalculer (répétable). Par défaut : tous.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username__in=options['user'])
+
+        count = 0
+        for user in users.iterator():
+            rebuild_daily_activity(user)
+            count += 1
+        self.stdout.write(f"{count} utilisateur(s) recalculé(s).")
@@ -0,0 +1,36 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from quiz.review_log import export_csv_lines, review_log_range
+
+
+def _parse_day(value):
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Date invalide : {value} (format AAAA-MM-JJ).")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Command(BaseCommand):
+    help = "Exporte le journal des révisions de flashcards en CSV (sortie standard ou fichier), sans le charger en mémoire."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Première date incluse (AAAA-MM-JJ).")
+        parser.add_argument('--until', help="Date de fin exclue (AAAA-MM-JJ).")
+        parser.add_argument('--output', help="Fichier de destination. Par défaut : sortie standard.")
+
+    def handle(self, *args, **options):
+        logs = review_log_range(
+            since=_parse_day(options['since']) if options['since'] else None,
+            until=_parse_day(options['until']) if options['until'] else None
+        )
+        lines = export_csv_lines(logs)
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.fake_llm import DISTRIBUTIONS, FakeLLMConfig, FakeLLMServer
+
+
+class Command(BaseCommand):
+    help = "Lance un faux fournisseur LLM local (format OpenAI / OpenRouter) pour les tests de charge hors ligne."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.5, help="Latence médiane (secondes).")
+        parser.add_argument('--spread', type=float, default=0.2,
+                            help="Dispersion : demi-largeur (uniform) ou sigma (lognormal).")
+        parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='lognormal')
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Part des requêtes en erreur (0 à 1).")
+        parser.add_argument('--error-status', type=int, default=500)
+        parser.add_argument('--quiz-file', help="Fichier JSON contenant la liste de questions à renvoyer.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        quiz = None
+        if options['quiz_file']:
+            try:
+                with open(options['quiz_file'], encoding='utf-8') as f:
+                    quiz = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Fichier de quiz invalide : {e}")
+            if isinstance(quiz, dict):
+                quiz = quiz.get('quiz')
+            if not isinstance(quiz, list) or not quiz:
+                raise CommandError("Le fichier doit contenir une liste de questions.")
+
+        config = FakeLLMConfig(
+            latency=options['latency'],
+            spread=options['spread'],
+            distribution=options['distribution'],
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            quiz=quiz,
+            seed=options['seed'],
+        )
+        server = FakeLLMServer(options['host'], options['port'], config)
+        self.stdout.write(f"Faux fournisseur LLM sur {server.base_url}")
+        self.stdout.write(f"  OPENAI_BASE_URL={server.base_url}/v1")
+        self.stdout.write(f"  OPENROUTER_URL={server.base_url}/api/v1/chat/completions")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            self.stdout.write(f"{config.requests} requête(s), {config.errors} erreur(s) simulée(s).")
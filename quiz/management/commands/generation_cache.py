@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from quiz.cache import GenerationCache
+
+
+class Command(BaseCommand):
+    help = "Affiche les statistiques du cache de génération de quiz."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true', help="Supprime les entrées expirées ou en surnombre.")
+        parser.add_argument('--clear', action='store_true', help="Vide le cache et remet les compteurs à zéro.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            GenerationCache.clear()
+            self.stdout.write("Cache vidé.")
+        elif options['evict']:
+            self.stdout.write(f"{GenerationCache.evict()} entrée(s) supprimée(s).")
+
+        stats = GenerationCache.stats()
+        self.stdout.write(f"Entrées  : {stats['entries']}")
+        self.stdout.write(f"Hits     : {stats['hits']}")
+        self.stdout.write(f"Misses   : {stats['misses']}")
+        self.stdout.write(f"Hit rate : {stats['hit_rate']:.1%}")
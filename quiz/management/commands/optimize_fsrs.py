@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from quiz import fsrs
+from quiz.models import ReviewLog
+from quiz.review_log import review_history
+
+
+class Command(BaseCommand):
+    help = "Ajuste les paramètres FSRS de chaque utilisateur à son journal de révisions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', help="Nom d'utilisateur à optimiser (répétable). Par défaut : tous.")
+        parser.add_argument('--min-reviews', type=int, default=400, help="Nombre minimal de révisions pour ajuster les paramètres.")
+        parser.add_argument('--iterations', type=int, default=300)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            id__in=ReviewLog.objects.values('user_id')
+        ).select_related('profile').order_by('id')
+        if options['user']:
+            users = users.filter(username__in=options['user'])
+
+        for user in users.iterator():
+            history = review_history(user)
+            if history.events < options['min_reviews']:
+                self.stdout.write(f"{user.username} : {history.events} révision(s), ignoré.")
+                continue
+            initial = user.profile.fsrs_parameters or fsrs.DEFAULT_PARAMETERS
+            parameters, initial_loss, final_loss = fsrs.optimize(history, initial, options['iterations'])
+            user.profile.fsrs_parameters = [round(float(w), 4) for w in parameters]
+            user.profile.save(update_fields=['fsrs_parameters'])
+            self.stdout.write(f"{user.username} : {history.events} révision(s), perte {initial_loss:.4f} -> {final_loss:.4f}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from quiz.models import Question
+from quiz.tts import AudioCache, get_audio
+
+
+class Command(BaseCommand):
+    help = "Pré-génère l'audio (lecture à voix haute) des questions et explications des quiz publics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, action='append', help="Identifiant de quiz à traiter (répétable). Par défaut : tous les quiz publics.")
+        parser.add_argument('--limit', type=int, help="Nombre maximal de nouveaux fichiers à générer.")
+
+    def handle(self, *args, **options):
+        questions = Question.objects.order_by('id')
+        if options['quiz']:
+            questions = questions.filter(quiz_id__in=options['quiz'])
+        else:
+            questions = questions.filter(quiz__is_public=True)
+
+        rendered = cached = failed = 0
+        seen = set()
+        for text, explanation in questions.values_list('text', 'explanation').iterator():
+            for content in (text, explanation):
+                if not content.strip():
+                    continue
+                key = AudioCache.make_key(content)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if AudioCache.get(key) is not None:
+                    cached += 1
+                    continue
+                if options['limit'] is not None and rendered >= options['limit']:
+                    continue
+                try:
+                    get_audio(content)
+                    rendered += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Erreur TTS : {e}")
+
+        stats = AudioCache.stats()
+        self.stdout.write(f"{rendered} audio(s) généré(s), {cached} déjà en cache, {failed} échec(s).")
+        self.stdout.write(f"Cache : {stats['files']} fichier(s), {stats['bytes'] / 1024 / 1024:.1f} Mo / {stats['max_bytes'] / 1024 / 1024:.0f} Mo")
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from quiz.models import ProviderHealthSnapshot
+
+
+class Command(BaseCommand):
+    help = "Affiche l'état de santé des fournisseurs LLM (taux d'erreur, latences, circuit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=3600,
+                            help="Ignore les processus sans activité depuis plus de N secondes.")
+        parser.add_argument('--purge', action='store_true', help="Supprime les instantanés plus anciens que --max-age.")
+
+    def handle(self, *args, **options):
+        limit = timezone.now() - timedelta(seconds=options['max_age'])
+        if options['purge']:
+            deleted, _ = ProviderHealthSnapshot.objects.filter(updated_at__lt=limit).delete()
+            self.stdout.write(f"{deleted} instantané(s) supprimé(s).")
+
+        snapshots = ProviderHealthSnapshot.objects.filter(updated_at__gte=limit)
+        if not snapshots:
+            self.stdout.write("Aucune donnée récente.")
+            return
+
+        self.stdout.write(f"{'Fournisseur':<12} {'Processus':<28} {'Circuit':<10} {'Req.':>5} {'Erreurs':>8} {'p50 (s)':>8} {'p95 (s)':>8}  Mis à jour")
+        for s in snapshots:
+            p50 = f"{s.latency_p50:.2f}" if s.latency_p50 is not None else "-"
+            p95 = f"{s.latency_p95:.2f}" if s.latency_p95 is not None else "-"
+            line = f"{s.provider:<12} {s.process:<28} {s.state:<10} {s.requests:>5} {s.error_rate:>8.0%} {p50:>8} {p95:>8}  {s.updated_at:%H:%M:%S}"
+            self.stdout.write(self.style.ERROR(line) if s.state != 'closed' else line)
@@ -0,0 +1,58 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le cycle de vie d'un quiz (extraction, génération locale, correction, historique, "
+        "analytiques, SRS) sur les données de `seed_benchmark_data`. Lancer sans clés d'API "
+        "(ou avec `fake_llm_server`) pour ne pas appeler de vrai fournisseur."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats.")
+        parser.add_argument('--compare', help="Résultats JSON de référence (autre commit) à comparer.")
+        parser.add_argument('--only', nargs='*', help="Ne lance que les scénarios dont le nom contient ces motifs.")
+        parser.add_argument('--skip-documents', action='store_true', help="Ignore les scénarios d'extraction PDF/DOCX.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=benchmarks.BENCH_USERNAME).first()
+        if user is None:
+            raise CommandError("Lancez d'abord `python manage.py seed_benchmark_data --rows N`.")
+
+        rows = user.scores.count()
+        self.stdout.write(f"Benchmarks sur {rows} lignes d'historique...")
+        results = {
+            'environment': benchmarks.environment(rows),
+            'results': benchmarks.run(
+                user,
+                only=options['only'],
+                include_documents=not options['skip_documents'],
+                log=self.stdout.write
+            ),
+        }
+
+        self.stdout.write("")
+        self.stdout.write(f"{'Scénario':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Requêtes':>9} {'SQL ms':>8} {'Mém. Ko':>9}")
+        for name, r in results['results'].items():
+            self.stdout.write(
+                f"{name:<26} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+                f"{r['queries']:>9} {r['query_time_ms']:>8.2f} {r['peak_memory_kb']:>9.1f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"\nRésultats écrits dans {options['output']}")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.stdout.write(f"\nComparaison avec {baseline.get('environment', {}).get('commit') or options['compare']} :")
+            for name, metric, old, new, change in benchmarks.compare(baseline, results):
+                change_text = f"{change:+.1f}%" if change is not None else "n/a"
+                self.stdout.write(f"  {name:<26} {metric:<15} {old:>10} -> {new:<10} {change_text}")
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz.cache import GenerationCache
+from quiz.gaps import claim_next_gap_analysis, requeue_stale_gap_analyses, run_gap_analysis
+from quiz.jobs import STALE_JOB_AFTER, claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Traite en arrière-plan les demandes de génération de quiz (GenerationJob) et les analyses de lacunes (GapAnalysis)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Traite les jobs en attente puis s'arrête.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Délai entre deux scrutations de la file (secondes).")
+        parser.add_argument('--stale-after', type=int, default=STALE_JOB_AFTER,
+                            help="Remet en file les jobs en cours sans signe de vie depuis plus de N secondes.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker de génération démarré.")
+        try:
+            while True:
+                requeue_stale_jobs(options['stale_after'])
+                requeue_stale_gap_analyses(options['stale_after'])
+                job = claim_next_job()
+                if job is None:
+                    # Quiz generation first: a user is waiting on it
+                    analysis = claim_next_gap_analysis()
+                    if analysis is not None:
+                        started = time.monotonic()
+                        run_gap_analysis(analysis)
+                        self.stdout.write(f"Analyse #{analysis.pk} en {time.monotonic() - started:.1f}s")
+                        continue
+                    # Idle: a good time to write the cache counters
+                    GenerationCache.flush_stats()
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                started = time.monotonic()
+                run_job(job)
+                self.stdout.write(f"Job #{job.pk} {job.status} en {time.monotonic() - started:.1f}s")
+        except KeyboardInterrupt:
+            GenerationCache.flush_stats()
+            self.stdout.write("Worker arrêté.")
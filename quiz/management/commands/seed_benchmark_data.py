@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Crée l'utilisateur 'bench_user' et N lignes d'historique pour les benchmarks (remplace les données existantes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Nombre de ScoreHistory (ex. 1000, 100000, 1000000).")
+        parser.add_argument('--days', type=int, default=365, help="Période couverte par l'historique.")
+        parser.add_argument('--detailed', type=int, default=1000,
+                            help="Nombre de tentatives récentes avec leurs ScoreDetail.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.stdout.write(f"Génération de {options['rows']} lignes...")
+        benchmarks.seed(
+            options['rows'],
+            days=options['days'],
+            detailed_histories=options['detailed'],
+            seed_value=options['seed'],
+            log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(f"Terminé en {time.monotonic() - started:.1f}s"))
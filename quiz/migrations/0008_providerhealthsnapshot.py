@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_generation_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderHealthSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=50)),
+                ('process', models.CharField(max_length=100)),
+                ('state', models.CharField(max_length=20)),
+                ('requests', models.IntegerField(default=0)),
+                ('error_rate', models.FloatField(default=0)),
+                ('latency_p50', models.FloatField(blank=True, null=True)),
+                ('latency_p95', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['provider', '-updated_at'],
+                'unique_together': {('provider', 'process')},
+            },
+        ),
+    ]
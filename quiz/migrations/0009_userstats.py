@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_providerhealthsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quiz_count', models.IntegerField(default=0)),
+                ('score_sum', models.IntegerField(default=0)),
+                ('total_sum', models.IntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+                ('time_seconds', models.IntegerField(default=0)),
+                ('by_difficulty', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Stats',
+            },
+        ),
+    ]
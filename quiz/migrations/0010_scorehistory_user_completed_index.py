@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_userstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scorehistory',
+            index=models.Index(fields=['user', 'completed_at', 'id'], name='quiz_score_user_completed_idx'),
+        ),
+    ]
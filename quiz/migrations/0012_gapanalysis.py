@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_dailyactivity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GapAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(blank=True, max_length=64)),
+                ('feedback', models.TextField(blank=True)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('idle', 'À jour'), ('pending', 'En attente'), ('running', 'En cours')], db_index=True, default='idle', max_length=20)),
+                ('requested_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='gap_analysis', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Gap Analyses',
+            },
+        ),
+    ]
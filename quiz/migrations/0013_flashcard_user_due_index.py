@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_gapanalysis'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['user', 'next_review_date'], name='quiz_flashcard_user_due_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0013_flashcard_user_due_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='difficulty',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='last_review_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='stability',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
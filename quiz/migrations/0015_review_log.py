@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0014_flashcard_fsrs_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reviewed_at', models.DateTimeField()),
+                ('quality', models.PositiveSmallIntegerField()),
+                ('elapsed_days', models.IntegerField(null=True)),
+                ('previous_interval', models.IntegerField()),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='quiz.flashcard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flashcard_reviews', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['reviewed_at'], name='quiz_reviewlog_time_idx'), models.Index(fields=['user', 'reviewed_at'], name='quiz_reviewlog_user_time_idx'), models.Index(fields=['card', 'reviewed_at'], name='quiz_reviewlog_card_time_idx')],
+            },
+        ),
+    ]
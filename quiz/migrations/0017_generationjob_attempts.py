@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0016_quiz_answer_key_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Quiz(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quizzes')
@@ -11,6 +12,9 @@ class Quiz(models.Model):
     is_public = models.BooleanField(default=False)
     likes = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the answer key cache key, bumped once after questions are
+    # changed (quiz.grading.invalidate_answer_key)
+    answer_key_version = models.PositiveIntegerField(default=0)
 
 
     class Meta:
@@ -41,6 +45,10 @@ class ScoreHistory(models.Model):
     class Meta:
         ordering = ['-completed_at']
         verbose_name_plural = "Score Histories"
+        indexes = [
+            # Keyset pagination of the history (quiz.views._history_page)
+            models.Index(fields=['user', 'completed_at', 'id'], name='quiz_score_user_completed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.score}/{self.total_questions} ({self.difficulty})"
@@ -66,15 +74,35 @@ class Flashcard(models.Model):
     easiness_factor = models.FloatField(default=2.5)
     repetition_count = models.IntegerField(default=0)
     next_review_date = models.DateField(auto_now_add=True)
+    last_review_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # FSRS memory state (quiz.fsrs), set by the first review under FSRS
+    stability = models.FloatField(null=True, blank=True) # days
+    difficulty = models.FloatField(null=True, blank=True) # 1-10
+
+    class Meta:
+        indexes = [
+            # Due-card queue of the review sessions (quiz.srs)
+            models.Index(fields=['user', 'next_review_date'], name='quiz_flashcard_user_due_idx'),
+        ]
+
     def __str__(self):
         return f"Flashcard: {self.question[:30]}"
     
     def update_srs(self, quality):
+        # Same scheduler (SM-2 or FSRS) and load balancing as quiz.srs.apply_reviews
+        from .schedulers import get_scheduler
+        log = ReviewLog.for_review(self, quality)
+        get_scheduler(self.user.profile).review([self], [quality])
+        self.save()
+        log.save()
+
+    def apply_sm2(self, quality):
         """
         quality: 0-5 (0 = forgot, 5 = perfect)
-        Based on SM-2 Algorithm
+        Based on SM-2 Algorithm, whatever the user's scheduler (see
+        quiz.schedulers). Updates the fields without saving.
         """
         if quality >= 3:
             if self.repetition_count == 0:
@@ -92,6 +120,240 @@ class Flashcard(models.Model):
         self.easiness_factor = max(1.3, self.easiness_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
         
         from datetime import date, timedelta
-        self.next_review_date = date.today() + timedelta(days=self.interval)
-        self.save()
+        self.last_review_date = date.today()
+        self.next_review_date = self.last_review_date + timedelta(days=self.interval)
+
+
+class ReviewLog(models.Model):
+    """
+    One row per flashcard review, never updated: the history that the card
+    rows overwrite. Read by retention analytics and by the FSRS optimizer
+    (quiz.review_log). Written in batches alongside the card updates.
+    """
+    card = models.ForeignKey(Flashcard, on_delete=models.CASCADE, related_name='reviews')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='flashcard_reviews')
+    reviewed_at = models.DateTimeField()
+    quality = models.PositiveSmallIntegerField() # 0-5
+    elapsed_days = models.IntegerField(null=True) # since the previous review, null for the first one
+    previous_interval = models.IntegerField() # days
+
+    class Meta:
+        indexes = [
+            # Time-range scans and purges by period (export, retention)
+            models.Index(fields=['reviewed_at'], name='quiz_reviewlog_time_idx'),
+            models.Index(fields=['user', 'reviewed_at'], name='quiz_reviewlog_user_time_idx'),
+            # Replay of each card's history (FSRS optimizer)
+            models.Index(fields=['card', 'reviewed_at'], name='quiz_reviewlog_card_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.card_id} @ {self.reviewed_at}: {self.quality}"
+
+    @classmethod
+    def for_review(cls, card, quality, today=None):
+        """
+        Unsaved log entry for a review of `card` on `today`, built from its
+        state before the review is applied.
+        """
+        from datetime import date
+        today = today or date.today()
+        last_review = card.last_review_date
+        return cls(
+            card_id=card.id,
+            user_id=card.user_id,
+            reviewed_at=timezone.now(),
+            quality=quality,
+            elapsed_days=(today - last_review).days if last_review else None,
+            previous_interval=card.interval
+        )
+
+
+class GenerationJob(models.Model):
+    """
+    A quiz generation request processed outside the HTTP request
+    by the `run_generation_worker` management command.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    source_type = models.CharField(max_length=20)
+    source_file = models.FileField(upload_to='generation_jobs/', blank=True)
+    youtube_url = models.URLField(blank=True)
+    title = models.CharField(max_length=255)
+    num_questions = models.IntegerField(default=5)
+    difficulty = models.CharField(max_length=50)
+    time_limit = models.IntegerField(default=5)
+    is_exam_mode = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    error = models.TextField(blank=True)
+    quiz = models.ForeignKey(Quiz, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Incremented on every claim: the take page restarts when a requeued job regenerates the
+    # questions, and a worker whose job was claimed again does not store its results
+    attempts = models.PositiveIntegerField(default=0)
+    # Touched by the worker after each chunk or question; stale jobs are requeued from it
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Job #{self.pk} - {self.title} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class GenerationCacheEntry(models.Model):
+    """
+    Questions generated for a given source text and generation parameters.
+    See quiz.cache.GenerationCache.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    num_questions = models.IntegerField()
+    difficulty = models.CharField(max_length=50)
+    provider_signature = models.CharField(max_length=255)
+    questions = models.JSONField()
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = "Generation Cache Entries"
+
+    def __str__(self):
+        return f"{self.key[:12]} - {self.num_questions} questions ({self.difficulty})"
 
+
+class GenerationCacheStats(models.Model):
+    """
+    Single row holding the global hit/miss counters of the generation cache.
+    """
+    hits = models.BigIntegerField(default=0)
+    misses = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Generation Cache Stats"
+
+    def __str__(self):
+        return f"{self.hits} hits / {self.misses} misses"
+
+
+class ProviderHealthSnapshot(models.Model):
+    """
+    Last known health of an LLM provider as seen by one process
+    (web worker or generation worker). See quiz.health.
+    """
+    provider = models.CharField(max_length=50)
+    process = models.CharField(max_length=100)
+    state = models.CharField(max_length=20)
+    requests = models.IntegerField(default=0)
+    error_rate = models.FloatField(default=0)
+    latency_p50 = models.FloatField(null=True, blank=True)
+    latency_p95 = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['provider', '-updated_at']
+        unique_together = ['provider', 'process']
+
+    def __str__(self):
+        return f"{self.provider}@{self.process} - {self.state}"
+
+
+
+class UserStats(models.Model):
+    """
+    Per-user rollup of ScoreHistory, updated in the grading transaction
+    (quiz.stats.record_attempt) so dashboards read one row whatever the
+    history length. `rebuild_user_stats` recomputes it from the history.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='quiz_stats')
+    quiz_count = models.IntegerField(default=0)
+    score_sum = models.IntegerField(default=0)
+    total_sum = models.IntegerField(default=0)
+    best_score = models.IntegerField(default=0)
+    time_seconds = models.IntegerField(default=0)
+    # {difficulty: {"count": n, "score_sum": n, "total_sum": n}}
+    by_difficulty = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "User Stats"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.quiz_count} quiz"
+
+    @property
+    def avg_score(self):
+        return round(self.score_sum / self.quiz_count, 1) if self.quiz_count else 0
+
+    @property
+    def score_pct(self):
+        return round(self.score_sum / self.total_sum * 100) if self.total_sum else 0
+
+
+
+class DailyActivity(models.Model):
+    """
+    Number of quizzes graded per user and day, incremented at grade time
+    (quiz.stats.record_activity) so the activity heatmap reads a bounded
+    date range instead of grouping the whole ScoreHistory.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_activity')
+    date = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = "Daily Activity"
+        # Also the index used by the date range scans of the heatmap
+        unique_together = ['user', 'date']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}: {self.count}"
+
+
+
+class GapAnalysis(models.Model):
+    """
+    Last AI gap analysis of a user's recent mistakes. `fingerprint` identifies
+    the mistakes it was computed from; a new one is queued (status pending)
+    only when the fingerprint changes, and computed by the
+    `run_generation_worker` command. See quiz.gaps.
+    """
+    STATUS_IDLE = 'idle'
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_CHOICES = [
+        (STATUS_IDLE, 'À jour'),
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+    ]
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='gap_analysis')
+    fingerprint = models.CharField(max_length=64, blank=True)
+    feedback = models.TextField(blank=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_IDLE, db_index=True)
+    requested_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = "Gap Analyses"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.status}"
@@ -0,0 +1,78 @@
+import os
+import threading
+
+import google.generativeai as genai
+import requests
+from openai import OpenAI
+from requests.adapters import HTTPAdapter
+
+# Connections kept alive per host in each thread's OpenRouter session
+PROVIDER_HTTP_POOL_SIZE = int(os.getenv("PROVIDER_HTTP_POOL_SIZE", 10))
+
+_lock = threading.Lock()
+_gemini_api_key = None
+_gemini_models = {}
+_openai_clients = {}
+# requests.Session is not thread-safe: one per thread, all closed by reset()
+_local = threading.local()
+_http_sessions = []
+
+
+def get_gemini_model(api_key, model_name):
+    """
+    Returns a shared GenerativeModel. genai.configure() is process-global,
+    so it is only called again when the API key changes.
+    """
+    global _gemini_api_key
+    with _lock:
+        if api_key != _gemini_api_key:
+            genai.configure(api_key=api_key)
+            _gemini_api_key = api_key
+            _gemini_models.clear()
+        if model_name not in _gemini_models:
+            _gemini_models[model_name] = genai.GenerativeModel(model_name)
+        return _gemini_models[model_name]
+
+
+def get_openai_client(api_key, base_url=None):
+    """
+    Returns a shared OpenAI client (thread-safe, with its own keep-alive connection pool).
+    """
+    key = (api_key, base_url)
+    with _lock:
+        if key not in _openai_clients:
+            _openai_clients[key] = OpenAI(api_key=api_key, base_url=base_url)
+        return _openai_clients[key]
+
+
+def get_http_session():
+    """
+    Returns the calling thread's requests.Session used for raw HTTP
+    provider calls, so TLS connections are reused between requests of the
+    same thread.
+    """
+    session = getattr(_local, 'http_session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=PROVIDER_HTTP_POOL_SIZE, pool_maxsize=PROVIDER_HTTP_POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.http_session = session
+        with _lock:
+            _http_sessions.append(session)
+    return session
+
+
+def reset():
+    """
+    Drops every shared client (tests, key rotation).
+    """
+    global _gemini_api_key, _local
+    with _lock:
+        _gemini_api_key = None
+        _gemini_models.clear()
+        _openai_clients.clear()
+        for session in _http_sessions:
+            session.close()
+        _http_sessions.clear()
+        _local = threading.local()
@@ -0,0 +1,60 @@
+"""
+Reads of the append-only flashcard review log (ReviewLog): streaming CSV
+export and replay as an FSRS ReviewHistory.
+"""
+import csv
+
+from . import fsrs
+from .models import ReviewLog
+
+EXPORT_COLUMNS = ['id', 'card_id', 'user_id', 'reviewed_at', 'quality', 'elapsed_days', 'previous_interval']
+EXPORT_CHUNK = 5000
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def review_log_range(since=None, until=None, user=None):
+    """
+    Log entries reviewed in [since, until), oldest first. Served by the
+    reviewed_at indexes.
+    """
+    logs = ReviewLog.objects.all()
+    if user is not None:
+        logs = logs.filter(user=user)
+    if since is not None:
+        logs = logs.filter(reviewed_at__gte=since)
+    if until is not None:
+        logs = logs.filter(reviewed_at__lt=until)
+    return logs.order_by('reviewed_at', 'id')
+
+
+def export_csv_lines(logs):
+    """
+    Yields the header then one CSV line per entry of `logs`. Rows are read
+    by chunks with a server-side cursor where the database supports it, so
+    memory stays flat whatever the size of the log.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in logs.values_list(*EXPORT_COLUMNS).iterator(chunk_size=EXPORT_CHUNK):
+        yield writer.writerow(row[:3] + (row[3].isoformat(),) + row[4:])
+
+
+def review_history(user):
+    """
+    The user's review log as an fsrs.ReviewHistory, for parameter fitting.
+    One query over the (card, reviewed_at) index, projected to three columns.
+    """
+    rows = ReviewLog.objects.filter(user=user).order_by('card_id', 'reviewed_at', 'id') \
+        .values_list('card_id', 'elapsed_days', 'quality')
+    card_ids, elapsed_days, ratings = [], [], []
+    for card_id, elapsed, quality in rows.iterator(chunk_size=EXPORT_CHUNK):
+        card_ids.append(card_id)
+        elapsed_days.append(elapsed or 0)
+        ratings.append(quality)
+    return fsrs.ReviewHistory(card_ids, elapsed_days, fsrs.rating_from_quality(ratings).reshape(-1))
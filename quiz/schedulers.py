@@ -0,0 +1,105 @@
+"""
+Pluggable SRS schedulers. A scheduler applies a batch of grades (0-5) to
+Flashcard instances in place; callers store them with bulk_update on
+`scheduler.fields`. The algorithm is chosen per user (Profile.srs_algorithm);
+the intervals it computes then go through the due-date load balancing
+step (quiz.srs.balance_intervals).
+"""
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+
+import numpy as np
+
+from . import fsrs
+from .srs import balance_intervals, sm2_batch
+
+SM2 = 'sm2'
+FSRS = 'fsrs'
+
+
+class Scheduler(ABC):
+    name = None
+    fields = ['interval', 'repetition_count', 'next_review_date', 'last_review_date']
+
+    @abstractmethod
+    def review(self, cards, qualities, today=None):
+        """Applies `qualities` to `cards` in place, reviewed on `today`."""
+
+
+class SM2Scheduler(Scheduler):
+    name = SM2
+    fields = Scheduler.fields + ['easiness_factor']
+
+    def review(self, cards, qualities, today=None):
+        today = today or date.today()
+        repetitions, intervals, easiness = sm2_batch(
+            [card.repetition_count for card in cards],
+            [card.interval for card in cards],
+            [card.easiness_factor for card in cards],
+            qualities
+        )
+        intervals = balance_intervals([card.user_id for card in cards], intervals.tolist(), today)
+        for card, repetition, interval, factor in zip(cards, repetitions.tolist(), intervals, easiness.tolist()):
+            card.repetition_count = repetition
+            card.interval = interval
+            card.easiness_factor = factor
+            card.next_review_date = today + timedelta(days=interval)
+            card.last_review_date = today
+
+
+class FSRSScheduler(Scheduler):
+    name = FSRS
+    fields = Scheduler.fields + ['stability', 'difficulty']
+
+    def __init__(self, parameters=None, desired_retention=0.9):
+        self.parameters = np.asarray(parameters or fsrs.DEFAULT_PARAMETERS, dtype=np.float64)
+        self.desired_retention = desired_retention
+
+    def review(self, cards, qualities, today=None):
+        today = today or date.today()
+        ratings = np.broadcast_to(fsrs.rating_from_quality(qualities), (len(cards),))
+        stability, difficulty = self._memory_states(cards)
+        # Without a recorded review date, the card is assumed reviewed when last scheduled
+        elapsed = [
+            (today - card.last_review_date).days if card.last_review_date
+            else (today - card.next_review_date).days + card.interval
+            for card in cards
+        ]
+        stability, difficulty = fsrs.review(self.parameters, stability, difficulty, elapsed, ratings)
+        intervals = fsrs.next_interval(stability, self.desired_retention)
+        # Again sends the card back to tomorrow, like SM-2 does
+        intervals = np.where(ratings == fsrs.AGAIN, 1, intervals)
+        intervals = balance_intervals([card.user_id for card in cards], intervals.tolist(), today)
+
+        for card, rating, s, d, interval in zip(cards, ratings.tolist(), stability.tolist(), difficulty.tolist(), intervals):
+            card.repetition_count = card.repetition_count + 1 if rating > fsrs.AGAIN else 0
+            card.stability = s
+            card.difficulty = d
+            card.interval = interval
+            card.next_review_date = today + timedelta(days=interval)
+            card.last_review_date = today
+
+    def _memory_states(self, cards):
+        """
+        Cards already reviewed with SM-2 start from their current interval
+        as stability and a difficulty derived from the easiness factor
+        (2.5 -> 5, 1.3 -> 10). Never reviewed cards stay NaN.
+        """
+        stability, difficulty = [], []
+        for card in cards:
+            if card.stability is not None:
+                stability.append(card.stability)
+                difficulty.append(card.difficulty)
+            elif card.repetition_count:
+                stability.append(max(card.interval, 1))
+                difficulty.append(min(10.0, max(1.0, 5 + (2.5 - card.easiness_factor) * 25 / 6)))
+            else:
+                stability.append(np.nan)
+                difficulty.append(np.nan)
+        return np.array(stability, dtype=np.float64), np.array(difficulty, dtype=np.float64)
+
+
+def get_scheduler(profile):
+    if profile.srs_algorithm == FSRS:
+        return FSRSScheduler(profile.fsrs_parameters, profile.srs_desired_retention)
+    return SM2Scheduler()
@@ -1,27 +1,99 @@
-import google.generativeai as genai
 import json
 import re
 import random
+import contextvars
+import copy
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from django.conf import settings
+from django.db import connection
 import os
 from pypdf import PdfReader
-import requests
-from openai import OpenAI
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Configuration from environment variables
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# The one Gemini key of the app (quiz generation and AI tutor); GEMINI_API_KEY is the older name
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-flash-1.5")
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+# Alternative endpoints, e.g. the local fake provider (`fake_llm_server` command)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Long documents are split into token-bounded chunks generated in parallel
+SINGLE_PROMPT_MAX_CHARS = 5000
+CHARS_PER_TOKEN = 4
+QUIZ_CHUNK_TOKENS = int(os.getenv("QUIZ_CHUNK_TOKENS", 700))
+QUIZ_MAX_CHUNKS = int(os.getenv("QUIZ_MAX_CHUNKS", 8))
+QUIZ_CHUNK_WORKERS = int(os.getenv("QUIZ_CHUNK_WORKERS", 4))
+
+# Provider calls: timeout, and optional hedging (next provider started in
+# parallel if the current one has not answered after QUIZ_HEDGE_DELAY seconds)
+QUIZ_PROVIDER_TIMEOUT = float(os.getenv("QUIZ_PROVIDER_TIMEOUT", 30))
+QUIZ_HEDGED_REQUESTS = os.getenv("QUIZ_HEDGED_REQUESTS", "False") == "True"
+QUIZ_HEDGE_DELAY = float(os.getenv("QUIZ_HEDGE_DELAY", 2.0))
+# Process-wide bound on hedged provider calls in flight, abandoned ones included
+QUIZ_HEDGE_WORKERS = int(os.getenv("QUIZ_HEDGE_WORKERS", 12))
 
 import docx
 
+from core.instrumentation import track_external
+from .health import provider_health
+from .providers import get_gemini_model, get_openai_client, get_http_session
+
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def get_hedge_executor():
+    """
+    Shared pool running the hedged provider calls. The losing calls are not
+    interrupted: they keep running until their provider answers or times
+    out (QUIZ_PROVIDER_TIMEOUT), so at most QUIZ_HEDGE_WORKERS threads are
+    ever spent on them, whatever the number of concurrent generations.
+    """
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=QUIZ_HEDGE_WORKERS, thread_name_prefix='hedge')
+        return _hedge_executor
+
+
+def _timed(iterator, kind):
+    """
+    Yields the items of `iterator`, counting the time spent producing each
+    one (not the consumer's time) as external time of `kind`.
+    """
+    while True:
+        with track_external(kind):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _in_worker_thread(fn, *args):
+    """
+    Runs `fn` in a pool thread created by the service, then closes the
+    database connection the thread may have opened (Django opens one per
+    thread and would never reuse it).
+    """
+    try:
+        return fn(*args)
+    finally:
+        connection.close()
+
+
 class DocumentProcessor:
     @staticmethod
     def extract_text(file):
@@ -68,7 +140,8 @@ class YouTubeProcessor:
             if not video_id:
                 return None
             
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['fr', 'en'])
+            with track_external('youtube'):
+                transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['fr', 'en'])
             full_text = " ".join([item['text'] for item in transcript_list])
             return full_text
         except Exception as e:
@@ -85,11 +158,10 @@ class YouTubeProcessor:
 class OCRProcessor:
     @staticmethod
     def extract_text_from_image(image_file):
-        import google.generativeai as genai
         try:
             # Re-read file to pass as bytes to Gemini
             image_data = image_file.read()
-            model = genai.GenerativeModel('gemini-1.5-flash')
+            model = get_gemini_model(GOOGLE_API_KEY, 'gemini-1.5-flash')
             
             response = model.generate_content([
                 "Analyse cette image et extrais-en tout le texte lisible. Si c'est un document, reproduis le texte fidèlement.",
@@ -101,6 +173,49 @@ class OCRProcessor:
             return None
 
 
+class QuestionStreamParser:
+    """
+    Incremental parser for a streamed quiz JSON document. Text is fed as it
+    arrives and every complete {...} object carrying a "question" key is
+    returned as soon as its closing brace is received, whatever the outer
+    shape ([...] or {"quiz": [...]}).
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.starts = []
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text):
+        self.buffer += text
+        questions = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.starts.append(self.position)
+            elif char == '}' and self.starts:
+                start = self.starts.pop()
+                try:
+                    obj = json.loads(self.buffer[start:self.position + 1])
+                except ValueError:
+                    obj = None
+                if isinstance(obj, dict) and "question" in obj:
+                    questions.append(obj)
+            self.position += 1
+        return questions
+
+
 class QuizGeneratorService:
     def __init__(self):
         # Prioritize Google API Key, then OpenAI, then OpenRouter
@@ -109,43 +224,210 @@ class QuizGeneratorService:
         self.use_openrouter = bool(OPENROUTER_API_KEY)
         self.model = None
         self.openai_client = None
+        # Name of the provider that produced the last quiz, 'regex' as soon as
+        # any of its questions comes from the local fallback (never cached)
+        self.last_provider = None
+        # Called after each chunk of a chunked generation (job heartbeat)
+        self.on_progress = None
         
         if self.use_google_direct:
             try:
-                genai.configure(api_key=GOOGLE_API_KEY)
-                self.model = genai.GenerativeModel(GEMINI_MODEL)
+                self.model = get_gemini_model(GOOGLE_API_KEY, GEMINI_MODEL)
             except Exception as e:
                 print(f"Failed to initialize Gemini: {e}")
                 self.use_google_direct = False
         
         if self.use_openai:
             try:
-                self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
+                self.openai_client = get_openai_client(OPENAI_API_KEY, OPENAI_BASE_URL)
             except Exception as e:
                 print(f"Failed to initialize OpenAI: {e}")
                 self.use_openai = False
 
+    def provider_signature(self):
+        """
+        Identifies the enabled providers and models, so cached quizzes
+        are not reused after a model change.
+        """
+        parts = []
+        if self.use_google_direct:
+            parts.append(f"gemini:{GEMINI_MODEL}")
+        if self.use_openai:
+            parts.append(f"openai:{OPENAI_MODEL}@{OPENAI_BASE_URL or 'api.openai.com'}")
+        if self.use_openrouter:
+            parts.append(f"openrouter:{OPENROUTER_MODEL}@{OPENROUTER_URL}")
+        return "|".join(parts) or "regex"
+
     def generate_quiz(self, text, num_questions=5, difficulty="Standard"):
-        # Order of execution: Gemini -> OpenAI -> OpenRouter -> Fallback
+        self.last_provider = None
+        if len(text) > SINGLE_PROMPT_MAX_CHARS:
+            return self._generate_chunked(text, num_questions, difficulty)
+        return self._generate_single(text, num_questions, difficulty)
+
+    def _providers(self):
+        # Order of execution: Gemini -> OpenAI -> OpenRouter
+        providers = []
         if self.use_google_direct and self.model:
-            try:
-                return self._generate_with_gemini(text, num_questions, difficulty)
-            except:
-                pass
-        
+            providers.append(('gemini', self._generate_with_gemini))
         if self.use_openai and self.openai_client:
-            try:
-                return self._generate_with_openai(text, num_questions, difficulty)
-            except:
-                pass
-                
+            providers.append(('openai', self._generate_with_openai))
         if self.use_openrouter:
-            return self._generate_with_openrouter(text, num_questions, difficulty)
-            
+            providers.append(('openrouter', self._generate_with_openrouter))
+        return providers
+
+    def generate_quiz_stream(self, text, num_questions=5, difficulty="Standard"):
+        """
+        Yields the questions one by one while the provider streams its answer.
+        Gemini and OpenAI are streamed; long documents (chunked generation),
+        OpenRouter and the regex fallback are generated first, then yielded.
+        """
+        self.last_provider = None
+        emitted = []
+        seen = set()
+        if len(text) <= SINGLE_PROMPT_MAX_CHARS:
+            for name, stream in self._streaming_providers():
+                if not provider_health.allow_request(name):
+                    continue
+                started = time.monotonic()
+                questions = stream(text, num_questions, difficulty)
+                failed = False
+                try:
+                    for question in _timed(questions, 'llm'):
+                        key = self._normalize_question(question['question']) if self._is_valid_question(question) else None
+                        if key is None or key in seen:
+                            continue
+                        seen.add(key)
+                        emitted.append(question)
+                        yield question
+                        if len(emitted) >= num_questions:
+                            break
+                except Exception as e:
+                    print(f"{name} stream failed: {e}")
+                    failed = True
+                finally:
+                    questions.close()
+                    # Also reached when the consumer stops iterating (GeneratorExit at
+                    # the yield): a half-open probe must always report its outcome
+                    provider_health.record(name, not failed and bool(emitted), time.monotonic() - started)
+                if emitted:
+                    self.last_provider = name
+                    break
+
+        # Fill the missing questions (failed or truncated stream) without streaming
+        remaining = num_questions - len(emitted)
+        if remaining > 0:
+            streamed_provider = self.last_provider
+            filled = 0
+            try:
+                for question in self.generate_quiz(text, remaining, difficulty):
+                    key = self._normalize_question(question['question'])
+                    if key not in seen:
+                        seen.add(key)
+                        filled += 1
+                        yield question
+            finally:
+                fill_provider = self.last_provider
+                if filled and fill_provider in (None, 'regex'):
+                    self.last_provider = 'regex'
+                else:
+                    self.last_provider = streamed_provider or fill_provider
+
+    def _streaming_providers(self):
+        providers = []
+        if self.use_google_direct and self.model:
+            providers.append(('gemini', self._stream_with_gemini))
+        if self.use_openai and self.openai_client:
+            providers.append(('openai', self._stream_with_openai))
+        return providers
+
+    def _generate_single(self, text, num_questions, difficulty):
+        providers = self._providers()
+        if QUIZ_HEDGED_REQUESTS and len(providers) > 1:
+            quiz_data = self._generate_hedged(providers, text, num_questions, difficulty)
+        else:
+            quiz_data = self._generate_sequential(providers, text, num_questions, difficulty)
+        if quiz_data:
+            return quiz_data
         return self._simple_regex_fallback(text, num_questions)
 
-    def _generate_with_openai(self, text, num_questions, difficulty):
-        prompt = f"""Génère un quiz de HAUTE QUALITÉ à partir du texte fourni.
+    def _generate_sequential(self, providers, text, num_questions, difficulty):
+        for name, generate in providers:
+            # Skip providers whose circuit is open instead of waiting for their timeout
+            if not provider_health.allow_request(name):
+                continue
+            try:
+                quiz_data = self._call_provider(name, generate, text, num_questions, difficulty)
+            except Exception as e:
+                print(f"{name} failed: {e}")
+                continue
+            self.last_provider = name
+            return quiz_data
+        return None
+
+    def _generate_hedged(self, providers, text, num_questions, difficulty):
+        """
+        Starts the first provider, then the next one each time QUIZ_HEDGE_DELAY
+        elapses (or a provider fails) without a valid answer. The first
+        schema-valid response wins; the other calls are cancelled if not yet
+        started, otherwise their results are ignored (see get_hedge_executor).
+        """
+        remaining = list(providers)
+        pending = {}
+        executor = get_hedge_executor()
+        try:
+            while remaining or pending:
+                while remaining:
+                    name, generate = remaining.pop(0)
+                    if provider_health.allow_request(name):
+                        pending[executor.submit(
+                            # The request context is copied so the call is counted in its metrics
+                            contextvars.copy_context().run,
+                            _in_worker_thread, self._call_provider, name, generate, text, num_questions, difficulty
+                        )] = name
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, timeout=QUIZ_HEDGE_DELAY if remaining else None, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        quiz_data = future.result()
+                    except Exception as e:
+                        print(f"{name} failed: {e}")
+                        continue
+                    self.last_provider = name
+                    return quiz_data
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _call_provider(self, name, generate, text, num_questions, difficulty):
+        """
+        Calls one provider and reports its outcome and latency to the health registry.
+        """
+        started = time.monotonic()
+        try:
+            with track_external('llm'):
+                response = generate(text, num_questions, difficulty)
+            quiz_data = self._validate_quiz_data(response)
+        except Exception:
+            provider_health.record(name, False, time.monotonic() - started)
+            raise
+        provider_health.record(name, True, time.monotonic() - started)
+        return quiz_data
+
+    def _validate_quiz_data(self, quiz_data):
+        """
+        Keeps the well-formed questions; raises if none is usable.
+        """
+        valid = [q for q in quiz_data or [] if self._is_valid_question(q)]
+        if not valid:
+            raise ValueError("Réponse du fournisseur vide ou invalide")
+        return valid
+
+    def _openai_prompt(self, text, num_questions, difficulty):
+        return f"""Génère un quiz de HAUTE QUALITÉ à partir du texte fourni.
         
         PARAMÈTRES:
         - Nombre de questions : {num_questions}
@@ -176,14 +458,21 @@ class QuizGeneratorService:
                 }}
             ]
         }}"""
+
+    def _openai_request(self, prompt):
+        return {
+            "model": OPENAI_MODEL,
+            "messages": [{"role": "system", "content": "Tu es un expert en pédagogie spécialisé dans la création de quiz évaluatifs."},
+                         {"role": "user", "content": prompt}],
+            "response_format": { "type": "json_object" },
+            "temperature": 0.4,
+            "timeout": QUIZ_PROVIDER_TIMEOUT,
+        }
+
+    def _generate_with_openai(self, text, num_questions, difficulty):
+        prompt = self._openai_prompt(text, num_questions, difficulty)
         try:
-            response = self.openai_client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[{"role": "system", "content": "Tu es un expert en pédagogie spécialisé dans la création de quiz évaluatifs."},
-                          {"role": "user", "content": prompt}],
-                response_format={ "type": "json_object" },
-                temperature=0.4
-            )
+            response = self.openai_client.chat.completions.create(**self._openai_request(prompt))
             content = response.choices[0].message.content
             quiz_data = json.loads(content)
             
@@ -192,9 +481,7 @@ class QuizGeneratorService:
             return quiz_data[:num_questions] if isinstance(quiz_data, list) else []
         except Exception as e:
             print(f"OpenAI error: {e}")
-            if self.use_openrouter:
-                return self._generate_with_openrouter(text, num_questions, difficulty)
-            return self._simple_regex_fallback(text, num_questions)
+            raise
 
     def _generate_with_openrouter(self, text, num_questions, difficulty):
         prompt = f"""Génère un quiz JSON de {num_questions} questions ({difficulty}):
@@ -214,14 +501,14 @@ class QuizGeneratorService:
         }
         
         data = {
-            "model": "google/gemini-flash-1.5",
+            "model": OPENROUTER_MODEL,
             "messages": [{"role": "user", "content": prompt}],
             "response_format": { "type": "json_object" },
             "temperature": 0.3
         }
         
         try:
-            response = requests.post(OPENROUTER_URL, headers=headers, json=data, timeout=20)
+            response = get_http_session().post(OPENROUTER_URL, headers=headers, json=data, timeout=QUIZ_PROVIDER_TIMEOUT)
             response.raise_for_status()
             result = response.json()
             content = result['choices'][0]['message']['content']
@@ -240,7 +527,127 @@ class QuizGeneratorService:
             
         except Exception as e:
             print(f"OpenRouter error: {e}")
-            return self._simple_regex_fallback(text, num_questions)
+            raise
+
+    def _generate_chunked(self, text, num_questions, difficulty):
+        """
+        Map-reduce generation for long documents: candidates are generated
+        per chunk with bounded parallelism, then merged and de-duplicated.
+        The number of chunks is capped, so the cost does not grow with the
+        document length once it exceeds QUIZ_MAX_CHUNKS chunks.
+        """
+        chunks = self._split_into_chunks(text, QUIZ_CHUNK_TOKENS * CHARS_PER_TOKEN)
+        if len(chunks) > QUIZ_MAX_CHUNKS:
+            # Evenly spaced sections so the whole document is covered
+            step = len(chunks) / QUIZ_MAX_CHUNKS
+            chunks = [chunks[int(i * step)] for i in range(QUIZ_MAX_CHUNKS)]
+        per_chunk = math.ceil(num_questions / len(chunks)) + 1
+
+        def generate_chunk(chunk):
+            # Each thread works on a copy so last_provider is not shared
+            worker = copy.copy(self)
+            try:
+                questions = worker._generate_single(chunk, per_chunk, difficulty)
+            except Exception as e:
+                print(f"Chunk generation error: {e}")
+                return [], None
+            finally:
+                connection.close()
+            return questions, worker.last_provider
+
+        with ThreadPoolExecutor(max_workers=max(1, QUIZ_CHUNK_WORKERS)) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, generate_chunk, chunk) for chunk in chunks]
+            # Reported from this thread, which owns the job's database connection
+            for _ in as_completed(futures):
+                if self.on_progress:
+                    self.on_progress()
+            results = [future.result() for future in futures]
+
+        # Questions from a real provider first, regex fallback only to fill the gaps
+        llm_results = [questions for questions, provider in results if provider not in (None, 'regex')]
+        regex_results = [questions for questions, provider in results if provider == 'regex']
+        providers = [provider for _, provider in results if provider not in (None, 'regex')]
+        self.last_provider = providers[0] if providers else 'regex'
+
+        selected = self._merge_candidates(llm_results, num_questions)
+        if len(selected) < num_questions:
+            seen = {self._normalize_question(q['question']) for q in selected}
+            for q in self._merge_candidates(regex_results, num_questions):
+                if len(selected) >= num_questions:
+                    break
+                if self._normalize_question(q['question']) not in seen:
+                    selected.append(q)
+                    # Mixed output must not be cached either
+                    self.last_provider = 'regex'
+        return selected
+
+    def _merge_candidates(self, chunk_results, num_questions):
+        """
+        Round-robin over the chunks so every section of the document is
+        represented, skipping malformed and duplicate questions.
+        """
+        valid = [[q for q in questions if self._is_valid_question(q)] for questions in chunk_results]
+        selected = []
+        seen = set()
+        for rank in range(max((len(questions) for questions in valid), default=0)):
+            for questions in valid:
+                if rank >= len(questions):
+                    continue
+                key = self._normalize_question(questions[rank]['question'])
+                if key in seen:
+                    continue
+                seen.add(key)
+                selected.append(questions[rank])
+                if len(selected) >= num_questions:
+                    return selected
+        return selected
+
+    @staticmethod
+    def _is_valid_question(q):
+        return (
+            isinstance(q, dict)
+            and isinstance(q.get('question'), str)
+            and isinstance(q.get('options'), list)
+            and len(q['options']) >= 2
+            and q.get('answer') in q['options']
+        )
+
+    @staticmethod
+    def _normalize_question(question):
+        return re.sub(r'\W+', ' ', question.lower()).strip()
+
+    @staticmethod
+    def _split_into_chunks(text, max_chars):
+        """
+        Splits the text on paragraph, then sentence boundaries into chunks
+        of at most max_chars characters.
+        """
+        pieces = []
+        for paragraph in re.split(r'\n\s*\n|\n', text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if len(paragraph) <= max_chars:
+                pieces.append(paragraph)
+                continue
+            for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+                while len(sentence) > max_chars:
+                    pieces.append(sentence[:max_chars])
+                    sentence = sentence[max_chars:]
+                if sentence:
+                    pieces.append(sentence)
+
+        chunks = []
+        current = ""
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+        return chunks
 
     def _sample_text(self, text, max_chars=3000):
         if len(text) <= max_chars:
@@ -248,8 +655,8 @@ class QuizGeneratorService:
         chunk = max_chars // 2
         return f"{text[:chunk]}\n...\n{text[-chunk:]}"
 
-    def _generate_with_gemini(self, text, num_questions, difficulty):
-        prompt = f"""Génère un quiz de HAUTE QUALITÉ à partir du texte fourni.
+    def _gemini_prompt(self, text, num_questions, difficulty):
+        return f"""Génère un quiz de HAUTE QUALITÉ à partir du texte fourni.
         
         PARAMÈTRES:
         - Nombre de questions : {num_questions}
@@ -278,16 +685,22 @@ class QuizGeneratorService:
                 "explanation": "..."
             }}
         ]"""
+
+    def _gemini_request(self):
+        return {
+            "generation_config": {
+                "response_mime_type": "application/json",
+                "temperature": 0.4,
+                "top_p": 1,
+                "max_output_tokens": 4096,
+            },
+            "request_options": {"timeout": QUIZ_PROVIDER_TIMEOUT},
+        }
+
+    def _generate_with_gemini(self, text, num_questions, difficulty):
+        prompt = self._gemini_prompt(text, num_questions, difficulty)
         try:
-            response = self.model.generate_content(
-                prompt, 
-                generation_config={
-                    "response_mime_type": "application/json",
-                    "temperature": 0.4,
-                    "top_p": 1,
-                    "max_output_tokens": 4096,
-                }
-            )
+            response = self.model.generate_content(prompt, **self._gemini_request())
             data = json.loads(response.text)
             if isinstance(data, dict) and "quiz" in data:
                 return data["quiz"][:num_questions]
@@ -296,33 +709,48 @@ class QuizGeneratorService:
             with open("debug_quiz.log", "a", encoding="utf-8") as f:
                 f.write(f"Gemini error: {e}\n")
             print(f"Gemini error: {e}")
-            if self.use_openai:
-                return self._generate_with_openai(text, num_questions, difficulty)
-            if self.use_openrouter:
-                return self._generate_with_openrouter(text, num_questions, difficulty)
-            if self.use_openrouter:
-                return self._generate_with_openrouter(text, num_questions, difficulty)
-            return self._simple_regex_fallback(text, num_questions)
-
-    def analyze_gaps(self, score_details):
+            raise
+
+    def _stream_with_gemini(self, text, num_questions, difficulty):
+        prompt = self._gemini_prompt(text, num_questions, difficulty)
+        parser = QuestionStreamParser()
+        response = self.model.generate_content(prompt, stream=True, **self._gemini_request())
+        for chunk in response:
+            yield from parser.feed(chunk.text)
+
+    def _stream_with_openai(self, text, num_questions, difficulty):
+        prompt = self._openai_prompt(text, num_questions, difficulty)
+        parser = QuestionStreamParser()
+        stream = self.openai_client.chat.completions.create(stream=True, **self._openai_request(prompt))
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield from parser.feed(chunk.choices[0].delta.content)
+        finally:
+            stream.close()
+
+    def analyze_gaps(self, mistakes):
         """
         Analyze recent mistakes using Gemini to identify weak areas.
+        `mistakes` are the dicts of quiz.analytics.recent_mistakes.
+        Provider errors, and a missing provider, are raised so they are
+        not stored as an analysis.
         """
         if not self.use_google_direct or not self.model:
-            return "Analyse indisponible pour le moment."
+            raise RuntimeError("Analyse indisponible pour le moment : aucune clé Gemini configurée.")
         
-        mistakes = [d for d in score_details if not d.is_correct]
         if not mistakes:
             return "Félicitations ! Vous maîtrisez parfaitement les sujets récents."
         
-        data_to_analyze = []
-        for d in mistakes[:15]: # Analyze last 15 mistakes
-            data_to_analyze.append({
-                "question": d.question.text,
-                "user_answer": d.user_answer,
-                "correct_answer": d.question.correct_answer,
-                "context": d.question.quiz.title if d.question.quiz else "Inconnu"
-            })
+        data_to_analyze = [
+            {
+                "question": m['question__text'],
+                "user_answer": m['user_answer'],
+                "correct_answer": m['question__correct_answer'],
+                "context": m['question__quiz__title'] or "Inconnu"
+            }
+            for m in mistakes[:15] # Analyze last 15 mistakes
+        ]
             
         prompt = f"""
         En tant qu'expert pédagogique, analyse ces erreurs récentes d'un étudiant :
@@ -333,13 +761,12 @@ class QuizGeneratorService:
         3. Sois encourageant et précis.
         Réponds en Markdown.
         """
-        try:
+        with track_external('llm'):
             response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Erreur lors de l'analyse : {e}"
+        return response.text
 
     def _simple_regex_fallback(self, text, num_questions):
+        self.last_provider = 'regex'
 
         # Segmentation par ponctuation OU passage à la ligne pour gérer les listes/tableaux
         segments = [s.strip() for s in re.split(r'[.!?\n]', text) if len(s.strip()) > 20]
@@ -0,0 +1,244 @@
+"""
+Spaced-repetition review sessions: due-card queue and batch grading.
+"""
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Flashcard, ReviewLog
+
+SRS_SESSION_SIZE = 20
+SRS_MAX_BATCH = 200
+SRS_BULK_CHUNK = 2000
+SRS_FIELDS = ['interval', 'easiness_factor', 'repetition_count', 'next_review_date', 'last_review_date']
+
+
+def due_cards(user, today=None):
+    """
+    Due cards of a user, most overdue first. Served by the
+    (user, next_review_date) index.
+    """
+    return Flashcard.objects.filter(user=user, next_review_date__lte=today or date.today()) \
+        .order_by('next_review_date', 'id')
+
+
+def fetch_session(user, limit=SRS_SESSION_SIZE):
+    """
+    Returns the next `limit` due cards, in one query, as dicts ready for JSON.
+    """
+    return list(due_cards(user).values('id', 'question', 'answer', 'explanation')[:min(limit, SRS_MAX_BATCH)])
+
+
+def parse_grades(items):
+    """
+    Validates [{"card_id": .., "quality": ..}, ...] and returns {card_id: quality}.
+    Raises ValueError on malformed input.
+    """
+    if not isinstance(items, list) or len(items) > SRS_MAX_BATCH:
+        raise ValueError(f"Une liste d'au plus {SRS_MAX_BATCH} notes est attendue.")
+    grades = {}
+    for item in items:
+        try:
+            card_id, quality = int(item['card_id']), int(item['quality'])
+        except (KeyError, TypeError):
+            raise ValueError("Note invalide.")
+        if not 0 <= quality <= 5:
+            raise ValueError("La qualité doit être comprise entre 0 et 5.")
+        grades[card_id] = quality
+    return grades
+
+
+def apply_reviews(user, grades, today=None):
+    """
+    Applies {card_id: quality} to the user's cards with the user's scheduler
+    (SM-2 or FSRS): one query to load the cards, one bulk UPDATE to store
+    them and one INSERT into the review log. Unknown ids are ignored.
+    Returns the updated cards.
+    """
+    from .schedulers import get_scheduler
+
+    scheduler = get_scheduler(user.profile)
+    cards = list(Flashcard.objects.filter(user=user, id__in=list(grades)).order_by('id'))
+    if cards:
+        logs = [ReviewLog.for_review(card, grades[card.id], today) for card in cards]
+        scheduler.review(cards, [grades[card.id] for card in cards], today)
+        with transaction.atomic():
+            Flashcard.objects.bulk_update(cards, scheduler.fields)
+            ReviewLog.objects.bulk_create(logs)
+    return cards
+
+
+def sm2_batch(repetitions, intervals, easiness, qualities):
+    """
+    Flashcard.apply_sm2 over arrays of cards. `qualities` is an array or a
+    single grade applied to every card. Returns the new
+    (repetitions, intervals, easiness factors). np.round rounds half to
+    even like Python's round(), so results match the per-card path.
+    """
+    repetitions = np.asarray(repetitions, dtype=np.int64)
+    intervals = np.asarray(intervals, dtype=np.int64)
+    easiness = np.asarray(easiness, dtype=np.float64)
+    qualities = np.broadcast_to(np.asarray(qualities, dtype=np.int64), repetitions.shape)
+
+    passed = qualities >= 3
+    grown = np.select(
+        [repetitions == 0, repetitions == 1],
+        [1, 6],
+        np.round(intervals * easiness).astype(np.int64)
+    )
+    new_intervals = np.where(passed, grown, 1)
+    new_repetitions = np.where(passed, repetitions + 1, 0)
+    lapse = 5 - qualities
+    new_easiness = np.maximum(1.3, easiness + (0.1 - lapse * (0.08 + lapse * 0.02)))
+    return new_repetitions, new_intervals, new_easiness
+
+
+def fuzz_window(interval):
+    """
+    Range of intervals (days) a card may be moved to without changing its
+    schedule noticeably: none under 3 days, then about ±15% up to a week,
+    ±10% up to 20 days and ±5% beyond.
+    """
+    if interval < 3:
+        return interval, interval
+    delta = 1 + 0.15 * (min(interval, 7) - 2.5) + 0.1 * max(min(interval, 20) - 7, 0) + 0.05 * max(interval - 20, 0)
+    delta = int(round(delta))
+    return max(2, interval - delta), interval + delta
+
+
+def due_histogram(user_ids, start, end):
+    """
+    {user_id: Counter({date: cards due})} over [start, end], in one GROUP BY
+    query served by the (user, next_review_date) index. Computed on demand,
+    once per graded batch: a stored histogram would have to follow every
+    card write (creation, deletion, both schedulers, imports) to stay exact.
+    """
+    histogram = defaultdict(Counter)
+    rows = Flashcard.objects.filter(user_id__in=user_ids, next_review_date__range=(start, end)) \
+        .values_list('user_id', 'next_review_date').annotate(cards=Count('id')).order_by()
+    for user_id, day, cards in rows:
+        histogram[user_id][day] = cards
+    return histogram
+
+
+def balance_intervals(user_ids, intervals, today):
+    """
+    Load balancing step of the schedulers: moves each interval to the day
+    of its fuzz window with the fewest cards already due for that user,
+    the closest to the computed interval on ties. The histogram is read
+    once for the whole batch and updated as cards are placed, so cards
+    graded together are spread instead of falling due on the same day.
+    """
+    intervals = [int(interval) for interval in intervals]
+    windows = [fuzz_window(interval) for interval in intervals]
+    if not settings.SRS_LOAD_BALANCING or all(low == high for low, high in windows):
+        return intervals
+
+    start = min(low for low, _ in windows)
+    end = max(high for _, high in windows)
+    histogram = due_histogram(set(user_ids), today + timedelta(days=start), today + timedelta(days=end))
+    balanced = []
+    for user_id, interval, (low, high) in zip(user_ids, intervals, windows):
+        load = histogram[user_id]
+        if high > low:
+            interval = min(
+                range(low, high + 1),
+                key=lambda days: (load[today + timedelta(days=days)], abs(days - interval), days)
+            )
+        load[today + timedelta(days=interval)] += 1
+        balanced.append(interval)
+    return balanced
+
+
+def reschedule(cards, qualities, today=None, chunk_size=SRS_BULK_CHUNK):
+    """
+    Applies a review to every card of the `cards` queryset (imports, deck
+    resets, "review all") by chunks of `chunk_size`, with each owner's
+    scheduler. Cards of SM-2 users: one SELECT, one vectorized computation,
+    one due-date histogram query (see balance_intervals) and one batched
+    UPDATE per chunk. Cards of FSRS users are loaded and reviewed per user
+    with their FSRS scheduler (vectorized as well) and stored with
+    bulk_update. One profile query and one review log INSERT per chunk.
+    `qualities` is a single grade or a {card_id: quality} dict (cards missing
+    from it are skipped). Returns the number of cards updated.
+    """
+    from accounts.models import Profile
+    from .schedulers import FSRS, FSRSScheduler, get_scheduler
+
+    today = today or date.today()
+    reviewed_at = timezone.now()
+    cards = cards.order_by('id')
+    if isinstance(qualities, dict):
+        cards = cards.filter(id__in=list(qualities))
+    updated = 0
+    last_id = 0
+    while True:
+        rows = list(cards.filter(id__gt=last_id).values_list(
+            'id', 'user_id', 'repetition_count', 'interval', 'easiness_factor', 'last_review_date'
+        )[:chunk_size])
+        if not rows:
+            return updated
+        last_id = rows[-1][0]
+        grades = {row[0]: qualities[row[0]] if isinstance(qualities, dict) else qualities for row in rows}
+        logs = [
+            ReviewLog(
+                card_id=card_id, user_id=user_id, reviewed_at=reviewed_at, quality=grades[card_id],
+                elapsed_days=(today - last_review).days if last_review else None,
+                previous_interval=interval
+            )
+            for card_id, user_id, _, interval, _, last_review in rows
+        ]
+
+        fsrs_profiles = {
+            profile.user_id: profile
+            for profile in Profile.objects.filter(user_id__in={row[1] for row in rows}, srs_algorithm=FSRS)
+        }
+        sm2_rows = [row for row in rows if row[1] not in fsrs_profiles]
+        fsrs_cards = defaultdict(list)
+        if fsrs_profiles:
+            fsrs_ids = [row[0] for row in rows if row[1] in fsrs_profiles]
+            for card in Flashcard.objects.filter(id__in=fsrs_ids).order_by('id'):
+                fsrs_cards[card.user_id].append(card)
+            for user_id, user_cards in fsrs_cards.items():
+                get_scheduler(fsrs_profiles[user_id]).review(user_cards, [grades[card.id] for card in user_cards], today)
+
+        with transaction.atomic():
+            if sm2_rows:
+                ids, user_ids, repetition_counts, current_intervals, factors, _ = zip(*sm2_rows)
+                repetitions, intervals, easiness = sm2_batch(repetition_counts, current_intervals, factors, [grades[card_id] for card_id in ids])
+                intervals = np.array(balance_intervals(user_ids, intervals.tolist(), today), dtype=np.int64)
+                due_dates = (np.datetime64(today, 'D') + intervals.astype('timedelta64[D]')).astype(object)
+                _write_schedules(zip(repetitions.tolist(), intervals.tolist(), easiness.tolist(), due_dates, ids), today)
+            if fsrs_cards:
+                Flashcard.objects.bulk_update([card for user_cards in fsrs_cards.values() for card in user_cards], FSRSScheduler.fields)
+            ReviewLog.objects.bulk_create(logs)
+        updated += len(rows)
+
+
+def _write_schedules(rows, today):
+    """
+    Stores (repetition_count, interval, easiness_factor, next_review_date, id)
+    rows, reviewed on `today`, with one executemany UPDATE. bulk_update builds a CASE WHEN
+    expression per row and field, which costs about 1 ms per card in Python.
+    """
+    opts = Flashcard._meta
+    columns = [opts.get_field(name) for name in ('repetition_count', 'interval', 'easiness_factor', 'next_review_date', 'last_review_date')]
+    quote = connection.ops.quote_name
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        quote(opts.db_table),
+        ", ".join(f"{quote(field.column)} = %s" for field in columns),
+        quote(opts.pk.column)
+    )
+    date_field = columns[-1]
+    reviewed = date_field.get_db_prep_value(today, connection)
+    params = [
+        (repetition, interval, factor, date_field.get_db_prep_value(due, connection), reviewed, card_id)
+        for repetition, interval, factor, due, card_id in rows
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
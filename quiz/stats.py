@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyActivity, ScoreHistory, UserStats
+
+
+def parse_elapsed(value):
+    """
+    Converts the "MM:SS" (or "HH:MM:SS") chrono of the take page to seconds.
+    Anything else ("N/A", empty) counts as 0.
+    """
+    try:
+        seconds = 0
+        for part in (value or '').split(':'):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return 0
+
+
+def format_duration(seconds):
+    hours, rest = divmod(seconds, 3600)
+    if hours:
+        return f"{hours} h {rest // 60:02d} min"
+    return f"{rest // 60} min"
+
+
+def record_attempt(user, score, total, difficulty, time_elapsed):
+    """
+    Adds one graded attempt to the user's rollup. Meant to run inside the
+    grading transaction: the row is locked so concurrent submissions of
+    the same user are applied one after the other. The attempt must
+    already be saved: a missing rollup is built from the history.
+    """
+    with transaction.atomic():
+        stats = UserStats.objects.select_for_update().filter(user=user).first()
+        if stats is None:
+            return rebuild_user_stats(user)
+        stats.quiz_count += 1
+        stats.score_sum += score
+        stats.total_sum += total
+        stats.best_score = max(stats.best_score, score)
+        stats.time_seconds += parse_elapsed(time_elapsed)
+        bucket = stats.by_difficulty.setdefault(difficulty, {'count': 0, 'score_sum': 0, 'total_sum': 0})
+        bucket['count'] += 1
+        bucket['score_sum'] += score
+        bucket['total_sum'] += total
+        stats.save()
+    return stats
+
+
+def rebuild_user_stats(user):
+    """
+    Recomputes the rollup from the full ScoreHistory of the user.
+    """
+    history = ScoreHistory.objects.filter(user=user).order_by()
+    totals = history.aggregate(
+        quiz_count=Count('id'),
+        score_sum=Sum('score'),
+        total_sum=Sum('total_questions'),
+        best_score=Max('score')
+    )
+    by_difficulty = {
+        row['difficulty']: {'count': row['count'], 'score_sum': row['score_sum'], 'total_sum': row['total_sum']}
+        for row in history.values('difficulty').annotate(
+            count=Count('id'), score_sum=Sum('score'), total_sum=Sum('total_questions')
+        )
+    }
+    # The chrono is stored as text, so the total time is summed in Python
+    time_seconds = sum(parse_elapsed(value) for value in history.values_list('time_elapsed', flat=True).iterator())
+
+    stats, _ = UserStats.objects.update_or_create(user=user, defaults={
+        'quiz_count': totals['quiz_count'],
+        'score_sum': totals['score_sum'] or 0,
+        'total_sum': totals['total_sum'] or 0,
+        'best_score': totals['best_score'] or 0,
+        'time_seconds': time_seconds,
+        'by_difficulty': by_difficulty,
+    })
+    return stats
+
+
+def get_user_stats(user):
+    """
+    Returns the user's rollup, building it from the history the first time.
+    """
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is None:
+        stats = rebuild_user_stats(user)
+    return stats
+
+
+def record_activity(user, day=None):
+    """
+    Increments the user's counter for `day` (today by default).
+    """
+    day = day or timezone.localdate()
+    if DailyActivity.objects.filter(user=user, date=day).update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            DailyActivity.objects.create(user=user, date=day, count=1)
+    except IntegrityError:
+        # Created meanwhile by a concurrent submission
+        DailyActivity.objects.filter(user=user, date=day).update(count=F('count') + 1)
+
+
+def rebuild_daily_activity(user):
+    """
+    Recomputes the user's daily counters from the full ScoreHistory.
+    """
+    days = ScoreHistory.objects.filter(user=user).order_by() \
+        .annotate(day=TruncDate('completed_at')) \
+        .values('day') \
+        .annotate(count=Count('id'))
+    with transaction.atomic():
+        DailyActivity.objects.filter(user=user).delete()
+        DailyActivity.objects.bulk_create(
+            [DailyActivity(user=user, date=row['day'], count=row['count']) for row in days],
+            batch_size=1000
+        )
+
+
+def get_activity(user, days):
+    """
+    Returns {iso date: count} for the last `days` days, today included.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return {
+        day.isoformat(): count
+        for day, count in DailyActivity.objects.filter(user=user, date__gte=since).values_list('date', 'count')
+    }
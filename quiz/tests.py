@@ -1,3 +1,1103 @@
-from django.test import TestCase
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import wave
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.instrumentation import end_request, start_request
+
+from .analytics import recent_mistake_ids, recent_mistakes
+from .cache import GenerationCache
+from .fake_llm import FakeLLMConfig, FakeLLMServer
+from .gaps import mistakes_fingerprint, run_gap_analysis
+from .grading import NO_ANSWER, answer_key_cache_key, build_answer_key, get_answer_key, grade_submission, invalidate_answer_key
+from .health import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, ProviderHealthRegistry
+from .jobs import claim_next_job, requeue_stale_jobs, run_job
+from . import providers
+from .models import Quiz, Question, GapAnalysis, ScoreHistory, ScoreDetail, Flashcard, ReviewLog, GenerationJob, GenerationCacheEntry, GenerationCacheStats, UserStats, DailyActivity
+from .services import QuizGeneratorService
+from .review_log import export_csv_lines, review_history, review_log_range
+from .srs import apply_reviews, fuzz_window, reschedule
+from .stats import get_activity, rebuild_daily_activity, rebuild_user_stats, record_activity
+from .tts import AudioCache, render_chunks
+from .tts_backends import NullBackend
+from .views import _history_page
+
+
+class RecentMistakesQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='student')
+        other = User.objects.create_user('other', password='other')
+        for quiz_index in range(3):
+            quiz = Quiz.objects.create(user=cls.user, title=f"Quiz {quiz_index}", difficulty='Standard')
+            questions = [
+                Question.objects.create(
+                    quiz=quiz,
+                    text=f"Question {quiz_index}-{i}",
+                    options=["A", "B", "C", "D"],
+                    correct_answer="A"
+                )
+                for i in range(10)
+            ]
+            for user in (cls.user, other):
+                history = ScoreHistory.objects.create(user=user, quiz=quiz, score=0, total_questions=10, time_elapsed="01:00")
+                ScoreDetail.objects.bulk_create([
+                    ScoreDetail(history=history, question=q, is_correct=i % 3 == 0, user_answer="A" if i % 3 == 0 else "B")
+                    for i, q in enumerate(questions)
+                ])
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            mistakes = recent_mistakes(self.user.id)
+        self.assertEqual(len(mistakes), 15)
+        self.assertEqual(set(mistakes[0]), {'id', 'user_answer', 'question__text', 'question__correct_answer', 'question__quiz__title'})
+
+    def test_only_own_wrong_answers_newest_first(self):
+        mistakes = recent_mistakes(self.user.id, limit=100)
+        own = ScoreDetail.objects.filter(history__user=self.user, is_correct=False)
+        self.assertEqual([m['id'] for m in mistakes], list(own.order_by('-id').values_list('id', flat=True)))
+
+    def test_analyze_gaps_makes_no_query(self):
+        mistakes = recent_mistakes(self.user.id)
+        service = QuizGeneratorService()
+        service.use_google_direct = True
+        service.model = mock.Mock()
+        service.model.generate_content.return_value = mock.Mock(text="Analyse")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(service.analyze_gaps(mistakes), "Analyse")
+
+        prompt = service.model.generate_content.call_args[0][0]
+        self.assertIn(json.dumps(mistakes[0]['question__text']), prompt)
+        self.assertIn(json.dumps(mistakes[0]['question__quiz__title']), prompt)
+
+    def test_unavailable_analysis_is_not_stored(self):
+        analysis = GapAnalysis.objects.create(user=self.user, status=GapAnalysis.STATUS_RUNNING)
+        with mock.patch('quiz.services.GOOGLE_API_KEY', None):
+            run_gap_analysis(analysis)
+        analysis.refresh_from_db()
+        self.assertEqual((analysis.fingerprint, analysis.feedback), ('', ''))
+        self.assertTrue(analysis.error)
+
+        # Recomputed once a provider answers
+        analysis.status = GapAnalysis.STATUS_RUNNING
+        with mock.patch.object(QuizGeneratorService, 'analyze_gaps', return_value="Analyse"):
+            run_gap_analysis(analysis)
+        analysis.refresh_from_db()
+        self.assertEqual(analysis.feedback, "Analyse")
+        self.assertEqual(analysis.fingerprint, mistakes_fingerprint(recent_mistake_ids(self.user.id)))
+
+
+class SchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reviewer', password='reviewer')
+
+    def make_cards(self, count):
+        return Flashcard.objects.bulk_create([
+            Flashcard(user=self.user, question=f"Q{i}", answer=f"R{i}") for i in range(count)
+        ])
+
+    def test_sm2_matches_per_card_algorithm(self):
+        cards = self.make_cards(6)
+        grades = {card.id: quality for card, quality in zip(cards, range(6))}
+        self.user.profile  # loaded once per request by the views
+        # SELECT, UPDATE and the review log INSERT, inside a savepoint here
+        with self.assertNumQueries(5):
+            apply_reviews(self.user, grades)
+        for card in cards:
+            card.apply_sm2(grades[card.id])
+            stored = Flashcard.objects.get(pk=card.pk)
+            self.assertEqual((stored.interval, stored.repetition_count, stored.next_review_date),
+                             (card.interval, card.repetition_count, card.next_review_date))
+            self.assertAlmostEqual(stored.easiness_factor, card.easiness_factor)
+            self.assertIsNone(stored.stability)
+
+    def test_fsrs_schedules_from_memory_state(self):
+        self.user.profile.srs_algorithm = 'fsrs'
+        self.user.profile.save()
+        again, good = self.make_cards(2)
+        today = date.today()
+        apply_reviews(self.user, {again.id: 1, good.id: 4}, today)
+
+        again.refresh_from_db()
+        good.refresh_from_db()
+        self.assertEqual(again.next_review_date, today + timedelta(days=1))
+        self.assertEqual(again.repetition_count, 0)
+        self.assertGreater(good.stability, again.stability)
+        self.assertEqual(good.last_review_date, today)
+
+        # A successful review on time grows the stability
+        later = good.next_review_date
+        apply_reviews(self.user, {good.id: 4}, later)
+        previous_stability = good.stability
+        good.refresh_from_db()
+        self.assertGreater(good.stability, previous_stability)
+        self.assertGreater(good.next_review_date - later, timedelta(days=good.interval - 1))
+
+    def test_due_dates_are_spread_over_the_fuzz_window(self):
+        cards = self.make_cards(30)
+        Flashcard.objects.filter(user=self.user).update(repetition_count=1, interval=1)
+        today = date.today()
+        with self.assertNumQueries(6):
+            apply_reviews(self.user, {card.id: 4 for card in cards}, today)
+
+        low, high = fuzz_window(6)
+        due_dates = list(Flashcard.objects.filter(user=self.user).values_list('next_review_date', flat=True))
+        self.assertTrue(all(today + timedelta(days=low) <= due <= today + timedelta(days=high) for due in due_dates))
+        self.assertEqual(len(set(due_dates)), high - low + 1)
+        self.assertLessEqual(max(due_dates.count(due) for due in set(due_dates)), 6)
+
+    def test_bulk_reschedule_uses_each_user_scheduler(self):
+        self.user.profile.srs_algorithm = 'fsrs'
+        self.user.profile.save()
+        reference_user = User.objects.create_user('reference', password='reference')
+        reference_user.profile.srs_algorithm = 'fsrs'
+        reference_user.profile.save()
+        sm2_user = User.objects.create_user('classic', password='classic')
+        today = date.today()
+        fsrs_cards = self.make_cards(4)
+        reference_cards = Flashcard.objects.bulk_create([Flashcard(user=reference_user, question=f"Q{i}", answer="R") for i in range(4)])
+        sm2_card = Flashcard.objects.create(user=sm2_user, question="Q", answer="R")
+
+        reschedule(Flashcard.objects.filter(user__in=[self.user, sm2_user]), 4, today)
+        apply_reviews(reference_user, {card.id: 4 for card in reference_cards}, today)
+
+        fields = ('interval', 'next_review_date', 'stability', 'difficulty', 'repetition_count')
+        rescheduled = list(Flashcard.objects.filter(user=self.user).order_by('id').values_list(*fields))
+        expected = list(Flashcard.objects.filter(user=reference_user).order_by('id').values_list(*fields))
+        self.assertEqual(rescheduled, expected)
+        self.assertTrue(all(stability is not None for _, _, stability, _, _ in rescheduled))
+        sm2_card.refresh_from_db()
+        self.assertIsNone(sm2_card.stability)
+        self.assertEqual(sm2_card.interval, 1)
+        self.assertEqual(ReviewLog.objects.filter(card__in=fsrs_cards + [sm2_card]).count(), 5)
+
+    def test_update_srs_uses_the_user_scheduler(self):
+        self.user.profile.srs_algorithm = 'fsrs'
+        self.user.profile.save()
+        card, = self.make_cards(1)
+        card.update_srs(4)
+
+        card.refresh_from_db()
+        self.assertIsNotNone(card.stability)
+        self.assertEqual(card.last_review_date, date.today())
+        self.assertEqual(ReviewLog.objects.filter(card=card).count(), 1)
+
+
+class ReviewLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('logger', password='logger')
+        cls.cards = Flashcard.objects.bulk_create([
+            Flashcard(user=cls.user, question=f"Q{i}", answer=f"R{i}") for i in range(3)
+        ])
+
+    def test_reviews_are_logged_with_previous_state(self):
+        today = date.today()
+        apply_reviews(self.user, {card.id: 4 for card in self.cards}, today)
+        reschedule(Flashcard.objects.filter(user=self.user), 2, today + timedelta(days=3))
+
+        logs = list(ReviewLog.objects.filter(card=self.cards[0]).order_by('id'))
+        self.assertEqual([(log.quality, log.elapsed_days, log.previous_interval) for log in logs],
+                         [(4, None, 0), (2, 3, 1)])
+        self.assertEqual(review_history(self.user).events, 6)
+
+    def test_csv_export(self):
+        apply_reviews(self.user, {self.cards[0].id: 5})
+        lines = list(export_csv_lines(review_log_range(user=self.user)))
+        self.assertEqual(lines[0].strip(), "id,card_id,user_id,reviewed_at,quality,elapsed_days,previous_interval")
+        self.assertEqual(len(lines), 2)
+        self.assertIn(f",{self.cards[0].id},{self.user.id},", lines[1])
+
+
+class AudioCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        self.settings_override = override_settings(TTS_CACHE_DIR=self.cache_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = User.objects.create_user('listener', password='listener')
+        self.client.force_login(self.user)
+
+    @mock.patch('quiz.tts.synthesize', return_value=bytes(range(200)))
+    def test_rendered_once_then_served_with_etag_and_ranges(self, synthesize):
+        url = '/quiz/generate-audio/'
+        response = self.client.get(url, {'text': 'Quelle est la capitale ?'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(200)))
+        etag = response['ETag']
+
+        response = self.client.get(url, {'text': ' Quelle est  la capitale ?'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, {'text': 'Quelle est la capitale ?'}, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/200')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(100, 200)))
+        self.assertEqual(synthesize.call_count, 1)
+
+    @mock.patch('quiz.tts.synthesize', side_effect=lambda text, lang: f"[{text}]".encode())
+    def test_long_text_streamed_by_sentence(self, synthesize):
+        url = '/quiz/generate-audio/'
+        response = self.client.get(url, {'text': "Première phrase. Deuxième phrase ! Troisième ?"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(list(response.streaming_content), [b"[Premi\xc3\xa8re phrase.]", b"[Deuxi\xc3\xa8me phrase !]", b"[Troisi\xc3\xa8me ?]"])
+
+        # Shared sentences are rendered once, the complete text is now a cached file
+        response = self.client.get(url, {'text': "Deuxième phrase ! Autre chose."})
+        b''.join(response.streaming_content)
+        self.assertEqual(synthesize.call_count, 4)
+        response = self.client.get(url, {'text': "Première phrase. Deuxième phrase ! Troisième ?"}, HTTP_RANGE='bytes=0-')
+        self.assertEqual(response.status_code, 206)
+
+    def test_later_sentences_rendered_while_the_first_is_slow(self):
+        first_released = threading.Event()
+        started = []
+
+        def synthesize(text, lang):
+            started.append(text)
+            if text == "Un.":
+                self.assertTrue(first_released.wait(5))
+            return text.encode()
+
+        with mock.patch('quiz.tts.synthesize', side_effect=synthesize):
+            chunks = render_chunks("Un. Deux. Trois. Quatre. Cinq.")
+            waiting = threading.Thread(target=lambda: started.append(next(chunks)))
+            waiting.start()
+            # Beyond the initial lookahead, while "Un." is still rendering
+            deadline = time.time() + 5
+            while "Cinq." not in started and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertIn("Cinq.", started)
+            first_released.set()
+            waiting.join()
+            self.assertEqual(started[-1], b"Un.")
+            self.assertEqual(list(chunks), [b"Deux.", b"Trois.", b"Quatre.", b"Cinq."])
+
+    @override_settings(TTS_BACKEND='null')
+    def test_offline_wav_backend(self):
+        url = '/quiz/generate-audio/'
+        text = "Première phrase. Deuxième phrase, un peu plus longue."
+        response = self.client.get(url, {'text': text})
+        self.assertEqual(response['Content-Type'], 'audio/wav')
+        streamed = b''.join(response.streaming_content)
+
+        response = self.client.get(url, {'text': text})
+        with wave.open(io.BytesIO(b''.join(response.streaming_content))) as f:
+            frames = f.getnframes()
+        expected = sum(int(len(sentence) * NullBackend.SECONDS_PER_CHAR * NullBackend.SAMPLE_RATE)
+                       for sentence in ("Première phrase.", "Deuxième phrase, un peu plus longue."))
+        self.assertEqual(frames, expected)
+        # Streamed: one header of unknown length, then the frames of every sentence
+        self.assertEqual(len(streamed), 44 + 2 * expected)
+
+    def test_least_recently_used_files_are_evicted(self):
+        keys = [AudioCache.make_key(f"texte {i}") for i in range(4)]
+        now = time.time()
+        for age, key in zip((0, 300, 200, 100), keys):
+            AudioCache.store(key, b'x' * 100)
+            os.utime(AudioCache.path(key), (now - age,) * 2)
+
+        self.assertEqual(AudioCache.evict(max_bytes=250), 2)
+        self.assertEqual([AudioCache.get(key) is not None for key in keys], [True, False, False, True])
+
+
+class ExportFlashcardsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('exporter', password='exporter')
+        self.quiz = Quiz.objects.create(user=self.user, title="Révisions", difficulty='Standard')
+        Question.objects.create(quiz=self.quiz, text="Capitale de la France ?", options=["Paris", "Lyon"],
+                                correct_answer="Paris", explanation="Paris est la capitale.")
+        self.client.force_login(self.user)
+
+    def test_pdf_export(self):
+        response = self.client.get(f'/quiz/export-flashcards/{self.quiz.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertIn('Flashcards_', response['Content-Disposition'])
+
+    def test_other_users_quiz_not_found(self):
+        other = User.objects.create_user('intruder', password='intruder')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f'/quiz/export-flashcards/{self.quiz.id}/').status_code, 404)
+
+
+def _question(i):
+    return {"question": f"Question numéro {i} ?", "options": ["A", "B", "C", "D"], "answer": "A", "explanation": ""}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@mock.patch.multiple('quiz.health', PROVIDER_MIN_REQUESTS=5, PROVIDER_ERROR_THRESHOLD=0.5, PROVIDER_OPEN_SECONDS=60)
+class ProviderHealthTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.registry = ProviderHealthRegistry(clock=self.clock)
+        self.registry._persist = mock.Mock()
+        self.addCleanup(self.registry.stop)
+        self.health = self.registry.get('gemini')
+
+    def record(self, *outcomes):
+        for ok in outcomes:
+            self.registry.record('gemini', ok, 0.1)
+
+    def test_too_few_requests_to_judge(self):
+        # 4 errors are not enough, the 5th request makes it 4 errors out of 5
+        self.record(False, False, False, False)
+        self.assertEqual(self.health.state, STATE_CLOSED)
+        self.record(True)
+        self.assertEqual(self.health.state, STATE_OPEN)
+
+    def test_circuit_opens_at_the_error_threshold(self):
+        # 40% errors, then 50%
+        self.record(False, False, True, True, True)
+        self.assertEqual(self.health.state, STATE_CLOSED)
+        self.record(False)
+        self.assertEqual(self.health.state, STATE_OPEN)
+        self.assertFalse(self.registry.allow_request('gemini'))
+
+    def test_open_half_open_closed(self):
+        self.record(*[False] * 5)
+        self.assertEqual(self.health.state, STATE_OPEN)
+        self.clock.now += 59
+        self.assertFalse(self.registry.allow_request('gemini'))
+
+        # A failed probe re-opens the circuit for a full period
+        self.clock.now += 1
+        self.assertTrue(self.registry.allow_request('gemini'))
+        self.assertEqual(self.health.state, STATE_HALF_OPEN)
+        self.record(False)
+        self.assertEqual(self.health.state, STATE_OPEN)
+        self.clock.now += 59
+        self.assertFalse(self.registry.allow_request('gemini'))
+
+        self.clock.now += 1
+        self.assertTrue(self.registry.allow_request('gemini'))
+        self.record(True)
+        self.assertEqual(self.health.state, STATE_CLOSED)
+        self.assertEqual(self.registry.snapshot()[0]['requests'], 0)
+        self.assertTrue(self.registry.allow_request('gemini'))
+
+    def test_single_probe_while_half_open(self):
+        self.record(*[False] * 5)
+        self.clock.now += 60
+        self.assertTrue(self.registry.allow_request('gemini'))
+        self.assertTrue(self.health.probe_in_flight)
+        self.assertFalse(self.registry.allow_request('gemini'))
+        self.clock.now += 60
+        self.assertFalse(self.registry.allow_request('gemini'))
+        self.record(True)
+        self.assertFalse(self.health.probe_in_flight)
+
+    def test_old_requests_leave_the_window(self):
+        self.record(False, False, True, True)
+        self.clock.now += 301
+        self.record(False)
+        self.assertEqual(self.health.state, STATE_CLOSED)
+        self.assertEqual(self.registry.snapshot()[0]['requests'], 1)
+
+    def test_writer_thread_stops_after_writing_the_snapshots(self):
+        self.record(*[False] * 5)
+        writer = self.registry.writer
+        self.assertTrue(writer.is_alive())
+        self.registry.stop(timeout=5)
+        self.assertFalse(writer.is_alive())
+        self.assertIsNone(self.registry.writer)
+        self.assertEqual(self.registry._persist.call_args.args[0]['state'], STATE_OPEN)
+
+
+class StreamingGenerationTests(TestCase):
+    def setUp(self):
+        self.registry = ProviderHealthRegistry()
+        self.registry._persist = mock.Mock()
+        self.addCleanup(self.registry.stop)
+        patcher = mock.patch('quiz.services.provider_health', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = QuizGeneratorService()
+        self.service.use_google_direct = self.service.use_openai = self.service.use_openrouter = False
+
+    def stream_provider(self, questions):
+        def stream(text, num_questions, difficulty):
+            yield from questions
+        return mock.patch.object(self.service, '_streaming_providers', return_value=[('gemini', stream)])
+
+    def test_half_open_probe_released_when_consumer_stops(self):
+        health = self.registry.get('gemini')
+        health.state = STATE_HALF_OPEN
+        with self.stream_provider([_question(i) for i in range(5)]):
+            questions = self.service.generate_quiz_stream("x" * 100, 5)
+            next(questions)
+            self.assertTrue(health.probe_in_flight)
+            questions.close()
+        self.assertFalse(health.probe_in_flight)
+        self.assertEqual(health.state, 'closed')
+
+    def test_regex_fill_marks_the_stream_as_regex(self):
+        def regex_fill(text, num_questions, difficulty):
+            self.service.last_provider = 'regex'
+            return [_question(i) for i in range(10, 10 + num_questions)]
+
+        with self.stream_provider([_question(1)]), \
+                mock.patch.object(self.service, 'generate_quiz', side_effect=regex_fill):
+            questions = list(self.service.generate_quiz_stream("x" * 100, 3))
+        self.assertEqual(len(questions), 3)
+        self.assertEqual(self.service.last_provider, 'regex')
+
+
+class ChunkedGenerationTests(TestCase):
+    def setUp(self):
+        # Chunks of at most 40 characters: each section below is its own chunk
+        for patcher in (mock.patch('quiz.services.QUIZ_CHUNK_TOKENS', 10),
+                        mock.patch('quiz.services.QUIZ_MAX_CHUNKS', 3)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.service = QuizGeneratorService()
+
+    def generate(self, sections, answers, num_questions):
+        """
+        Runs _generate_chunked with one answer per section: (provider, questions).
+        """
+        chunks = []
+
+        def generate_single(service, chunk, num, difficulty):
+            chunks.append(chunk)
+            service.last_provider, questions = answers[chunk]
+            return questions
+
+        with mock.patch.object(QuizGeneratorService, '_generate_single', generate_single):
+            result = self.service._generate_chunked("\n\n".join(sections), num_questions, 'Standard')
+        return result, chunks
+
+    def test_split_on_paragraphs_then_sentences(self):
+        text = "Court.\n\nAutre court.\n\n" + "Une phrase. " * 5 + "\n" + "x" * 25
+        chunks = QuizGeneratorService._split_into_chunks(text, 20)
+        self.assertEqual(chunks[0], "Court.\nAutre court.")
+        self.assertTrue(all(len(chunk) <= 20 for chunk in chunks))
+        self.assertIn("x" * 20, chunks)
+        self.assertEqual("".join(chunks).replace("\n", "").replace(" ", ""),
+                         text.replace("\n", "").replace(" ", ""))
+
+    def test_number_of_chunks_is_capped(self):
+        sections = [f"Section {i} du cours complet." for i in range(9)]
+        answers = {section: ('gemini', [_question(i)]) for i, section in enumerate(sections)}
+        result, chunks = self.generate(sections, answers, 3)
+        # Evenly spaced over the document
+        self.assertEqual(sorted(chunks), [sections[0], sections[3], sections[6]])
+        self.assertEqual(len(result), 3)
+
+    def test_candidates_are_merged_round_robin_without_duplicates(self):
+        duplicate = dict(_question(1), question="question NUMÉRO 1")
+        invalid = dict(_question(9), answer="Z")
+        selected = self.service._merge_candidates(
+            [[_question(1), _question(2), _question(3)], [duplicate, invalid, _question(4)]], 3)
+        # Rank by rank across the chunks: the second chunk's questions come before the third of the first
+        self.assertEqual(selected, [_question(1), _question(2), _question(4)])
+        selected = self.service._merge_candidates([[_question(1), _question(2), _question(3)], [duplicate, _question(4)]], 10)
+        self.assertEqual(selected, [_question(1), _question(2), _question(4), _question(3)])
+
+    def test_regex_questions_only_fill_the_gaps(self):
+        sections = ["Section du fournisseur.", "Section en repli."]
+        answers = {
+            sections[0]: ('gemini', [_question(1), _question(2)]),
+            sections[1]: ('regex', [_question(2), _question(10), _question(11)]),
+        }
+        result, _ = self.generate(sections, answers, 3)
+        self.assertEqual(result, [_question(1), _question(2), _question(10)])
+        self.assertEqual(self.service.last_provider, 'regex')
+
+        result, _ = self.generate(sections, answers, 2)
+        self.assertEqual(result, [_question(1), _question(2)])
+        self.assertEqual(self.service.last_provider, 'gemini')
+
+
+class FakeLLMServerTests(TestCase):
+    def start(self, **config):
+        server = FakeLLMServer(port=0, config=FakeLLMConfig(latency=0, distribution='fixed', **config)).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def post(self, server, path='/v1/chat/completions', **body):
+        body.setdefault('messages', [{"role": "user", "content": "Génère un quiz JSON de 3 questions (Standard)"}])
+        return requests.post(server.base_url + path, json=body, timeout=5, stream=body.get('stream', False))
+
+    def test_chat_completion(self):
+        server = self.start()
+        response = self.post(server, model='gpt-test')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['object'], data['model']), ('chat.completion', 'gpt-test'))
+        message = data['choices'][0]['message']
+        self.assertEqual(message['role'], 'assistant')
+        quiz = json.loads(message['content'])['quiz']
+        self.assertEqual(len(quiz), 3)
+        self.assertTrue(all(QuizGeneratorService._is_valid_question(q) for q in quiz))
+
+    def test_streamed_chunks_add_up_to_the_quiz(self):
+        server = self.start(stream_chunk_size=16)
+        response = self.post(server, stream=True)
+        self.assertEqual(response.headers['Content-Type'], 'text/event-stream')
+        # Server-sent events are always UTF-8
+        events = [line.decode('utf-8')[len('data: '):] for line in response.iter_lines() if line]
+        self.assertEqual(events[-1], '[DONE]')
+        chunks = [json.loads(event) for event in events[:-1]]
+        self.assertTrue(all(chunk['object'] == 'chat.completion.chunk' for chunk in chunks))
+        self.assertEqual(chunks[-1]['choices'][0]['finish_reason'], 'stop')
+        pieces = [chunk['choices'][0]['delta'].get('content', '') for chunk in chunks]
+        self.assertGreater(len(pieces), 2)
+        self.assertTrue(all(len(piece) <= 16 for piece in pieces))
+        self.assertEqual(len(json.loads("".join(pieces))['quiz']), 3)
+
+    def test_errors_and_unknown_paths(self):
+        server = self.start(error_rate=1, error_status=503)
+        self.assertEqual(self.post(server).status_code, 503)
+        self.assertEqual(self.post(server, stream=True).status_code, 503)
+        self.assertEqual(self.post(server, path='/v1/embeddings').status_code, 404)
+        self.assertEqual((server.config.requests, server.config.errors), (2, 2))
+
+
+class HedgedGenerationTests(TestCase):
+    def setUp(self):
+        self.registry = ProviderHealthRegistry()
+        self.registry._persist = mock.Mock()
+        self.addCleanup(self.registry.stop)
+        for patcher in (mock.patch('quiz.services.provider_health', self.registry),
+                        mock.patch('quiz.services.QUIZ_HEDGE_DELAY', 0.3)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.service = QuizGeneratorService()
+        self.started = {}
+        self.begin = time.monotonic()
+
+    def provider(self, name, delay=0, questions=None, error=None):
+        def generate(text, num_questions, difficulty):
+            self.started[name] = time.monotonic() - self.begin
+            time.sleep(delay)
+            if error:
+                raise error
+            return questions if questions is not None else [_question(name)]
+        return name, generate
+
+    def hedge(self, *providers):
+        return self.service._generate_hedged(list(providers), "texte", 1, 'Standard')
+
+    def test_next_provider_starts_after_the_hedge_delay(self):
+        quiz_data = self.hedge(self.provider('gemini', delay=1), self.provider('openai'))
+        self.assertEqual(quiz_data, [_question('openai')])
+        self.assertEqual(self.service.last_provider, 'openai')
+        self.assertGreaterEqual(self.started['openai'], 0.3)
+
+    def test_first_valid_answer_wins(self):
+        quiz_data = self.hedge(self.provider('gemini', questions=[{"question": "incomplète"}]),
+                               self.provider('openai', delay=0.1))
+        self.assertEqual(quiz_data, [_question('openai')])
+        self.assertFalse(self.registry.get('gemini').events[-1][1])
+
+    def test_failure_starts_the_next_provider_at_once(self):
+        self.hedge(self.provider('gemini', error=RuntimeError("quota")), self.provider('openai'))
+        self.assertLess(self.started['openai'], 0.2)
+        self.assertEqual(self.service.last_provider, 'openai')
+
+    def test_open_circuit_is_skipped(self):
+        health = self.registry.get('gemini')
+        health.state, health.opened_at = 'open', time.monotonic()
+        self.assertEqual(self.hedge(self.provider('gemini'), self.provider('openai')), [_question('openai')])
+        self.assertNotIn('gemini', self.started)
+
+    def test_only_provider_calls_are_counted_as_llm_time(self):
+        request_metrics, token = start_request()
+        self.addCleanup(end_request, token)
+        with mock.patch.object(self.service, '_providers', return_value=[self.provider('gemini', delay=0.2)]):
+            self.service.generate_quiz("texte", 1)
+        self.assertGreaterEqual(request_metrics.external['llm'], 0.2)
+
+        def stream(text, num_questions, difficulty):
+            time.sleep(0.2)
+            yield _question(1)
+
+        request_metrics.external.clear()
+        with mock.patch.object(self.service, '_streaming_providers', return_value=[('gemini', stream)]):
+            list(self.service.generate_quiz_stream("texte " * 20, 1))
+        self.assertGreaterEqual(request_metrics.external['llm'], 0.2)
+
+        # The regex fallback is local work
+        request_metrics.external.clear()
+        with mock.patch.object(self.service, '_providers', return_value=[]):
+            self.service.generate_quiz("Une phrase assez longue pour le repli local. " * 20, 1)
+        self.assertNotIn('llm', request_metrics.external)
+
+    def test_all_providers_failing(self):
+        self.assertIsNone(self.hedge(self.provider('gemini', error=RuntimeError("a")), self.provider('openai', error=RuntimeError("b"))))
+
+
+@override_settings(QUIZ_STREAMING_GENERATION=True, QUIZ_CACHE_ENABLED=False)
+class StreamingJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('creator', password='creator')
+        GenerationJob.objects.create(user=self.user, source_type='youtube', title="Cours", num_questions=3, difficulty='Standard')
+        self.job = claim_next_job()
+        patcher = mock.patch('quiz.jobs.extract_job_text', return_value="Texte du cours. " * 10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_with_stream(self, questions, error=None):
+        def stream(service, text, num_questions, difficulty):
+            yield from questions
+            if error:
+                raise error
+        with mock.patch.object(QuizGeneratorService, 'generate_quiz_stream', stream):
+            return run_job(self.job)
+
+    def test_requeued_job_reuses_its_quiz(self):
+        # A worker died in the middle of the stream, leaving a partial quiz
+        partial = Quiz.objects.create(user=self.user, title="Cours", difficulty='Standard')
+        Question.objects.create(quiz=partial, text="Partielle ?", options=["A", "B"], correct_answer="A")
+        GenerationJob.objects.filter(pk=self.job.pk).update(quiz=partial)
+
+        self.assertEqual(requeue_stale_jobs(0), 1)
+        self.job = claim_next_job()
+        self.run_with_stream([_question(i) for i in range(3)])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, GenerationJob.STATUS_DONE)
+        self.assertEqual(self.job.quiz_id, partial.id)
+        self.assertEqual(Quiz.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Question.objects.filter(quiz=partial).count(), 3)
+        # One version bump for the whole stream, not one per question
+        partial.refresh_from_db()
+        self.assertEqual(partial.answer_key_version, 1)
+
+        # The take page polling since the first attempt starts over
+        self.client.force_login(self.user)
+        data = self.client.get(f'/quiz/setup/job/{self.job.pk}/status/', {'after': 0}).json()
+        self.assertEqual(data['attempt'], 2)
+
+    def test_stream_failing_partway_discards_the_partial_quiz(self):
+        self.run_with_stream([_question(1), _question(2)], error=RuntimeError("coupure"))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, GenerationJob.STATUS_FAILED)
+        self.assertIsNone(self.job.quiz_id)
+        self.assertFalse(Quiz.objects.filter(user=self.user).exists())
+
+        self.client.force_login(self.user)
+        data = self.client.get(f'/quiz/setup/job/{self.job.pk}/status/', {'after': 0}).json()
+        self.assertEqual(data['questions'], [])
+        self.assertNotIn('redirect_url', data)
+        response = self.client.get(f'/quiz/setup/job/{self.job.pk}/')
+        self.assertContains(response, self.job.error)
+
+    def test_status_endpoint_returns_new_questions(self):
+        self.run_with_stream([_question(i) for i in range(3)])
+        self.client.force_login(self.user)
+        first = Question.objects.filter(quiz__user=self.user).order_by('id').first()
+        data = self.client.get(f'/quiz/setup/job/{self.job.pk}/status/', {'after': first.id}).json()
+        self.assertEqual(data['status'], GenerationJob.STATUS_DONE)
+        self.assertEqual([q['text'] for q in data['questions']], ["Question numéro 1 ?", "Question numéro 2 ?"])
+
+
+@override_settings(QUIZ_STREAMING_GENERATION=False, QUIZ_CACHE_ENABLED=False)
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('queued', password='queued')
+        self.job = GenerationJob.objects.create(user=self.user, source_type='youtube', title="Cours", num_questions=3, difficulty='Standard')
+        patcher = mock.patch('quiz.jobs.extract_job_text', return_value="Texte du cours. " * 10)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def run_claimed(self, job):
+        with mock.patch.object(QuizGeneratorService, 'generate_quiz', return_value=[_question(i) for i in range(3)]):
+            return run_job(job)
+
+    def test_job_is_claimed_once(self):
+        job = claim_next_job()
+        self.assertEqual((job.pk, job.status, job.attempts), (self.job.pk, GenerationJob.STATUS_RUNNING, 1))
+        self.assertIsNone(claim_next_job())
+
+    def test_claim_lost_to_another_worker_moves_on(self):
+        other = GenerationJob.objects.create(user=self.user, source_type='youtube', title="Autre", num_questions=3, difficulty='Standard')
+        taken = GenerationJob.objects.filter(pk=self.job.pk)
+
+        def racing_filter(*args, **kwargs):
+            # Another worker claims the oldest job between the SELECT and the conditional UPDATE
+            if kwargs.get('pk') == self.job.pk and kwargs.get('status') == GenerationJob.STATUS_PENDING:
+                taken.update(status=GenerationJob.STATUS_RUNNING)
+            return GenerationJob.objects.all().filter(*args, **kwargs)
+
+        with mock.patch('quiz.jobs.GenerationJob.objects.filter', side_effect=racing_filter):
+            job = claim_next_job()
+        self.assertEqual(job.pk, other.pk)
+
+    def test_only_jobs_without_heartbeat_are_requeued(self):
+        job = claim_next_job()
+        self.assertEqual(requeue_stale_jobs(60), 0)
+        GenerationJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(requeue_stale_jobs(60), 1)
+        self.assertEqual(claim_next_job().attempts, 2)
+
+    def test_run_job_stores_the_quiz_and_its_answer_key(self):
+        job = self.run_claimed(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_DONE)
+        self.assertEqual(job.quiz.questions.count(), 3)
+        self.assertIsNotNone(cache.get(answer_key_cache_key(job.quiz_id, job.quiz.answer_key_version)))
+
+    def test_requeued_worker_does_not_store_its_results(self):
+        first_claim = claim_next_job()
+        requeue_stale_jobs(0)
+        second_claim = claim_next_job()
+
+        self.run_claimed(first_claim)
+        self.assertFalse(Quiz.objects.filter(user=self.user).exists())
+        self.assertEqual(GenerationJob.objects.get(pk=self.job.pk).status, GenerationJob.STATUS_RUNNING)
+
+        self.run_claimed(second_claim)
+        self.assertEqual(Quiz.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(GenerationJob.objects.get(pk=self.job.pk).status, GenerationJob.STATUS_DONE)
+
+    def test_status_page_and_endpoint(self):
+        status_url = f'/quiz/setup/job/{self.job.pk}/'
+        self.assertEqual(self.client.get(status_url).status_code, 200)
+        data = self.client.get(f'{status_url}status/').json()
+        self.assertEqual(data['status'], GenerationJob.STATUS_PENDING)
+        self.assertNotIn('redirect_url', data)
+        self.assertNotIn('questions', data)
+
+        job = self.run_claimed(claim_next_job())
+        take_url = f'/quiz/take/{job.quiz_id}/'
+        self.assertRedirects(self.client.get(status_url), take_url, fetch_redirect_response=False)
+        self.assertEqual(self.client.get(f'{status_url}status/').json()['redirect_url'], take_url)
+
+        self.client.force_login(User.objects.create_user('intruder', password='intruder'))
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+        self.assertEqual(self.client.get(f'{status_url}status/').status_code, 404)
+
+
+@override_settings(QUIZ_STREAMING_GENERATION=False, QUIZ_CACHE_ENABLED=True)
+class RegexFallbackCacheTests(TestCase):
+    LONG_TEXT = "Début du cours. " + "Une phrase assez longue du document. " * 300
+    numbers = itertools.count(1)
+
+    def setUp(self):
+        self.user = User.objects.create_user('chunker', password='chunker')
+
+    @staticmethod
+    def fake_single(service, chunk, num_questions, difficulty):
+        # Only the first chunk gets an answer from the provider
+        if chunk.startswith("Début"):
+            service.last_provider = 'gemini'
+            return [_question(0)]
+        service.last_provider = 'regex'
+        return [_question(next(RegexFallbackCacheTests.numbers)) for _ in range(num_questions)]
+
+    def test_chunked_output_with_regex_questions_is_not_cached(self):
+        GenerationJob.objects.create(user=self.user, source_type='youtube', title="Long", num_questions=4, difficulty='Standard')
+        job = claim_next_job()
+        with mock.patch('quiz.jobs.extract_job_text', return_value=self.LONG_TEXT), \
+                mock.patch.object(QuizGeneratorService, '_generate_single', self.fake_single):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_DONE)
+        self.assertEqual(job.quiz.questions.count(), 4)
+        self.assertFalse(GenerationCacheEntry.objects.exists())
+
+
+@override_settings(QUIZ_CACHE_ENABLED=True, QUIZ_CACHE_TTL=3600, QUIZ_CACHE_MAX_ENTRIES=2, QUIZ_CACHE_STATS_FLUSH_EVERY=3)
+class GenerationCacheTests(TestCase):
+    def setUp(self):
+        GenerationCache.clear()
+
+    def store(self, key):
+        GenerationCache.set(key, [_question(key)], 1, 'Standard', 'gemini')
+
+    def test_hit_and_miss_counters_are_written_in_batches(self):
+        self.assertIsNone(GenerationCache.get('a'))
+        self.store('a')
+        self.assertEqual(GenerationCache.get('a'), [_question('a')])
+        self.assertFalse(GenerationCacheStats.objects.exists())
+
+        GenerationCache.get('a')
+        counters = GenerationCacheStats.objects.get()
+        self.assertEqual((counters.hits, counters.misses), (2, 1))
+
+        GenerationCache.get('b')
+        stats = GenerationCache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses'], stats['hit_rate']), (1, 2, 2, 0.5))
+        self.assertEqual(GenerationCacheEntry.objects.get(key='a').hit_count, 2)
+
+    def test_expired_entries_are_misses(self):
+        self.store('a')
+        GenerationCacheEntry.objects.update(created_at=timezone.now() - timedelta(seconds=3601))
+        self.assertIsNone(GenerationCache.get('a'))
+        self.assertFalse(GenerationCacheEntry.objects.exists())
+
+    def test_least_recently_used_entries_are_evicted(self):
+        now = timezone.now()
+        with self.settings(QUIZ_CACHE_MAX_ENTRIES=3):
+            for age, key in enumerate(('c', 'b', 'a'), start=1):
+                self.store(key)
+                GenerationCacheEntry.objects.filter(key=key).update(last_used_at=now - timedelta(minutes=age))
+        # A hit makes the oldest entry the most recently used
+        GenerationCache.get('a')
+        self.store('d')
+        self.assertEqual(set(GenerationCacheEntry.objects.values_list('key', flat=True)), {'a', 'd'})
+
+    @override_settings(QUIZ_STREAMING_GENERATION=False)
+    def test_cache_hit_gives_each_job_its_own_quiz(self):
+        user = User.objects.create_user('cached', password='cached')
+
+        def generate(service, text, num_questions, difficulty):
+            service.last_provider = 'gemini'
+            return [_question(i) for i in range(num_questions)]
+
+        quizzes = []
+        with mock.patch('quiz.jobs.extract_job_text', return_value="Texte du cours. " * 10), \
+                mock.patch.object(QuizGeneratorService, 'generate_quiz', autospec=True, side_effect=generate) as generate_quiz:
+            for _ in range(2):
+                GenerationJob.objects.create(user=user, source_type='youtube', title="Cours", num_questions=3, difficulty='Standard')
+                quizzes.append(run_job(claim_next_job()).quiz)
+        self.assertEqual(generate_quiz.call_count, 1)
+        self.assertNotEqual(quizzes[0].pk, quizzes[1].pk)
+        first, second = (list(q.questions.order_by('id').values_list('id', 'text')) for q in quizzes)
+        self.assertEqual([text for _, text in first], [text for _, text in second])
+        self.assertFalse({pk for pk, _ in first} & {pk for pk, _ in second})
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('grader', password='grader')
+        self.quiz = Quiz.objects.create(user=self.user, title="Noté", difficulty='Standard')
+        self.questions = [
+            Question.objects.create(quiz=self.quiz, text=f"Question {i}", options=["A", "B", "C", "D"], correct_answer="A")
+            for i in range(3)
+        ]
+        self.quiz.refresh_from_db()
+
+    def test_grades_against_the_correct_answers(self):
+        result = grade_submission(self.user, self.quiz, {'question_0': 'A', 'question_1': ' A ', 'question_2': 'B'}, '01:00')
+        self.assertEqual((result['score'], result['total']), (2, 3))
+        details = ScoreDetail.objects.filter(history=result['history']).order_by('question_id')
+        self.assertEqual([d.is_correct for d in details], [True, True, False])
+
+    def test_question_change_is_seen_by_a_stale_process_cache(self):
+        build_answer_key(self.quiz.id)
+        stale_key = answer_key_cache_key(self.quiz.id, self.quiz.answer_key_version)
+        Question.objects.filter(pk=self.questions[0].pk).update(correct_answer="B")
+        invalidate_answer_key(self.quiz.id)
+        # As in another process, the old key is still cached but no longer used
+        self.assertIsNotNone(cache.get(stale_key))
+
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        self.assertEqual(quiz.answer_key_version, self.quiz.answer_key_version + 1)
+        result = grade_submission(self.user, quiz, {'question_0': 'B', 'question_1': 'A', 'question_2': 'A'}, '01:00')
+        self.assertEqual(result['score'], 3)
+
+    def test_bulk_created_questions_are_graded_after_invalidation(self):
+        get_answer_key(self.quiz)
+        Question.objects.bulk_create([
+            Question(quiz=self.quiz, text=f"Ajout {i}", options=["A", "B"], correct_answer="B") for i in range(2)
+        ])
+        invalidate_answer_key(self.quiz.id)
+
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        answers = {'question_0': 'A', 'question_1': 'A', 'question_2': 'A', 'question_3': 'B', 'question_4': 'B'}
+        result = grade_submission(self.user, quiz, answers, '01:00')
+        self.assertEqual((result['score'], result['total']), (5, 5))
+
+    def test_missing_answers_are_recorded_as_incorrect(self):
+        result = grade_submission(self.user, self.quiz, {'question_0': 'A'}, '01:00')
+        self.assertEqual(result['score'], 1)
+        details = ScoreDetail.objects.filter(history=result['history']).order_by('question_id')
+        self.assertEqual([d.user_answer for d in details], ['A', NO_ANSWER, NO_ANSWER])
+        self.assertEqual([d.is_correct for d in details], [True, False, False])
+
+    def test_xp_and_streak(self):
+        profile = self.user.profile
+        profile.last_activity = date.today() - timedelta(days=1)
+        profile.streak = 4
+        profile.save()
+
+        # Perfect score: 10 XP per answer times the Standard multiplier, plus the 50 XP bonus
+        result = grade_submission(self.user, self.quiz, {f'question_{i}': 'A' for i in range(3)}, '01:00')
+        self.assertEqual(result['xp_earned'], 3 * 10 * 1.5 + 50)
+        self.assertEqual(result['streak'], 5)
+
+        # Same day: the streak stays
+        result = grade_submission(self.user, self.quiz, {'question_0': 'A'}, '01:00')
+        self.assertEqual(result['xp_earned'], 10 * 1.5)
+        self.assertEqual(result['streak'], 5)
+        profile.refresh_from_db()
+        self.assertEqual(profile.xp, 3 * 10 * 1.5 + 50 + 10 * 1.5)
+
+    def test_query_count_does_not_depend_on_the_number_of_questions(self):
+        large = Quiz.objects.create(user=self.user, title="Long", difficulty='Standard')
+        Question.objects.bulk_create([
+            Question(quiz=large, text=f"Question {i}", options=["A", "B", "C", "D"], correct_answer="A")
+            for i in range(20)
+        ])
+        # The first attempt creates the rollups, and answer keys are compiled once
+        grade_submission(self.user, self.quiz, {}, '01:00')
+        build_answer_key(large.id)
+        large.refresh_from_db()
+        for quiz_obj, answers in ((self.quiz, {'question_0': 'A', 'question_1': 'C'}), (large, {'question_5': 'A'})):
+            user = User.objects.get(pk=self.user.pk)
+            # Savepoints, history, details, stats lock and update, activity, profile read, update and refresh
+            with self.assertNumQueries(12):
+                grade_submission(user, quiz_obj, answers, '01:00')
+
+
+class UserStatsTests(TestCase):
+    FIELDS = ('quiz_count', 'score_sum', 'total_sum', 'best_score', 'time_seconds', 'by_difficulty')
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('rollup', password='rollup')
+
+    def quiz(self, difficulty, size):
+        quiz = Quiz.objects.create(user=self.user, title=difficulty, difficulty=difficulty)
+        Question.objects.bulk_create([
+            Question(quiz=quiz, text=f"Question {i}", options=["A", "B"], correct_answer="A") for i in range(size)
+        ])
+        return quiz
+
+    def test_incremental_rollup_matches_a_rebuild(self):
+        standard, expert = self.quiz('Standard', 3), self.quiz('Expert', 5)
+        attempts = [
+            (standard, {'question_0': 'A'}, '01:30'),
+            (expert, {f'question_{i}': 'A' for i in range(5)}, '1:02:03'),
+            (standard, {'question_0': 'A', 'question_1': 'A', 'question_2': 'B'}, 'N/A'),
+            (expert, {'question_3': 'A', 'question_4': 'A'}, '00:45'),
+        ]
+        for quiz, answers, time_elapsed in attempts:
+            grade_submission(self.user, quiz, answers, time_elapsed)
+
+        incremental = UserStats.objects.get(user=self.user)
+        self.assertEqual(incremental.quiz_count, 4)
+        self.assertEqual(incremental.time_seconds, 90 + 3723 + 45)
+        rebuilt = rebuild_user_stats(self.user)
+        self.assertEqual([getattr(rebuilt, field) for field in self.FIELDS],
+                         [getattr(incremental, field) for field in self.FIELDS])
+        self.assertEqual(rebuilt.by_difficulty['Expert'], {'count': 2, 'score_sum': 7, 'total_sum': 10})
+
+
+class DailyActivityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('active', password='active')
+        self.today = timezone.localdate()
+
+    def attempt(self, days_ago):
+        # As grade_submission does: the history row, then the daily counter
+        day = self.today - timedelta(days=days_ago)
+        history = ScoreHistory.objects.create(user=self.user, score=1, total_questions=2, time_elapsed='01:00')
+        ScoreHistory.objects.filter(pk=history.pk).update(
+            completed_at=timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12))
+        record_activity(self.user, day)
+
+    def test_window_includes_today_and_the_oldest_day(self):
+        for days_ago in (0, 0, 29, 30, 89, 90):
+            self.attempt(days_ago)
+        oldest = (self.today - timedelta(days=29)).isoformat()
+        self.assertEqual(get_activity(self.user, 30), {self.today.isoformat(): 2, oldest: 1})
+        self.assertEqual(len(get_activity(self.user, 90)), 4)
+        self.assertEqual(sum(get_activity(self.user, 365).values()), 6)
+
+    def test_days_without_activity_are_left_out(self):
+        self.assertEqual(get_activity(self.user, 30), {})
+        self.attempt(3)
+        self.assertEqual(list(get_activity(self.user, 30)), [(self.today - timedelta(days=3)).isoformat()])
+
+    def test_backfill_matches_the_recorded_counters(self):
+        for days_ago in (0, 1, 1, 1, 7, 40, 400):
+            self.attempt(days_ago)
+        recorded = set(DailyActivity.objects.filter(user=self.user).values_list('date', 'count'))
+        rebuild_daily_activity(self.user)
+        self.assertEqual(set(DailyActivity.objects.filter(user=self.user).values_list('date', 'count')), recorded)
+        self.assertEqual(len(recorded), 5)
+
+
+@mock.patch('quiz.views.HISTORY_PAGE_SIZE', 2)
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('historian', password='historian')
+        self.client.force_login(self.user)
+
+    def attempts(self, *minutes_ago):
+        now = timezone.now()
+        ids = []
+        for minutes in minutes_ago:
+            history = ScoreHistory.objects.create(user=self.user, score=1, total_questions=2, time_elapsed='01:00')
+            ScoreHistory.objects.filter(pk=history.pk).update(completed_at=now - timedelta(minutes=minutes))
+            ids.append(history.pk)
+        return ids
+
+    def pages(self):
+        pages, cursor = [], None
+        while True:
+            items, cursor = _history_page(self.user, cursor)
+            pages.append([item.pk for item in items])
+            if cursor is None:
+                return pages
+
+    def test_pages_end_without_an_empty_page(self):
+        ids = self.attempts(1, 2, 3, 4)
+        self.assertEqual(self.pages(), [ids[:2], ids[2:]])
+        ids.extend(self.attempts(5))
+        self.assertEqual(self.pages(), [ids[:2], ids[2:4], ids[4:]])
+
+    def test_equal_completion_times_are_ordered_by_id(self):
+        first, second, third = self.attempts(1, 1, 1)
+        older, = self.attempts(2)
+        # The cursor falls between two attempts of the same instant
+        self.assertEqual(self.pages(), [[third, second], [first, older]])
+
+    def test_endpoint(self):
+        ids = self.attempts(1, 2, 3)
+        _, cursor = _history_page(self.user)
+        data = self.client.get('/quiz/history/page/', {'cursor': cursor}).json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn(f'/quiz/analysis/{ids[2]}/', data['html'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', '_12', '2024-13-01T00:00:00+00:00_12', '2024-01-01T00:00:00+00:00_x',
+                       '2024-01-01T00:00:00+00:00_-1', '2024-01-01T00:00:00_12'):
+            response = self.client.get('/quiz/history/page/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {'error': 'Curseur invalide.'})
+
+
+class ProviderSessionTests(TestCase):
+    def tearDown(self):
+        providers.reset()
+
+    def test_one_http_session_per_thread(self):
+        sessions = []
+        worker = threading.Thread(target=lambda: sessions.append(providers.get_http_session()))
+        worker.start()
+        worker.join()
+        session = providers.get_http_session()
+        self.assertIs(providers.get_http_session(), session)
+        self.assertIsNot(sessions[0], session)
+
+        with mock.patch.object(session, 'close') as close:
+            providers.reset()
+        close.assert_called_once()
+        self.assertIsNot(providers.get_http_session(), session)
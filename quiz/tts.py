@@ -0,0 +1,331 @@
+"""
+Text-to-speech audio for the "read aloud" buttons, rendered once per text
+and language and then served from a size-bounded disk cache. Long texts are
+rendered sentence by sentence, so the first sentence can be played while
+the next ones are rendered. Rendering runs in a pool of TTS_WORKERS threads
+with the engine selected by TTS_BACKEND (quiz.tts_backends).
+"""
+import hashlib
+import itertools
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+
+from core.instrumentation import track_external
+from .tts_backends import get_backend
+
+TTS_LANGUAGE = 'fr'
+# Hits refresh the LRU timestamp of a file at most this often (seconds)
+TOUCH_INTERVAL = 3600
+# Unfinished renders older than this are removed by evict() (seconds)
+STALE_TEMP_AGE = 3600
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+SENTENCE_END_RE = re.compile(r'(?<=[.!?…;:])\s+')
+# Longest text rendered in one provider call; longer sentences are cut at a comma or a space
+CHUNK_MAX_CHARS = 200
+# Sentences rendered in parallel with the one awaited
+LOOKAHEAD_CHUNKS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def split_sentences(text, max_chars=CHUNK_MAX_CHARS):
+    """
+    Splits `text` into the chunks rendered separately: its sentences, the
+    ones longer than `max_chars` cut at the last comma (or space) before
+    the limit.
+    """
+    chunks = []
+    for sentence in SENTENCE_END_RE.split(normalize_text(text)):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(', ', 0, max_chars) + 1
+            if cut <= 0:
+                cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            chunks.append(sentence)
+    return chunks
+
+
+def get_executor():
+    """
+    Shared pool running the renders: bounds the concurrent engine calls to
+    TTS_WORKERS whatever the number of request threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.TTS_WORKERS, thread_name_prefix='tts')
+        return _executor
+
+
+def synthesize(text, lang=TTS_LANGUAGE):
+    """
+    Renders `text` to one audio file with the configured backend.
+    """
+    return get_backend().synthesize(text, lang)
+
+
+class AudioCache:
+    """
+    Content-addressed store of rendered audio under TTS_CACHE_DIR: one file
+    per sha256(backend, lang, text), sharded by the first two hex digits. File
+    modification times record the last use, and the least recently used
+    files are evicted beyond TTS_CACHE_MAX_BYTES.
+    """
+
+    @staticmethod
+    def make_key(text, lang=TTS_LANGUAGE):
+        digest = hashlib.sha256()
+        for part in (get_backend().signature, lang, normalize_text(text)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    @staticmethod
+    def path(key):
+        return os.path.join(settings.TTS_CACHE_DIR, key[:2], f"{key}.{get_backend().extension}")
+
+    @staticmethod
+    def get(key):
+        """
+        Returns the path of the cached audio, or None on a miss.
+        """
+        path = AudioCache.path(key)
+        try:
+            modified = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        if time.time() - modified > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except FileNotFoundError:  # evicted meanwhile
+                return None
+        return path
+
+    @staticmethod
+    def store(key, audio, evict=True):
+        """
+        Writes the audio atomically (temporary file then rename, so readers
+        never see a partial file) and returns its path. `evict=False` leaves
+        the size check to the caller storing several files.
+        """
+        path = AudioCache.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            f.write(audio)
+        os.replace(f.name, path)
+        if evict:
+            AudioCache.evict()
+        return path
+
+    @staticmethod
+    def _files():
+        root = settings.TTS_CACHE_DIR
+        if not os.path.isdir(root):
+            return
+        for shard in os.scandir(root):
+            if shard.is_dir():
+                yield from os.scandir(shard.path)
+
+    @staticmethod
+    def evict(max_bytes=None):
+        """
+        Removes the least recently used files until the cache fits in
+        `max_bytes` (TTS_CACHE_MAX_BYTES by default). Returns the number of
+        files removed.
+        """
+        max_bytes = settings.TTS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        now = time.time()
+        files, total, removed = [], 0, 0
+        for entry in AudioCache._files():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.tmp'):
+                if now - stat.st_mtime > STALE_TEMP_AGE:
+                    removed += AudioCache._remove(entry.path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total > max_bytes:
+            for _, size, path in sorted(files):
+                removed += AudioCache._remove(path)
+                total -= size
+                if total <= max_bytes:
+                    break
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def stats():
+        sizes = [entry.stat().st_size for entry in AudioCache._files() if not entry.name.endswith('.tmp')]
+        return {'files': len(sizes), 'bytes': sum(sizes), 'max_bytes': settings.TTS_CACHE_MAX_BYTES}
+
+
+def _render_chunk(chunk, lang):
+    key = AudioCache.make_key(chunk, lang)
+    path = AudioCache.get(key)
+    if path is None:
+        audio = synthesize(chunk, lang)
+        AudioCache.store(key, audio, evict=False)
+        return audio
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def render_chunks(text, lang=TTS_LANGUAGE):
+    """
+    Yields the audio of each sentence chunk of `text`, in order, rendered
+    in the worker pool with up to LOOKAHEAD_CHUNKS + 1 sentences rendering
+    at once. Each chunk is
+    yielded as soon as it and the ones before it are rendered, and every
+    completed render starts the next sentence at once, even while an
+    earlier, slower sentence is still being rendered. Every chunk is cached
+    on its own, so a sentence shared by several texts is rendered once.
+    """
+    executor = get_executor()
+    chunks = enumerate(split_sentences(text))
+    pending, rendered = {}, {}
+    position = 0
+
+    def submit():
+        while len(pending) <= LOOKAHEAD_CHUNKS:
+            item = next(chunks, None)
+            if item is None:
+                return
+            index, chunk = item
+            pending[executor.submit(_render_chunk, chunk, lang)] = index
+
+    submit()
+    while pending or rendered:
+        if position not in rendered:
+            with track_external('tts'):
+                done, _ = wait(pending, timeout=settings.TTS_TIMEOUT, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"Rendu TTS plus long que {settings.TTS_TIMEOUT} s")
+            for future in done:
+                rendered[pending.pop(future)] = future.result()
+            submit()
+            continue
+        position += 1
+        yield rendered.pop(position - 1)
+
+
+def get_audio(text, lang=TTS_LANGUAGE):
+    """
+    Path of the audio for `text`, rendered and cached on a miss.
+    Returns (key, path).
+    """
+    key = AudioCache.make_key(text, lang)
+    path = AudioCache.get(key)
+    if path is None:
+        audio = get_backend().join(list(render_chunks(text, lang)))
+        # A single sentence was cached as its own chunk
+        path = AudioCache.get(key) or AudioCache.store(key, audio)
+    return key, path
+
+
+def stream_audio(text, lang=TTS_LANGUAGE):
+    """
+    Iterator over the audio of `text` chunk by chunk, for texts not cached
+    yet. The first chunk is rendered before returning, so provider errors
+    are raised here rather than in the middle of the response. The whole
+    audio is cached once the last chunk has been sent.
+    """
+    backend = get_backend()
+    key = AudioCache.make_key(text, lang)
+    chunks = render_chunks(text, lang)
+    first = next(chunks)
+    rendered = []
+
+    def collect():
+        for audio in itertools.chain([first], chunks):
+            rendered.append(audio)
+            yield audio
+
+    def stream():
+        yield from backend.stream(collect())
+        AudioCache.store(key, backend.join(rendered))
+
+    return key, stream()
+
+
+def _read_range(path, start, length, block_size=8192):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(block_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def audio_response(request, key, path):
+    """
+    Serves a cached audio file with its key as ETag (304 when the client
+    already has it) and single-range support (206), so players can seek
+    and resume without downloading the whole file again.
+    """
+    etag = f'"{key}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        size = os.path.getsize(path)
+        match = RANGE_RE.match(request.headers.get('Range', ''))
+        if match and (match[1] or match[2]):
+            if match[1]:
+                start = int(match[1])
+                end = min(int(match[2]), size - 1) if match[2] else size - 1
+            else:  # suffix range: the last N bytes
+                start, end = max(size - int(match[2]), 0), size - 1
+            if start > end or start >= size:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{size}"
+                return response
+            response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206, content_type=get_backend().content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=get_backend().content_type)
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    # The content of a key never changes
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+def streaming_audio_response(key, audio):
+    """
+    Sends audio while it is being rendered: no length, so no range support
+    until the complete file is cached.
+    """
+    response = StreamingHttpResponse(audio, content_type=get_backend().content_type)
+    response['ETag'] = f'"{key}"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
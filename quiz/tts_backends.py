@@ -0,0 +1,153 @@
+"""
+Text-to-speech engines behind quiz.tts, selected with the TTS_BACKEND
+setting:
+
+- gtts: Google Translate voices through gTTS (network, MP3).
+- espeak: local espeak-ng process (offline, CPU bound, WAV).
+- null: silence proportional to the text length, for tests and benchmarks.
+
+A backend renders one text to one complete audio file, and knows how to
+join the files of consecutive sentences into one file or one stream.
+"""
+import io
+import struct
+import subprocess
+import wave
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from gtts import gTTS
+
+
+class TTSBackend(ABC):
+    name = None
+    content_type = None
+    extension = None
+
+    @property
+    def signature(self):
+        """Part of the cache keys: audio from another engine or voice is never reused."""
+        return self.name
+
+    @abstractmethod
+    def synthesize(self, text, lang):
+        """The complete audio file of `text`."""
+
+    @abstractmethod
+    def join(self, parts):
+        """One complete file from the audio of consecutive chunks."""
+
+    @abstractmethod
+    def stream(self, parts):
+        """Iterator of bytes playable as they arrive, from an iterator of chunk audio."""
+
+
+class MP3Backend(TTSBackend):
+    """MP3 streams can simply be concatenated."""
+    content_type = 'audio/mpeg'
+    extension = 'mp3'
+
+    def join(self, parts):
+        return b''.join(parts)
+
+    def stream(self, parts):
+        return iter(parts)
+
+
+class WavBackend(TTSBackend):
+    """
+    WAV files are re-encoded into a single file on join. Streams start with
+    a header of unknown length (0xFFFFFFFF sizes, accepted by players),
+    followed by the PCM frames of each chunk.
+    """
+    content_type = 'audio/wav'
+    extension = 'wav'
+
+    @staticmethod
+    def _read(audio):
+        with wave.open(io.BytesIO(audio)) as f:
+            return f.getparams(), f.readframes(f.getnframes())
+
+    def join(self, parts):
+        output = io.BytesIO()
+        with wave.open(output, 'wb') as f:
+            for index, part in enumerate(parts):
+                params, frames = self._read(part)
+                if not index:
+                    f.setparams(params)
+                f.writeframes(frames)
+        return output.getvalue()
+
+    def stream(self, parts):
+        for index, part in enumerate(parts):
+            params, frames = self._read(part)
+            if not index:
+                block_align = params.nchannels * params.sampwidth
+                yield struct.pack(
+                    '<4sI4s4sIHHIIHH4sI', b'RIFF', 0xFFFFFFFF, b'WAVE', b'fmt ', 16, 1,
+                    params.nchannels, params.framerate, params.framerate * block_align,
+                    block_align, params.sampwidth * 8, b'data', 0xFFFFFFFF
+                )
+            yield frames
+
+
+class GTTSBackend(MP3Backend):
+    name = 'gtts'
+
+    def synthesize(self, text, lang):
+        fp = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(fp)
+        return fp.getvalue()
+
+
+class EspeakBackend(WavBackend):
+    name = 'espeak'
+
+    def __init__(self):
+        self.binary = settings.TTS_ESPEAK_BINARY
+        self.voice = settings.TTS_ESPEAK_VOICE
+
+    @property
+    def signature(self):
+        return f"{self.name}:{self.voice}"
+
+    def synthesize(self, text, lang):
+        # The text goes through stdin so it is never parsed as options
+        command = [self.binary, '-v', self.voice or lang, '-b', '1', '--stdout', '--stdin']
+        try:
+            result = subprocess.run(command, input=text.encode('utf-8'), capture_output=True,
+                                    timeout=settings.TTS_TIMEOUT, check=True)
+        except FileNotFoundError:
+            raise RuntimeError(f"Moteur TTS hors ligne introuvable : {self.binary}")
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"espeak-ng a échoué : {e.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+
+
+class NullBackend(WavBackend):
+    name = 'null'
+    SAMPLE_RATE = 8000
+    SECONDS_PER_CHAR = 0.06
+
+    def synthesize(self, text, lang):
+        output = io.BytesIO()
+        with wave.open(output, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.SAMPLE_RATE)
+            f.writeframes(b'\x00\x00' * int(len(text) * self.SECONDS_PER_CHAR * self.SAMPLE_RATE))
+        return output.getvalue()
+
+
+TTS_BACKENDS = {backend.name: backend for backend in (GTTSBackend, EspeakBackend, NullBackend)}
+_instances = {}
+
+
+def get_backend():
+    name = settings.TTS_BACKEND
+    if name not in _instances:
+        try:
+            _instances[name] = TTS_BACKENDS[name]()
+        except KeyError:
+            raise RuntimeError(f"TTS_BACKEND inconnu : {name} (choix : {', '.join(TTS_BACKENDS)})")
+    return _instances[name]
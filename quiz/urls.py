@@ -5,15 +5,20 @@ app_name = 'quiz'
 
 urlpatterns = [
     path('setup/', views.quiz_setup, name='quiz_setup'),
+    path('setup/job/<int:job_id>/', views.generation_status, name='generation_status'),
+    path('setup/job/<int:job_id>/status/', views.generation_job_status, name='generation_job_status'),
     path('take/', views.quiz_take, name='quiz_take'),
     path('take/<int:quiz_id>/', views.quiz_take, name='quiz_take_id'),
     path('history/', views.quiz_history, name='quiz_history'),
+    path('history/page/', views.quiz_history_page, name='quiz_history_page'),
     path('generate-audio/', views.generate_audio, name='generate_audio'),
     path('export-flashcards/<int:quiz_id>/', views.export_flashcards, name='export_flashcards'),
     path('analysis/<int:history_id>/', views.quiz_analysis, name='quiz_analysis'),
     path('save-flashcard/', views.save_flashcard, name='save_flashcard'),
     path('srs/', views.srs_dashboard, name='srs_dashboard'),
     path('srs/review/', views.srs_review, name='srs_review'),
+    path('srs/session/', views.srs_session, name='srs_session'),
+    path('srs/review-log.csv', views.srs_review_log_export, name='srs_review_log_export'),
     path('ai-tutor-chat/', views.ai_tutor_chat, name='ai_tutor_chat'),
     path('analytics/', views.analytics_dashboard, name='analytics_dashboard'),
     path('library/', views.public_library, name='public_library'),
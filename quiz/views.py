@@ -1,14 +1,22 @@
 import json
 from django.db import models
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse, HttpResponse, FileResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
 from django.contrib import messages
 from .forms import QuizSetupForm
-from .services import QuizGeneratorService, DocumentProcessor
-from .models import ScoreHistory, Quiz, Question, Flashcard, ScoreDetail
+from .models import ScoreHistory, Quiz, Question, Flashcard, ScoreDetail, GenerationJob, GapAnalysis
+from .jobs import claim_job, run_job
+from .grading import grade_submission
+from .stats import get_user_stats, get_activity
+from .gaps import request_gap_analysis
+from .srs import SRS_SESSION_SIZE, apply_reviews, due_cards, fetch_session, parse_grades
+from .review_log import export_csv_lines, review_log_range
+from core.instrumentation import track_external
 
 
 @login_required
@@ -17,69 +25,85 @@ def quiz_setup(request):
         form = QuizSetupForm(request.POST, request.FILES)
         if form.is_valid():
             source_type = form.cleaned_data['source_type']
-            text = ""
-            quiz_title = "Quiz sans titre"
-            
-            from .services import YouTubeProcessor, OCRProcessor
-            
+            job = GenerationJob(
+                user=request.user,
+                source_type=source_type,
+                num_questions=form.cleaned_data['num_questions'],
+                difficulty=form.cleaned_data['difficulty'],
+                time_limit=form.cleaned_data['time_limit'],
+                is_exam_mode=form.cleaned_data['is_exam_mode'],
+                title="Quiz sans titre"
+            )
+
             if source_type == 'document':
                 doc_file = request.FILES.get('document')
                 if not doc_file:
                     form.add_error('document', "Veuillez télécharger un fichier.")
                     return render(request, 'quiz/quiz_setup.html', {'form': form})
-                text = DocumentProcessor.extract_text(doc_file)
-                quiz_title = f"Quiz sur {doc_file.name}"
+                job.source_file = doc_file
+                job.title = f"Quiz sur {doc_file.name}"
                 
             elif source_type == 'youtube':
                 url = form.cleaned_data.get('youtube_url')
                 if not url:
                     form.add_error('youtube_url', "Veuillez saisir une URL YouTube.")
                     return render(request, 'quiz/quiz_setup.html', {'form': form})
-                text = YouTubeProcessor.extract_transcript(url)
-                quiz_title = "Quiz Vidéo YouTube"
+                job.youtube_url = url
+                job.title = "Quiz Vidéo YouTube"
                 
             elif source_type == 'image':
                 img_file = request.FILES.get('image')
                 if not img_file:
                     form.add_error('image', "Veuillez charger une image.")
                     return render(request, 'quiz/quiz_setup.html', {'form': form})
-                text = OCRProcessor.extract_text_from_image(img_file)
-                quiz_title = f"Quiz Image - {img_file.name}"
-
-            if not text or len(text.strip()) < 50:
-                error_msg = "Impossible d'extraire assez de texte de cette source. Vérifiez la source ou réessayez."
-                form.add_error(None, error_msg)
-                return render(request, 'quiz/quiz_setup.html', {'form': form})
-
-            # 2. Generate Quiz
-            service = QuizGeneratorService()
-            num_questions = form.cleaned_data['num_questions']
-            difficulty = form.cleaned_data['difficulty']
-            quiz_data = service.generate_quiz(text, num_questions, difficulty)
-            
-            # 3. Create Quiz & Questions
-            quiz_obj = Quiz.objects.create(
-                user=request.user,
-                title=quiz_title,
-                difficulty=difficulty,
-                time_limit=form.cleaned_data['time_limit'],
-                is_exam_mode=form.cleaned_data['is_exam_mode']
-            )
-            for q in quiz_data:
-                Question.objects.create(
-                    quiz=quiz_obj,
-                    text=q['question'],
-                    options=q['options'],
-                    correct_answer=q['answer'],
-                    explanation=q.get('explanation', '')
-                )
-            request.session['quiz_id'] = quiz_obj.id
-            return redirect('quiz:quiz_take')
+                job.source_file = img_file
+                job.title = f"Quiz Image - {img_file.name}"
+
+            job.save()
+
+            # Without a running worker (local development), generate inline
+            if settings.QUIZ_GENERATION_INLINE and claim_job(job):
+                run_job(job)
+
+            return redirect('quiz:generation_status', job_id=job.id)
     else:
         form = QuizSetupForm()
     return render(request, 'quiz/quiz_setup.html', {'form': form})
 
 
+@login_required
+def generation_status(request, job_id):
+    job = get_object_or_404(GenerationJob, id=job_id, user=request.user)
+    # In streaming mode the quiz exists before the job is done
+    if job.quiz_id and job.status != GenerationJob.STATUS_FAILED:
+        return redirect('quiz:quiz_take_id', quiz_id=job.quiz_id)
+    return render(request, 'quiz/generation_status.html', {'job': job})
+
+
+@login_required
+def generation_job_status(request, job_id):
+    """
+    Polled by the status page and, for streaming generation, by the take
+    page: ?after=<question id> also returns the questions saved since.
+    `attempt` changes when a requeued job starts the questions over.
+    One short request per poll, so no worker is held during generation.
+    """
+    job = get_object_or_404(GenerationJob, id=job_id, user=request.user)
+    data = {'status': job.status, 'error': job.error, 'attempt': job.attempts}
+    if job.quiz_id and job.status != GenerationJob.STATUS_FAILED:
+        data['redirect_url'] = reverse('quiz:quiz_take_id', args=[job.quiz_id])
+    if 'after' in request.GET:
+        try:
+            after = int(request.GET['after'])
+        except ValueError:
+            after = 0
+        data['questions'] = list(
+            Question.objects.filter(quiz_id=job.quiz_id, id__gt=after)
+            .order_by('id').values('id', 'text', 'options')
+        ) if job.quiz_id else []
+    return JsonResponse(data)
+
+
 @login_required
 def quiz_take(request, quiz_id=None):
     if quiz_id:
@@ -94,93 +118,107 @@ def quiz_take(request, quiz_id=None):
     except Quiz.DoesNotExist:
         return redirect('quiz:quiz_setup')
 
-    questions = quiz_obj.questions.all()
+    # Stable order: the form fields are numbered by position
+    questions = quiz_obj.questions.order_by('id')
 
     if request.method == 'POST':
-        score = 0
-        results = []
-        
-        for i, question in enumerate(questions):
-            user_answer = request.POST.get(f'question_{i}')
-            correct_answer = question.correct_answer
-            is_correct = user_answer == correct_answer
-            if is_correct:
-                score += 1
-            
-            # Temporary results for template
-            res_item = {
-                'question': question,
-                'user_answer': user_answer,
-                'correct_answer': correct_answer,
-                'is_correct': is_correct,
-            }
-            results.append(res_item)
-
-        # Save Score History
-        time_elapsed = request.POST.get('time_elapsed', 'N/A')
-        score_obj = ScoreHistory.objects.create(
-            user=request.user,
-            quiz=quiz_obj,
-            score=score,
-            total_questions=questions.count(),
-            difficulty=quiz_obj.difficulty,
-            time_elapsed=time_elapsed
+        result = grade_submission(
+            request.user,
+            quiz_obj,
+            request.POST,
+            request.POST.get('time_elapsed', 'N/A')
         )
-        
-        # Save detailed score per question
-        for res in results:
-            ScoreDetail.objects.create(
-                history=score_obj,
-                question=res['question'],
-                is_correct=res['is_correct'],
-                user_answer=res['user_answer'] or "Pas de réponse"
-            )
-        
-        # Gamification: Update XP and Streak
-        difficulty_map = {"Basique": 1, "Standard": 1.5, "Avancé": 2, "Expert": 2.5}
-        multiplier = difficulty_map.get(quiz_obj.difficulty, 1)
-        xp_earned = request.user.profile.update_xp_and_streak(score, questions.count(), multiplier)
-        
+
         # Clear session
         del request.session['quiz_id']
-        
-        # Pass full results to template
+
         return render(request, 'quiz/quiz_result.html', {
-            'score': score,
-            'total': questions.count(),
+            'score': result['score'],
+            'total': result['total'],
             'quiz_obj': quiz_obj,
-            'history_id': score_obj.id,
-            'xp_earned': xp_earned,
-            'new_streak': request.user.profile.streak
-
+            'history_id': result['history'].id,
+            'xp_earned': result['xp_earned'],
+            'new_streak': result['streak']
         })
 
+    # Questions still being generated are polled by the page (generation_job_status)
+    generation_job = GenerationJob.objects.filter(
+        quiz=quiz_obj,
+        status__in=[GenerationJob.STATUS_PENDING, GenerationJob.STATUS_RUNNING]
+    ).first()
+
     return render(request, 'quiz/quiz_take.html', {
         'quiz_data': questions,
-        'quiz_obj': quiz_obj
+        'quiz_obj': quiz_obj,
+        'generation_job': generation_job
     })
 
+HISTORY_PAGE_SIZE = 24
+ACTIVITY_WINDOWS = (30, 90, 365)
+
+
+def _history_page(user, cursor=None):
+    """
+    Keyset pagination on (completed_at, id), newest first: each page costs
+    one indexed range scan whatever its depth. Returns (items, next_cursor).
+    """
+    history = ScoreHistory.objects.filter(user=user).select_related('quiz').order_by('-completed_at', '-id')
+    if cursor:
+        completed_at, last_id = _decode_history_cursor(cursor)
+        history = history.filter(
+            models.Q(completed_at__lt=completed_at) | models.Q(completed_at=completed_at, id__lt=last_id)
+        )
+    items = list(history[:HISTORY_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(items) > HISTORY_PAGE_SIZE:
+        items = items[:HISTORY_PAGE_SIZE]
+        last = items[-1]
+        next_cursor = f"{last.completed_at.isoformat()}_{last.id}"
+    return items, next_cursor
+
+
+def _decode_history_cursor(cursor):
+    """
+    Parses a cursor made by _history_page. Raises ValueError on anything
+    else, answered with a 400 by quiz_history_page.
+    """
+    from datetime import datetime
+    completed_at, _, last_id = cursor.rpartition('_')
+    completed_at = datetime.fromisoformat(completed_at)
+    # Cursors always carry the offset and a row id
+    if completed_at.tzinfo is None or not last_id.isdigit():
+        raise ValueError(f"Invalid history cursor: {cursor}")
+    return completed_at, int(last_id)
+
+
 @login_required
 def quiz_history(request):
-    history = ScoreHistory.objects.filter(user=request.user).order_by('-completed_at')
-    
-    # Calculate stats
-    total_quizzes = history.count()
-    best_score = 0
-    avg_score = 0
-    
-    if total_quizzes > 0:
-        best_score = history.order_by('-score').first().score
-        total_points = sum(item.score for item in history)
-        avg_score = round(total_points / total_quizzes, 1)
+    history, next_cursor = _history_page(request.user)
+    stats = get_user_stats(request.user)
 
     return render(request, 'quiz/quiz_history.html', {
         'history': history,
-        'total_quizzes': total_quizzes,
-        'best_score': best_score,
-        'avg_score': avg_score
+        'next_cursor': next_cursor,
+        'total_quizzes': stats.quiz_count,
+        'best_score': stats.best_score,
+        'avg_score': stats.avg_score
     })
 
+
+@login_required
+def quiz_history_page(request):
+    """
+    Next page of the history for the infinite scroll: rendered cards and the cursor of the following page.
+    """
+    from django.template.loader import render_to_string
+    try:
+        history, next_cursor = _history_page(request.user, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': 'Curseur invalide.'}, status=400)
+
+    html = render_to_string('quiz/_history_card_list.html', {'history': history}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
 @login_required
 def quiz_analysis(request, history_id):
     from django.shortcuts import get_object_or_404
@@ -194,26 +232,26 @@ def quiz_analysis(request, history_id):
         'score_pct': round((history_item.score / history_item.total_questions) * 100) if history_item.total_questions else 0,
     })
 
-from django.http import HttpResponse
-from gtts import gTTS
-import io
+from .tts import AudioCache, audio_response, get_audio, split_sentences, stream_audio, streaming_audio_response
 
 @login_required
 def generate_audio(request):
     text = request.GET.get('text', '')
-    if not text:
+    if not text.strip():
         return HttpResponse(status=400)
     
     try:
-        tts = gTTS(text=text, lang='fr')
-        fp = io.BytesIO()
-        tts.write_to_fp(fp)
-        fp.seek(0)
-        return HttpResponse(fp.read(), content_type='audio/mpeg')
+        path = AudioCache.get(AudioCache.make_key(text))
+        if path is None and len(split_sentences(text)) > 1:
+            # Long text: start playing the first sentence while the rest is rendered
+            return streaming_audio_response(*stream_audio(text))
+        key, path = get_audio(text)
     except Exception as e:
         print(f"TTS Error: {e}")
         return HttpResponse(status=500)
+    return audio_response(request, key, path)
 
+import io
 from fpdf import FPDF
 from django.http import FileResponse
 
@@ -310,66 +348,98 @@ def srs_dashboard(request):
 
 @login_required
 def srs_review(request):
-    from datetime import date
-    from .models import Flashcard
-    due_cards = Flashcard.objects.filter(user=request.user, next_review_date__lte=date.today())
-    if not due_cards.exists():
+    if request.method == 'POST':
+        # Single grade posted by the form (no JavaScript)
+        try:
+            grades = parse_grades([{'card_id': request.POST.get('card_id'), 'quality': request.POST.get('quality', 3)}])
+        except ValueError:
+            return HttpResponse(status=400)
+        apply_reviews(request.user, grades)
+        return redirect('quiz:srs_review')
+
+    cards = fetch_session(request.user)
+    if not cards:
         messages.info(request, "Toutes vos flashcards sont à jour ! Revenez plus tard.")
         return redirect('quiz:srs_dashboard')
-    
+
+    return render(request, 'quiz/srs_review.html', {
+        'card': cards[0],
+        'session_cards': cards,
+        'remaining': due_cards(request.user).count()
+    })
+
+@login_required
+def srs_session(request):
+    """
+    Review-session API. GET ?limit=N returns the next N due cards in one
+    query; POST {"grades": [{"card_id": .., "quality": 0-5}, ...]} applies
+    a batch of grades with one bulk UPDATE.
+    """
     if request.method == 'POST':
-        card_id = request.POST.get('card_id')
-        quality = int(request.POST.get('quality', 3))
-        card = Flashcard.objects.get(id=card_id, user=request.user)
-        card.update_srs(quality)
-        return redirect('quiz:srs_review')
-        
-    return render(request, 'quiz/srs_review.html', {'card': due_cards.first(), 'remaining': due_cards.count()})
+        try:
+            grades = parse_grades(json.loads(request.body).get('grades'))
+        except (ValueError, AttributeError):
+            return JsonResponse({'success': False, 'message': "Notes invalides."}, status=400)
+        updated = apply_reviews(request.user, grades)
+        return JsonResponse({'success': True, 'updated': len(updated), 'remaining': due_cards(request.user).count()})
+
+    try:
+        limit = int(request.GET.get('limit', SRS_SESSION_SIZE))
+    except ValueError:
+        limit = SRS_SESSION_SIZE
+    cards = fetch_session(request.user, max(1, limit))
+    return JsonResponse({'cards': cards, 'remaining': due_cards(request.user).count()})
+
+@login_required
+def srs_review_log_export(request):
+    """
+    Streams the user's flashcard review history as CSV.
+    """
+    response = StreamingHttpResponse(export_csv_lines(review_log_range(user=request.user)), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="revisions.csv"'
+    return response
 
 @login_required
 def analytics_dashboard(request):
-    from django.db.models import Count
-    from django.db.models.functions import TruncDate
-    from .models import ScoreHistory, ScoreDetail
-    
-    # 1. Activity Heatmap Data (last 30 days)
-    activity_data = ScoreHistory.objects.filter(user=request.user) \
-        .annotate(date=TruncDate('completed_at')) \
-        .values('date') \
-        .annotate(count=Count('id')) \
-        .order_by('date')
-    
-    activity_json = {str(item['date']): item['count'] for item in activity_data}
+    # 1. Activity Heatmap Data (last 30, 90 or 365 days)
+    try:
+        days = int(request.GET.get('days', ACTIVITY_WINDOWS[0]))
+    except ValueError:
+        days = ACTIVITY_WINDOWS[0]
+    if days not in ACTIVITY_WINDOWS:
+        days = ACTIVITY_WINDOWS[0]
+    activity_json = get_activity(request.user, days)
     
-    # 2. Gap Analysis (AI Feedback)
-    details = ScoreDetail.objects.filter(history__user=request.user).order_by('-history__completed_at')[:50]
-    service = QuizGeneratorService()
-    gap_feedback = service.analyze_gaps(details)
+    # 2. Gap Analysis (AI Feedback): last stored result, refreshed in the background
+    gap_analysis = request_gap_analysis(request.user)
     
     # 3. Overall performance stats
-    total_quizzes = ScoreHistory.objects.filter(user=request.user).count()
-    avg_score = ScoreHistory.objects.filter(user=request.user).aggregate(models.Avg('score'))['score__avg'] or 0
+    stats = get_user_stats(request.user)
     
     return render(request, 'quiz/analytics_dashboard.html', {
         'activity_json': json.dumps(activity_json),
-        'gap_feedback': gap_feedback,
-        'total_quizzes': total_quizzes,
-        'avg_score': round(avg_score, 1)
+        'activity_days': days,
+        'activity_windows': ACTIVITY_WINDOWS,
+        'gap_feedback': gap_analysis.feedback,
+        'gap_computed_at': gap_analysis.computed_at,
+        'gap_pending': gap_analysis.status != GapAnalysis.STATUS_IDLE,
+        'gap_failed': bool(gap_analysis.error),
+        'total_quizzes': stats.quiz_count,
+        'avg_score': stats.avg_score
     })
 
 @login_required
 @require_POST
 def ai_tutor_chat(request):
-    import google.generativeai as genai
-    import os
+    from .providers import get_gemini_model
+    from .services import GOOGLE_API_KEY
     try:
         data = json.loads(request.body)
         question = data.get('question')
         user_msg = data.get('message')
         context = data.get('context', '')
         
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_gemini_model(GOOGLE_API_KEY, 'gemini-1.5-flash')
         
         prompt = f"""
         Tu es un tuteur pédagogique expert. 
@@ -381,7 +451,8 @@ def ai_tutor_chat(request):
         Utilise du Markdown pour la clarté si nécessaire.
         """
         
-        response = model.generate_content(prompt)
+        with track_external('llm'):
+            response = model.generate_content(prompt)
         return JsonResponse({'success': True, 'response': response.text})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=500)